@@ -6,11 +6,103 @@ import Footer from "./components/Footer"
 import DocumentationForm from "./components/DocumentationForm"
 import DocumentationViewer from "./components/DocumentationViewer"
 
+const API_BASE = 'https://code4labexam.onrender.com'
+
+// Give up on a job after this long; the server's own request deadline is two minutes,
+// so this leaves room for queueing and a retry or two.
+const JOB_DEADLINE_MS = 10 * 60 * 1000
+// Backoff between polls after an error or an early answer from a proxy
+const POLL_BACKOFF_MIN_MS = 1000
+const POLL_BACKOFF_MAX_MS = 15000
+
+const sleep = (ms) => new Promise((resolve) => setTimeout(resolve, ms))
+
+function retryAfterMs(response, fallback) {
+  const seconds = Number(response.headers.get('Retry-After'))
+  return seconds > 0 ? seconds * 1000 : fallback
+}
+
+// The original single-request path, used when the server has no job API.
+async function generateDocumentationDirect(body) {
+  const response = await fetch(`${API_BASE}/generate-documentation`, {
+    method: 'POST',
+    headers: {
+      'Content-Type': 'application/json',
+    },
+    body: JSON.stringify(body)
+  });
+  if (!response.ok) {
+    throw new Error('Failed to generate documentation');
+  }
+  const location = response.headers.get('Content-Location');
+  return {
+    document: location ? location.split('/').pop() : null,
+    result: await response.json()
+  };
+}
+
+// Queues the request as a job and long-polls it, so no single HTTP request
+// stays open for the whole generation (campus proxies cut those off).
+// Polls back off after errors and stop at JOB_DEADLINE_MS.
+async function runDocumentationJob(body) {
+  const response = await fetch(`${API_BASE}/jobs`, {
+    method: 'POST',
+    headers: {
+      'Content-Type': 'application/json',
+    },
+    body: JSON.stringify(body)
+  });
+  if (response.status === 404 || response.status === 405) {
+    return generateDocumentationDirect(body);
+  }
+  if (!response.ok) {
+    throw new Error('Failed to queue documentation job');
+  }
+  const { location } = await response.json();
+  const deadline = Date.now() + JOB_DEADLINE_MS;
+  let backoff = POLL_BACKOFF_MIN_MS;
+  while (Date.now() < deadline) {
+    const started = Date.now();
+    const wait = Math.max(1, Math.min(25, Math.floor((deadline - started) / 1000)));
+    let poll = null;
+    try {
+      poll = await fetch(`${API_BASE}${location}?wait=${wait}`);
+    } catch (error) {
+      // Network hiccup: the job keeps running on the server, so try again.
+      console.warn("Polling documentation job failed:", error);
+    }
+    if (poll && poll.ok) {
+      const job = await poll.json();
+      if (job.status === 'done') {
+        return job;
+      }
+      if (job.status === 'failed') {
+        throw new Error(job.error || 'Documentation job failed');
+      }
+      // A full long-poll needs no pause; one cut short (e.g. by a proxy) does.
+      if (Date.now() - started >= wait * 1000) {
+        backoff = POLL_BACKOFF_MIN_MS;
+        continue;
+      }
+    } else if (poll && poll.status === 404) {
+      throw new Error('Documentation job not found');
+    } else if (poll && poll.status < 500 && poll.status !== 429) {
+      throw new Error('Failed to fetch documentation job');
+    }
+    const delay = poll ? retryAfterMs(poll, backoff) : backoff;
+    await sleep(Math.min(delay, Math.max(0, deadline - Date.now())));
+    backoff = Math.min(backoff * 2, POLL_BACKOFF_MAX_MS);
+  }
+  throw new Error('Timed out waiting for the documentation job');
+}
+
 function App() {
   const [question, setQuestion] = useState("")
   const [code, setCode] = useState("")
   const [isLoading, setIsLoading] = useState(false)
   const [documentation, setDocumentation] = useState([])
+  // Hash of the last result, so a resubmission only regenerates what the edit changed
+  const [previousDocument, setPreviousDocument] = useState(null)
 
   const [sections, setSections] = useState({
     overview: true,
@@ -35,23 +127,14 @@ function App() {
     setIsLoading(true)
 
     try {
-      const response = await fetch('https://code4labexam.onrender.com/generate-documentation', {
-        method: 'POST',
-        headers: {
-          'Content-Type': 'application/json',
-        },
-        body: JSON.stringify({
-          question: question,
-          code: code || null,
-          options: sections
-        })
+      const job = await runDocumentationJob({
+        question: question,
+        code: code || null,
+        options: sections,
+        previous_document: code ? previousDocument : null
       });
-
-      if (!response.ok) {
-        throw new Error('Failed to generate documentation');
-      }
-
-      const result = await response.json();
+      const result = job.result;
+      setPreviousDocument(job.document);
       
       // Transform the API response to match our documentation viewer format
       const formattedDocs = [
@@ -3,6 +3,20 @@
 import { useState, useRef, useEffect } from "react"
 import { jsPDF } from "jspdf"
 
+const API_URL = 'https://code4labexam.onrender.com'
+
+// Map section titles to option keys
+const SECTION_KEYS = {
+  'Question Overview & Concepts': 'overview',
+  'Short Algorithm': 'shortAlgorithm',
+  'Detailed Algorithm': 'detailedAlgorithm',
+  'Code': 'code',
+  'Required Modules': 'requiredModules',
+  'Variables & Constants': 'variablesAndConstants',
+  'Functions': 'functions',
+  'Code Explanation': 'explanation'
+}
+
 function DocumentationViewer({ documentation, isLoading, question, sections, handleSectionChange }) {
   const [activeTab, setActiveTab] = useState('Question Overview & Concepts')
   const [showExportOptions, setShowExportOptions] = useState(false)
@@ -17,9 +31,44 @@ function DocumentationViewer({ documentation, isLoading, question, sections, han
     }
   }, [documentation])
 
+  // Rendered and cached by the server, so slow machines only download the file
+  const downloadServerPDF = async () => {
+    const result = {}
+    for (const section of documentation) {
+      result[SECTION_KEYS[section.title]] = section.content
+    }
+
+    const response = await fetch(`${API_URL}/documentation/pdf`, {
+      method: 'POST',
+      headers: {
+        'Content-Type': 'application/json',
+      },
+      body: JSON.stringify({ question, result, sections })
+    })
+    if (!response.ok) {
+      throw new Error('Failed to render PDF')
+    }
+
+    const url = URL.createObjectURL(await response.blob())
+    const link = document.createElement("a")
+    link.href = url
+    link.download = "os-lab-documentation.pdf"
+    link.click()
+    URL.revokeObjectURL(url)
+  }
+
   const generatePDF = async () => {
     if (!documentationRef.current || documentation.length === 0) return
 
+    try {
+      await downloadServerPDF()
+    } catch (error) {
+      console.error("Server PDF export failed, rendering in the browser:", error)
+      generateLocalPDF()
+    }
+  }
+
+  const generateLocalPDF = () => {
     const pdf = new jsPDF("p", "mm", "a4")
     let yOffset = 10
 
@@ -42,17 +91,7 @@ function DocumentationViewer({ documentation, isLoading, question, sections, han
 
     // Process each section based on user's selection
     for (const section of documentation) {
-      // Map section titles to option keys
-      const optionKey = {
-        'Question Overview & Concepts': 'overview',
-        'Short Algorithm': 'shortAlgorithm',
-        'Detailed Algorithm': 'detailedAlgorithm',
-        'Code': 'code',
-        'Required Modules': 'requiredModules',
-        'Variables & Constants': 'variablesAndConstants',
-        'Functions': 'functions',
-        'Code Explanation': 'explanation'
-      }[section.title]
+      const optionKey = SECTION_KEYS[section.title]
 
       // Skip if this section wasn't selected
       if (!sections[optionKey]) continue
@@ -0,0 +1,130 @@
+import re
+import sys
+import time
+import argparse
+from pathlib import Path
+from typing import Dict, List
+
+# Add the server directory to Python path
+sys.path.append(str(Path(__file__).parent.parent))
+
+from services.c_analyzer import analyze_c_code
+
+
+class LegacyRegexCParser:
+    """The regex-based CParser this analyzer replaced, kept here as the baseline."""
+
+    @staticmethod
+    def extract_includes(code: str) -> List[str]:
+        return re.findall(r'#include\s*<([^>]+)>', code)
+
+    @staticmethod
+    def extract_functions(code: str) -> List[Dict]:
+        functions = re.findall(r'(\w+\s+\w+\s*\([^)]*\)\s*\{[^}]*\})', code, re.DOTALL)
+        result = []
+        for func in functions:
+            signature_match = re.match(r'(\w+\s+\w+\s*\([^)]*\))', func)
+            if signature_match:
+                signature = signature_match.group(1).strip()
+                name_match = re.search(r'\s(\w+)\s*\(', signature)
+                if name_match:
+                    result.append({"name": name_match.group(1), "signature": signature, "body": func})
+        return result
+
+    @staticmethod
+    def extract_variables(code: str) -> List[Dict]:
+        variables = re.findall(r'(int|float|double|char|void)\s+(\w+)(?:\s*=\s*([^;]+))?;', code)
+        return [{"type": t, "name": n, "initial_value": v.strip() if v else None} for t, n, v in variables]
+
+
+FUNCTION_TEMPLATE = """
+struct Process{n} {{ int pid; int bt; int at; }};
+
+void isSafe{n}(int P, int R, int need[MAX_P][MAX_R], int allocation[MAX_P][MAX_R], int available[MAX_R]) {{
+    int work[MAX_R], finish[MAX_P] = {{0}}, safeSequence[MAX_P];
+    int completed = 0;
+    for (int i = 0; i < R; i++)
+        work[i] = available[i];
+    while (completed < P) {{
+        int found = 0;
+        for (int i = 0; i < P; i++) {{
+            if (!finish[i]) {{
+                int c = 0;
+                for (int j = 0; j < R; j++) {{
+                    if (need[i][j] > work[j]) {{ break; }}
+                    c++;
+                }}
+                if (c == R) {{
+                    for (int k = 0; k < R; k++)
+                        work[k] += allocation[i][k];
+                    safeSequence[completed++] = i; /* }} in a comment */
+                    finish[i] = 1;
+                    found = 1;
+                }}
+            }}
+        }}
+        if (!found) {{ printf("unsafe {{ state\\n"); return; }}
+    }}
+}}
+"""
+
+
+def build_source(lines: int) -> str:
+    parts = ["#include <stdio.h>\n#include <stdlib.h>\n#define MAX_P 10\n#define MAX_R 10\n"]
+    n = total = 0
+    while total < lines:
+        parts.append(FUNCTION_TEMPLATE.format(n=n))
+        total += parts[-1].count("\n")
+        n += 1
+    parts.append("int main() {\n    int P = 5, R = 3;\n    return 0;\n}\n")
+    return "".join(parts)
+
+
+def time_call(label: str, fn, repeat: int = 3):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - start)
+    print(f"  {label:<38} {best * 1e3:9.1f} ms")
+    return result
+
+
+def run(lines: int):
+    source = build_source(lines)
+    expected_functions = source.count("void isSafe") + 1
+    print(f"Submission: {source.count(chr(10))} lines, {len(source) / 1024:.0f} KiB, {expected_functions} functions\n")
+
+    print("Timing (best of 3):")
+    legacy_functions = time_call(
+        "legacy CParser (3 regex passes)",
+        lambda: (LegacyRegexCParser.extract_includes(source),
+                 LegacyRegexCParser.extract_functions(source),
+                 LegacyRegexCParser.extract_variables(source))[1],
+    )
+    analysis = time_call("CAnalyzer (single pass)", lambda: analyze_c_code(source))
+
+    def complete(functions):
+        # A body is complete if it reaches the function's final statement.
+        return sum(1 for f in functions if "if (!found)" in f["body"] or f["name"] == "main")
+
+    print("\nFunctions found (complete bodies):")
+    print(f"  legacy CParser:   {len(legacy_functions)} ({complete(legacy_functions)}) of {expected_functions}")
+    print(f"  CAnalyzer:        {len(analysis['functions'])} ({complete(analysis['functions'])}) of {expected_functions}, "
+          f"{len(analysis['structs'])} structs, {len(analysis['variables'])} variables")
+
+    print("\nPathological inputs (CAnalyzer):")
+    time_call("200k unclosed '('", lambda: analyze_c_code("int f" + "(" * 200_000), repeat=1)
+    time_call("100k nested '{'", lambda: analyze_c_code("void f() " + "{" * 100_000), repeat=1)
+    time_call("unterminated comment + string", lambda: analyze_c_code('/*' + 'x' * 500_000 + '"' * 1000), repeat=1)
+    print("\nPathological inputs (legacy CParser):")
+    for size in (2_500, 5_000, 10_000):
+        time_call(f"{size // 1000}.{size % 1000 // 100}k 'int x(' without ')'",
+                  lambda: LegacyRegexCParser.extract_functions("int x(" * size), repeat=1)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark CAnalyzer against the legacy regex CParser.")
+    parser.add_argument("--lines", type=int, default=12_000)
+    args = parser.parse_args()
+    run(args.lines)
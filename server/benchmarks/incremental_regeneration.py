@@ -0,0 +1,128 @@
+import os
+import sys
+import argparse
+from pathlib import Path
+
+# Add the server directory to Python path
+sys.path.append(str(Path(__file__).parent.parent))
+os.environ.setdefault("LLM_BACKEND", "stub")
+
+from services.gemini_os_doc import EXPECTED_KEYS, plan_generation
+from services.incremental import stale_sections, structural_changes
+from services.token_budget import OUTPUT_TOKEN_OVERHEAD, SECTION_OUTPUT_TOKENS, estimate_tokens
+
+QUESTION = "Write a C program to simulate SJF (non-preemptive) CPU scheduling."
+
+SUBMISSION = """#include <stdio.h>
+
+#define MAX 20
+
+struct Process { int pid; int bt; int wt; int tat; };
+
+void sortByBurst(struct Process p[], int n) {
+    for (int i = 0; i < n - 1; i++)
+        for (int j = 0; j < n - i - 1; j++)
+            if (p[j].bt > p[j + 1].bt) {
+                struct Process t = p[j];
+                p[j] = p[j + 1];
+                p[j + 1] = t;
+            }
+}
+
+void computeTimes(struct Process p[], int n) {
+    p[0].wt = 0;
+    for (int i = 1; i < n; i++)
+        p[i].wt = p[i - 1].wt + p[i].bt;
+    for (int i = 0; i < n; i++)
+        p[i].tat = p[i].wt + p[i].bt;
+}
+
+void printTable(struct Process p[], int n) {
+    float total_wt = 0, total_tat = 0;
+    printf("PID\\tBT\\tWT\\tTAT\\n");
+    for (int i = 0; i < n; i++) {
+        printf("%d\\t%d\\t%d\\t%d\\n", p[i].pid, p[i].bt, p[i].wt, p[i].tat);
+        total_wt += p[i].wt;
+        total_tat += p[i].tat;
+    }
+    printf("Average waiting time: %.2f\\n", total_wt / n);
+    printf("Average turnaround time: %.2f\\n", total_tat / n);
+}
+
+int main() {
+    struct Process p[MAX];
+    int n;
+    printf("Enter the number of processes: ");
+    scanf("%d", &n);
+    for (int i = 0; i < n; i++) {
+        p[i].pid = i + 1;
+        printf("Burst time of P%d: ", i + 1);
+        scanf("%d", &p[i].bt);
+    }
+    sortByBurst(p, n);
+    computeTimes(p, n);
+    printTable(p, n);
+    return 0;
+}
+"""
+
+# Typical resubmissions: (description, old text, new text).
+EDITS = [
+    ("fix one function body", "p[i].wt = p[i - 1].wt + p[i].bt;", "p[i].wt = p[i - 1].wt + p[i - 1].bt;"),
+    ("add a comment and reindent", "    sortByBurst(p, n);", "    /* shortest job first */\n        sortByBurst(p, n);"),
+    ("change a constant", "#define MAX 20", "#define MAX 50"),
+    ("validate input in main", "    scanf(\"%d\", &n);",
+     "    scanf(\"%d\", &n);\n    if (n < 1 || n > MAX) { printf(\"Invalid count\\n\"); return 1; }"),
+    ("add a helper function", "int main() {",
+     "void printGantt(struct Process p[], int n) {\n    for (int i = 0; i < n; i++) printf(\"| P%d \", p[i].pid);\n"
+     "    printf(\"|\\n\");\n}\n\nint main() {"),
+]
+
+
+def expected_output_tokens(sections, code: str) -> int:
+    """Typical answer size for `sections`; the `code` section echoes the submission."""
+    return OUTPUT_TOKEN_OVERHEAD + sum(
+        estimate_tokens(code) + 200 if section == "code" else SECTION_OUTPUT_TOKENS[section] for section in sections
+    )
+
+
+def run(output_rate: float):
+    options = {key: True for key in EXPECTED_KEYS}
+    full_prompt, _ = plan_generation(QUESTION, SUBMISSION, options, "C")
+    print()
+    print(f"{'Edit':<28} {'regenerated':>11} {'prompt tok':>11} {'output tok':>11} {'est. time':>10}")
+    totals = {"full": [0, 0], "incremental": [0, 0]}
+    for description, old, new in EDITS:
+        code = SUBMISSION.replace(old, new)
+        full_output = expected_output_tokens(EXPECTED_KEYS, code)
+        totals["full"][0] += estimate_tokens(full_prompt)
+        totals["full"][1] += full_output
+
+        stale = stale_sections(structural_changes(SUBMISSION, code))
+        regenerate = [key for key in EXPECTED_KEYS if key in stale]
+        prompt_tokens = output_tokens = 0
+        if regenerate:
+            prompt, _ = plan_generation(QUESTION, code, {key: True for key in regenerate}, "C")
+            prompt_tokens = estimate_tokens(prompt)
+            output_tokens = expected_output_tokens(regenerate, code)
+        totals["incremental"][0] += prompt_tokens
+        totals["incremental"][1] += output_tokens
+        print(f"{description:<28} {len(regenerate):>6} of 8 {prompt_tokens:>11} {output_tokens:>11} "
+              f"{output_tokens / output_rate:>9.1f}s   {', '.join(regenerate) or '-'}")
+
+    print(f"\nFull regeneration per edit: 8 of 8 sections, prompt ~{estimate_tokens(full_prompt)} tokens, "
+          f"output ~{expected_output_tokens(EXPECTED_KEYS, SUBMISSION)} tokens "
+          f"(~{expected_output_tokens(EXPECTED_KEYS, SUBMISSION) / output_rate:.1f}s)")
+    for label in ("prompt", "output"):
+        index = 0 if label == "prompt" else 1
+        full, incremental = totals["full"][index], totals["incremental"][index]
+        print(f"Total {label} tokens over {len(EDITS)} edits: full {full}, incremental {incremental} "
+              f"({100 * (1 - incremental / full):.0f}% less)")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare full and incremental regeneration on typical resubmissions.")
+    parser.add_argument("--output-rate", type=float, default=100.0,
+                        help="model output tokens per second, used to estimate generation time")
+    args = parser.parse_args()
+    run(args.output_rate)
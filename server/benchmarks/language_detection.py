@@ -0,0 +1,74 @@
+import sys
+import json
+import time
+import argparse
+from pathlib import Path
+
+# Add the server directory to Python path
+sys.path.append(str(Path(__file__).parent.parent))
+
+from services.language_classifier import classify_language, _classify_question
+
+FIXTURES = Path(__file__).parent.parent / "tests" / "fixtures"
+# The rules in services/language_classifier.py were written against the development
+# set; only the held-out set says how they do on questions they have not seen.
+DEVELOPMENT_SET = FIXTURES / "lab_questions.json"
+HELD_OUT_SET = FIXTURES / "lab_questions_heldout.json"
+
+
+def evaluate(cases, threshold: float):
+    """Returns (accuracy, coverage, accuracy when confident, misses) for the labelled cases."""
+    correct = confident = confident_correct = 0
+    misses = []
+    for case in cases:
+        language, confidence = classify_language(case["question"])
+        correct += language == case["language"]
+        if confidence >= threshold:
+            confident += 1
+            confident_correct += language == case["language"]
+        if language != case["language"] or confidence < threshold:
+            misses.append((case["question"][:60], case["language"], language, confidence))
+    return correct / len(cases), confident / len(cases), confident_correct / max(confident, 1), misses
+
+
+def report(name: str, cases, threshold: float, detection_rtt: float):
+    accuracy, coverage, confident_accuracy, misses = evaluate(cases, threshold)
+    print(f"{name} ({len(cases)} questions)")
+    print(f"  Overall accuracy:         {accuracy:.1%}")
+    print(f"  Answered locally:         {coverage:.1%} (threshold {threshold})")
+    print(f"  Accuracy when confident:  {confident_accuracy:.1%}")
+    print(f"  Detection time saved:     ~{coverage * len(cases) * detection_rtt:.1f}s "
+          f"(assuming {detection_rtt}s per Gemini round-trip)")
+    if misses:
+        print("  Deferred to the model or misclassified:")
+        for question, expected, got, confidence in misses:
+            print(f"    [{expected} -> {got} @ {confidence:.2f}] {question}")
+
+
+def run(threshold: float, detection_rtt: float, repeat: int):
+    """Measures accuracy, coverage and latency of the local language classifier."""
+    development = json.loads(DEVELOPMENT_SET.read_text(encoding="utf-8"))
+    held_out = json.loads(HELD_OUT_SET.read_text(encoding="utf-8"))
+    cases = development + held_out
+
+    # Time the rules themselves, not the memo in front of them.
+    _classify_question.cache_clear()
+    start = time.perf_counter()
+    for _ in range(repeat):
+        _classify_question.cache_clear()
+        for case in cases:
+            classify_language(case["question"])
+    per_call = (time.perf_counter() - start) / (repeat * len(cases))
+
+    report("Held-out set", held_out, threshold, detection_rtt)
+    report("Development set (rules written against it)", development, threshold, detection_rtt)
+    print(f"Local classification:       {per_call * 1e6:.1f} us/question (uncached)")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the local language classifier.")
+    parser.add_argument("--threshold", type=float, default=0.7)
+    parser.add_argument("--rtt", type=float, default=0.6, help="Assumed Gemini detection round-trip in seconds")
+    parser.add_argument("--repeat", type=int, default=200)
+    args = parser.parse_args()
+    run(args.threshold, args.rtt, args.repeat)
@@ -0,0 +1,161 @@
+"""
+Drives the FastAPI app concurrently against the local stub backend.
+
+Usage:
+    python benchmarks/load_test.py                       # unique requests (cache misses)
+    python benchmarks/load_test.py --scenario hit        # one repeated request
+    python benchmarks/load_test.py --endpoint stream --stub-latency-ms 0
+    python benchmarks/load_test.py --keys 4 --key-concurrency 5   # throughput vs. API keys
+
+Requests go through httpx's in-process ASGI transport, so the numbers are
+the server's own overhead plus the simulated model latency, with no
+network or API key involved.
+"""
+import os
+import io
+import sys
+import time
+import asyncio
+import argparse
+import contextlib
+from pathlib import Path
+
+# Add the server directory to Python path
+sys.path.append(str(Path(__file__).parent.parent))
+
+ENDPOINTS = {
+    "generate": "/generate-documentation",
+    "stream": "/generate-documentation/stream",
+    "sections": "/generate-documentation",
+}
+
+ALL_SECTIONS = {
+    "overview": True, "shortAlgorithm": True, "detailedAlgorithm": True, "code": True,
+    "requiredModules": True, "variablesAndConstants": True, "functions": True, "explanation": True,
+}
+
+CODE_TEMPLATE = """#include <stdio.h>
+#define REQUEST_ID {index}
+
+int main() {{
+    int n = 5, bt[5] = {{3, 1, 4, 1, 5}}, wt = 0, i;
+    for (i = 0; i < n; i++) {{
+        printf("P%d waits %d\\n", i, wt);
+        wt += bt[i];
+    }}
+    return 0;
+}}
+"""
+
+
+def configure_environment(args) -> None:
+    """Must run before the app is imported: the services read their settings at import time."""
+    os.environ["LLM_BACKEND"] = "stub"
+    os.environ["STUB_LATENCY_MS"] = str(args.stub_latency_ms)
+    os.environ["STUB_JITTER_MS"] = str(args.stub_jitter_ms)
+    os.environ["STUB_ERROR_RATE"] = str(args.stub_error_rate)
+    os.environ["STUB_SLOW_RATE"] = str(args.stub_slow_rate)
+    os.environ["STUB_SLOW_MS"] = str(args.stub_slow_ms)
+    os.environ["LLM_HEDGING"] = "1" if args.hedge else "0"
+    os.environ["STUB_KEYS"] = str(args.keys)
+    os.environ["STUB_KEY_CONCURRENCY"] = str(args.key_concurrency)
+    # Memory-only cache, so runs do not see each other's results.
+    os.environ["DOC_CACHE_PATH"] = ""
+
+
+def build_payload(args, index: int) -> dict:
+    # User code bypasses the prebuilt corpus and the paraphrase index, and the
+    # REQUEST_ID makes every cache key unique in the "miss" scenario.
+    code_index = index if args.scenario == "miss" else 0
+    return {
+        "question": "Implement FCFS CPU scheduling algorithm.",
+        "code": CODE_TEMPLATE.format(index=code_index),
+        "options": ALL_SECTIONS,
+        "parallel_sections": args.endpoint == "sections",
+    }
+
+
+def percentile(sorted_values, fraction: float) -> float:
+    return sorted_values[min(len(sorted_values) - 1, int(len(sorted_values) * fraction))]
+
+
+async def run(args):
+    import httpx
+    from main import app
+
+    # Unhandled server errors become 500 responses, as they would behind uvicorn.
+    transport = httpx.ASGITransport(app=app, raise_app_exceptions=False)
+    url = ENDPOINTS[args.endpoint]
+    semaphore = asyncio.Semaphore(args.concurrency)
+    latencies, failures = [], 0
+
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+        async def one(index: int) -> None:
+            nonlocal failures
+            async with semaphore:
+                start = time.perf_counter()
+                response = await client.post(url, json=build_payload(args, index))
+                await response.aread()
+                elapsed = time.perf_counter() - start
+            if response.status_code != 200 or b"event: error" in response.content:
+                failures += 1
+            else:
+                latencies.append(elapsed)
+
+        # Warm-up request so import/first-call costs stay out of the numbers.
+        await one(-1)
+        latencies.clear()
+        failures = 0
+
+        started = time.perf_counter()
+        await asyncio.gather(*[one(index) for index in range(args.requests)])
+        wall = time.perf_counter() - started
+
+        stats = (await client.get("/cache/stats")).json()
+    from services.gemini_os_doc import model
+    return sorted(latencies), failures, wall, stats, model.get_stats()
+
+
+def report(args, latencies, failures, wall, stats, backend_stats) -> None:
+    print(f"Endpoint:        {ENDPOINTS[args.endpoint]} ({args.endpoint}), scenario: {args.scenario}")
+    print(f"Requests:        {args.requests} at concurrency {args.concurrency}, {failures} failed")
+    print(f"Stub latency:    {args.stub_latency_ms} ms + up to {args.stub_jitter_ms} ms jitter, "
+          f"error rate {args.stub_error_rate}, {args.stub_slow_rate:.0%} slow ({args.stub_slow_ms} ms)")
+    print(f"Keys:            {args.keys}, "
+          f"{args.key_concurrency or 'unlimited'} concurrent calls per key")
+    print(f"Throughput:      {args.requests / wall:.1f} requests/sec ({wall:.2f}s wall)")
+    if latencies:
+        print(f"Latency:         p50 {percentile(latencies, 0.50) * 1e3:.1f} ms, "
+              f"p95 {percentile(latencies, 0.95) * 1e3:.1f} ms, "
+              f"p99 {percentile(latencies, 0.99) * 1e3:.1f} ms, max {latencies[-1] * 1e3:.1f} ms")
+    print(f"Cache:           {stats['hits']} hits, {stats['misses']} misses; "
+          f"singleflight {stats['singleflight']}")
+    print(f"Model calls:     {backend_stats}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Load-test the documentation API against the stub backend.")
+    parser.add_argument("--endpoint", choices=sorted(ENDPOINTS), default="generate")
+    parser.add_argument("--scenario", choices=("miss", "hit"), default="miss",
+                        help="miss: every request unique; hit: one request repeated")
+    parser.add_argument("--requests", type=int, default=500)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--stub-latency-ms", type=float, default=200)
+    parser.add_argument("--stub-jitter-ms", type=float, default=50)
+    parser.add_argument("--stub-error-rate", type=float, default=0.0)
+    parser.add_argument("--stub-slow-rate", type=float, default=0.0,
+                        help="Fraction of calls that take --stub-slow-ms instead (long tail)")
+    parser.add_argument("--stub-slow-ms", type=float, default=2000)
+    parser.add_argument("--keys", type=int, default=1, help="Number of simulated API keys")
+    parser.add_argument("--key-concurrency", type=int, default=0,
+                        help="Concurrent calls each simulated key serves (0 = unlimited)")
+    parser.add_argument("--hedge", action="store_true", help="Enable hedged model calls")
+    parser.add_argument("--verbose", action="store_true", help="Keep the server's per-request log output")
+    args = parser.parse_args()
+
+    configure_environment(args)
+    # The server logs every request with print(); keep that out of the report unless asked for.
+    server_log = sys.stdout if args.verbose else io.StringIO()
+    with contextlib.redirect_stdout(server_log):
+        results = asyncio.run(run(args))
+    report(args, *results)
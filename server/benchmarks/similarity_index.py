@@ -0,0 +1,106 @@
+import sys
+import time
+import asyncio
+import random
+import argparse
+import resource
+from pathlib import Path
+
+# Add the server directory to Python path
+sys.path.append(str(Path(__file__).parent.parent))
+
+from services.similarity import SimilarityIndex
+
+TOPICS = [
+    "fcfs scheduling", "sjf scheduling", "round robin scheduling", "priority scheduling",
+    "first fit memory allocation", "best fit memory allocation", "worst fit memory allocation",
+    "bankers algorithm", "shared memory ipc", "producer consumer problem", "dining philosophers",
+    "fifo page replacement", "lru page replacement", "optimal page replacement", "scan disk scheduling",
+    "list files in a directory", "check if a file exists", "count lines in a file",
+]
+TEMPLATES = [
+    "implement {topic}", "write a c program for {topic}", "{topic} with {n} processes",
+    "simulate {topic} and print the output table {n}", "{topic} variant {n}", "explain {topic} case {n}",
+]
+QUERIES = [
+    "FCFS CPU scheduling program", "Implement first come first serve", "fcfs in C",
+    "bankers algorithm deadlock avoidance", "lru page replacement in c", "shell script to list files in a folder",
+]
+ALL_SECTIONS = {"overview": True, "code": True, "explanation": True}
+
+
+def synthetic_questions(count: int):
+    rng = random.Random(42)
+    for i in range(count):
+        yield rng.choice(TEMPLATES).format(topic=rng.choice(TOPICS), n=rng.randint(1, 10 ** 6))
+
+
+def _latencies(index: SimilarityIndex, lookups: int):
+    latencies = []
+    for i in range(lookups):
+        query = QUERIES[i % len(QUERIES)]
+        start = time.perf_counter()
+        index.lookup(query, {"overview": True})
+        latencies.append(time.perf_counter() - start)
+    latencies.sort()
+    return latencies[len(latencies) // 2] * 1e3, latencies[int(len(latencies) * 0.99)] * 1e3
+
+
+async def _serve_during_rebuild(index: SimilarityIndex, question: str):
+    """Adds a question that triggers a rebuild from inside an event loop, as the server does,
+    and keeps looking up until the rebuild (in a worker thread) has swapped in."""
+    rebuilds = index.stats["rebuilds"]
+    start = time.perf_counter()
+    index.add(question, "trigger", ALL_SECTIONS)
+    add_seconds = time.perf_counter() - start
+    worst_lookup, lookups = 0.0, 0
+    while index.stats["rebuilds"] == rebuilds:
+        start = time.perf_counter()
+        index.lookup(QUERIES[lookups % len(QUERIES)], {"overview": True})
+        worst_lookup = max(worst_lookup, time.perf_counter() - start)
+        lookups += 1
+        await asyncio.sleep(0.001)
+    return add_seconds, worst_lookup, lookups
+
+
+def run(count: int, lookups: int):
+    """Reports build time, memory footprint, lookup latency with and without pending
+    questions, and how long add() and lookups stall while the index is rebuilt."""
+    questions = list(synthetic_questions(count))
+    pending = count // 10
+    index = SimilarityIndex(path=None, min_pending=count + 1)
+
+    rss_before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    start = time.perf_counter()
+    for i, question in enumerate(questions[:count - pending]):
+        index.add(question, f"key-{i}", ALL_SECTIONS)
+    index.rebuild()
+    build_seconds = time.perf_counter() - start
+    rss_after = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    indexed_p50, indexed_p99 = _latencies(index, lookups)
+
+    # The last 10% arrive after the build and stay pending: the state just before a rebuild.
+    for i, question in enumerate(questions[count - pending:]):
+        index.add(question, f"pending-{i}", ALL_SECTIONS)
+    pending_p50, pending_p99 = _latencies(index, lookups)
+
+    index.min_pending = 1
+    add_seconds, worst_lookup, rebuild_lookups = asyncio.run(_serve_during_rebuild(index, questions[0] + " again"))
+
+    print(f"Stored questions:   {count}")
+    print(f"Vocabulary size:    {len(index._vocabulary)} n-grams, {len(index._postings_rows)} postings")
+    print(f"Build time:         {build_seconds:.2f}s (add + rebuild of {count - pending})")
+    print(f"Index memory:       {index.memory_bytes() / 2 ** 20:.1f} MiB (arrays + vocabulary)")
+    print(f"Peak RSS growth:    {(rss_after - rss_before) / 1024:.1f} MiB during build")
+    print(f"Lookup latency:     p50 {indexed_p50:.2f} ms, p99 {indexed_p99:.2f} ms with nothing pending")
+    print(f"Lookup latency:     p50 {pending_p50:.2f} ms, p99 {pending_p99:.2f} ms with {pending} pending")
+    print(f"During a rebuild:   add() {add_seconds * 1e3:.2f} ms, slowest of {rebuild_lookups} lookups "
+          f"{worst_lookup * 1e3:.2f} ms")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the near-duplicate question index.")
+    parser.add_argument("--count", type=int, default=100_000)
+    parser.add_argument("--lookups", type=int, default=500)
+    args = parser.parse_args()
+    run(args.count, args.lookups)
@@ -0,0 +1,54 @@
+import sys
+import json
+import argparse
+from pathlib import Path
+from unittest import mock
+
+# Add the server directory to Python path
+sys.path.append(str(Path(__file__).parent.parent))
+
+from services import similarity
+from services.similarity import SIMILARITY_THRESHOLD, SimilarityIndex
+
+PAIRS = Path(__file__).parent.parent / "tests" / "fixtures" / "question_pairs.json"
+OPTIONS = {"overview": True}
+
+
+def predictions(pairs, threshold: float, content_words: bool):
+    """Whether each pair's query is served the stored question's answer."""
+    stored = sorted({pair["stored"] for pair in pairs})
+    index = SimilarityIndex(path=None)
+    for key, question in enumerate(stored):
+        index.add(question, str(key), OPTIONS)
+    index.rebuild()
+    agree = similarity._words_agree if content_words else (lambda query, stored: True)
+    with mock.patch.object(similarity, "_words_agree", agree):
+        for pair in pairs:
+            match = index.lookup(pair["query"], OPTIONS, threshold=threshold)
+            yield pair, match is not None and stored[int(match[0])] == pair["stored"]
+
+
+def run(show_errors: bool):
+    """Prints precision and recall of paraphrase matching per threshold, with and without the content-word check."""
+    pairs = json.loads(PAIRS.read_text())
+    same = sum(pair["same"] for pair in pairs)
+    print(f"{len(pairs)} pairs: {same} paraphrases, {len(pairs) - same} different tasks\n")
+    print(f"{'threshold':>9}  {'content words':>13}  {'wrong answers':>13}  {'recall':>6}")
+    for threshold in (0.5, 0.55, 0.6, 0.65, 0.7, 0.75, 0.8, 0.85):
+        for content_words in (False, True):
+            results = list(predictions(pairs, threshold, content_words))
+            wrong = [pair for pair, served in results if served and not pair["same"]]
+            found = sum(served and pair["same"] for pair, served in results)
+            marker = "  <- SIMILARITY_THRESHOLD" if content_words and abs(threshold - SIMILARITY_THRESHOLD) < 1e-9 else ""
+            print(f"{threshold:>9.2f}  {'yes' if content_words else 'no':>13}  {len(wrong):>13}  "
+                  f"{found / same:>6.0%}{marker}")
+            if show_errors:
+                for pair in wrong:
+                    print(f"{'':>11}{pair['query']!r} -> {pair['stored']!r}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Calibrate SIMILARITY_THRESHOLD on labelled question pairs.")
+    parser.add_argument("--show-errors", action="store_true", help="list the pairs answered with the wrong task")
+    args = parser.parse_args()
+    run(args.show_errors)
@@ -0,0 +1,87 @@
+"""
+Pre-generates documentation for the standard OS lab syllabus.
+
+Usage:
+    python build_corpus.py            # regenerate entries whose prompt changed
+    python build_corpus.py --force    # regenerate everything
+    python build_corpus.py --only fcfs bankers
+
+An entry is only regenerated when the hash of its full generation prompt
+(plus model name and generation config) differs from the one stored in
+the artifact, so editing one prompt template only rebuilds the questions
+that use it.
+"""
+import json
+import hashlib
+import argparse
+
+from services.corpus import CATALOGUE, CORPUS_PATH, read_artifact, write_artifact
+from services.gemini_os_doc import (
+    EXPECTED_KEYS,
+    build_generation_prompt,
+    generation_config,
+    model,
+    parse_generation_response,
+)
+
+ALL_SECTIONS = {key: True for key in EXPECTED_KEYS}
+
+
+def prompt_hash(prompt: str) -> str:
+    """Fingerprint of everything that determines an entry's output."""
+    fingerprint = json.dumps({
+        "prompt": prompt,
+        "model": getattr(model, "model_name", ""),
+        "config": generation_config,
+    }, sort_keys=True)
+    return hashlib.sha256(fingerprint.encode("utf-8")).hexdigest()
+
+
+def build(path: str, force: bool = False, only=None) -> None:
+    artifact = read_artifact(path)
+    entries = dict(artifact["entries"]) if artifact else {}
+    catalogue_ids = {item["id"] for item in CATALOGUE}
+    # Drop entries for questions removed from the catalogue.
+    entries = {entry_id: entry for entry_id, entry in entries.items() if entry_id in catalogue_ids}
+
+    generated = reused = failed = 0
+    for item in CATALOGUE:
+        if only and item["id"] not in only:
+            continue
+        prompt = build_generation_prompt(item["question"], None, ALL_SECTIONS, item["language"])
+        digest = prompt_hash(prompt)
+        existing = entries.get(item["id"])
+        if not force and existing and existing["prompt_hash"] == digest:
+            reused += 1
+            continue
+
+        print(f"Generating '{item['id']}'...")
+        try:
+            response = model.generate_content(prompt, generation_config=generation_config)
+            result = parse_generation_response(response.text, ALL_SECTIONS)
+        except Exception as e:
+            print(f"Error: Failed to generate '{item['id']}': {e}")
+            failed += 1
+            continue
+        entries[item["id"]] = {
+            "question": item["question"],
+            "language": item["language"],
+            "prompt_hash": digest,
+            "result": result,
+        }
+        generated += 1
+        # Write after every entry so an interrupted build keeps its progress.
+        write_artifact(path, entries)
+
+    write_artifact(path, entries)
+    print(f"Corpus written to {path}: {generated} generated, {reused} unchanged, {failed} failed, "
+          f"{len(entries)} total entries.")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build the prebuilt OS lab documentation corpus.")
+    parser.add_argument("--output", default=CORPUS_PATH)
+    parser.add_argument("--force", action="store_true", help="Regenerate every entry")
+    parser.add_argument("--only", nargs="*", help="Catalogue ids to (re)build")
+    args = parser.parse_args()
+    build(args.output, force=args.force, only=set(args.only) if args.only else None)
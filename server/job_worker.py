@@ -0,0 +1,48 @@
+"""
+Runs documentation jobs without serving HTTP.
+
+Usage:
+    python job_worker.py --workers 8
+
+Jobs queued through POST /jobs are claimed from the same SQLite queue
+(JOBS_PATH) by every server process and every job_worker.py process, so
+job throughput scales separately from the HTTP tier: run the server with
+JOB_WORKERS=0 and as many of these as the model quota allows. Point
+SHARED_STORE_PATH at the server's shared store (serve.py uses
+cache/shared.sqlite3) so all processes draw from one GEMINI_RPM/TPM quota.
+"""
+import os
+import asyncio
+import argparse
+from dotenv import load_dotenv
+
+load_dotenv()
+
+
+async def run(workers: int) -> None:
+    # Imported late so --help works without loading the app.
+    from main import run_documentation_job
+    from services.jobs import JOBS_PATH, JobWorkerPool, job_queue
+
+    pool = JobWorkerPool(job_queue, run_documentation_job, workers)
+    pool.start()
+    print(f"Job worker {os.getpid()} running {workers} workers on {JOBS_PATH}")
+    try:
+        await asyncio.Event().wait()
+    finally:
+        # Hands interrupted jobs back to the queue.
+        await pool.stop()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Run documentation jobs from the shared job queue.")
+    parser.add_argument("--workers", type=int, default=4, help="concurrent jobs in this process")
+    args = parser.parse_args()
+    try:
+        asyncio.run(run(args.workers))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -1,21 +1,79 @@
-from fastapi import FastAPI #, HTTPException
+from fastapi import FastAPI, HTTPException, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel
+from fastapi.responses import FileResponse, JSONResponse, StreamingResponse
+from fastapi.exceptions import RequestValidationError
+from pydantic import BaseModel, Field, ValidationError
 from typing import Dict, Optional, List
-import google.generativeai as genai
-#import re
+import re
 import os
+import json
+import asyncio
+import functools
 from dotenv import load_dotenv
-from services.gemini_os_doc import generate_documentation_with_ai
+from services.gemini_os_doc import (
+    generation_flight,
+    llm_router,
+    model,
+    generate_documentation_with_ai_async,
+    generate_documentation_by_section_async,
+    generate_documentation_incrementally_async,
+    stream_documentation_with_ai,
+    has_error_sections,
+)
+from services.cache import documentation_cache
+from services.batch import run_batch
+from services.corpus import prebuilt_corpus
+from services.similarity import similarity_index
+from services.metrics import PROMETHEUS_CONTENT_TYPE, MetricsMiddleware, render_metrics
+from services.resilience import LLMDeadlineExceeded, LLMUnavailableError, request_deadline
+from services.admission import PRIORITY_LOW, AdmissionRejected, admission_controller, admission_priority
+from services.pdf_export import pdf_exporter
+from services.token_budget import PromptTooLarge
+from services.verification import CODE_VERIFICATION, attach_verification, code_verifier
+from services.documents import choose_encoding, document_headers, document_store, etag_matches, unstored_document
+from services.incremental import remember_submission
+from services.jobs import DONE as JOB_DONE, FAILED as JOB_FAILED, JobQueueFull, JobWorkerPool, job_queue, wait_for_job
+from contextlib import asynccontextmanager
 
 # Load environment variables
 load_dotenv()
 
-# Initialize Gemini API
-genai.configure(api_key=os.getenv("GEMINI_API_KEY"))
-model = genai.GenerativeModel('gemini-1.5-flash')
+BATCH_CONCURRENCY = int(os.getenv("BATCH_CONCURRENCY", "4"))
+BATCH_ITEM_TIMEOUT = float(os.getenv("BATCH_ITEM_TIMEOUT", "120"))
+# Each distinct item may cost a model call; larger batches are refused with 422.
+BATCH_MAX_ITEMS = int(os.getenv("BATCH_MAX_ITEMS", "50"))
+# How often expired rows and files are deleted from the on-disk stores.
+STORAGE_PURGE_INTERVAL = float(os.getenv("STORAGE_PURGE_INTERVAL", "3600"))
+
+async def purge_storage():
+    """Deletes expired entries from the disk stores now and every STORAGE_PURGE_INTERVAL seconds."""
+    while True:
+        for purge in (documentation_cache.purge, document_store.purge, pdf_exporter.purge):
+            try:
+                removed = await asyncio.to_thread(purge)
+                if removed:
+                    print(f"Purged {removed} expired entries ({purge.__qualname__})")
+            except Exception as e:
+                print(f"Warning: Storage purge failed ({purge.__qualname__}): {e}")
+        await asyncio.sleep(STORAGE_PURGE_INTERVAL)
 
-app = FastAPI()
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Load the prebuilt corpus and similarity index in the background so
+    # startup is not delayed; a request arriving first simply loads them on demand.
+    loaders = [asyncio.ensure_future(asyncio.to_thread(loader))
+               for loader in (prebuilt_corpus.load, similarity_index.load)]
+    job_workers.start()
+    purger = asyncio.ensure_future(purge_storage())
+    yield
+    purger.cancel()
+    await job_workers.stop()
+    for loader in loaders:
+        loader.cancel()
+    pdf_exporter.shutdown()
+    code_verifier.shutdown()
+
+app = FastAPI(lifespan=lifespan)
 
 # Enable CORS
 app.add_middleware(
@@ -24,22 +82,351 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["ETag", "Content-Location", "Location"],
 )
 
 class DocumentationRequest(BaseModel):
     question: str
     code: Optional[str] = None
     options: Dict[str, bool]
+    # Generate code first, then the other sections concurrently with per-section caching
+    parallel_sections: bool = False
+    # Set to false to skip compiling and running the generated code (see CODE_VERIFICATION), fed sample_input
+    verify: Optional[bool] = None
+    sample_input: Optional[str] = None
+    # Hash of the result for this student's previous submission (from its Content-Location):
+    # /generate-documentation then regenerates only the sections the code edit made stale
+    previous_document: Optional[str] = None
+
+    def wants_verification(self) -> bool:
+        # The server setting decides; requests can only opt out. Requests carrying their own
+        # code are never verified: the result's code section would be (or echo) that code.
+        return CODE_VERIFICATION and self.verify is not False and not self.code
+
+class BatchDocumentationRequest(BaseModel):
+    items: List[DocumentationRequest] = Field(..., max_length=BATCH_MAX_ITEMS)
+    # Defaults to BATCH_CONCURRENCY; capped server-side
+    concurrency: Optional[int] = None
+
+class PdfExportRequest(BaseModel):
+    question: str
+    # A generated result as returned by /generate-documentation
+    result: Dict[str, Optional[str]]
+    # Sections to include; defaults to all of them
+    sections: Optional[Dict[str, bool]] = None
+
+DISCONNECT_POLL_INTERVAL = 0.5  # seconds between client-disconnect checks
+
+class ClientDisconnected(Exception):
+    """Raised when the client goes away before its result is ready."""
+
+async def run_until_disconnect(http_request: Request, coro):
+    """
+    Awaits `coro` as a task, cancelling it if the client disconnects first.
+
+    Cancellation propagates into the in-flight Gemini call, so abandoned
+    requests stop consuming quota and worker capacity.
+    """
+    task = asyncio.ensure_future(coro)
+    try:
+        while True:
+            done, _ = await asyncio.wait({task}, timeout=DISCONNECT_POLL_INTERVAL)
+            if done:
+                return task.result()
+            if await http_request.is_disconnected():
+                task.cancel()
+                raise ClientDisconnected()
+    finally:
+        if not task.done():
+            task.cancel()
+
+@app.exception_handler(ClientDisconnected)
+async def client_disconnected_handler(request: Request, exc: ClientDisconnected):
+    """Nobody is listening any more; answer with nginx's 'client closed request'."""
+    return Response(status_code=499)
+
+@app.exception_handler(AdmissionRejected)
+async def admission_rejected_handler(request: Request, exc: AdmissionRejected):
+    """The model quota queue is full: ask the client to back off instead of piling on."""
+    return JSONResponse(status_code=429, content={"detail": str(exc)},
+                        headers={"Retry-After": str(int(exc.retry_after + 0.999))})
+
+@app.exception_handler(LLMUnavailableError)
+async def llm_unavailable_handler(request: Request, exc: LLMUnavailableError):
+    """Retries are exhausted (503) or the request deadline passed (504); the client may try again."""
+    status_code = 504 if isinstance(exc, LLMDeadlineExceeded) else 503
+    return JSONResponse(status_code=status_code, content={"detail": str(exc)},
+                        headers={"Retry-After": str(int(exc.retry_after))})
+
+@app.exception_handler(PromptTooLarge)
+async def prompt_too_large_handler(request: Request, exc: PromptTooLarge):
+    """The submitted code cannot be made to fit the prompt budget; retrying will not help."""
+    return JSONResponse(status_code=413, content={"detail": str(exc)})
+
+@app.exception_handler(JobQueueFull)
+async def job_queue_full_handler(request: Request, exc: JobQueueFull):
+    return JSONResponse(status_code=429, content={"detail": str(exc)},
+                        headers={"Retry-After": str(exc.retry_after)})
+
+async def build_documentation(request: DocumentationRequest):
+    """
+    Generates, verifies and stores the result for a request; returns its document.
+
+    Shared by /generate-documentation and the background job workers.
+    """
+    generate = generate_documentation_by_section_async if request.parallel_sections else generate_documentation_with_ai_async
+    if request.previous_document:
+        generate = functools.partial(generate_documentation_incrementally_async,
+                                     previous_document=request.previous_document)
+    with request_deadline():
+        result = await generate(
+            question=request.question,
+            code=request.code,
+            options=request.options
+        )
+    if request.wants_verification():
+        result = await attach_verification(result, request.sample_input)
+    return await store_documentation(result, request)
+
+async def store_documentation(result: Dict, request: DocumentationRequest):
+    """
+    Stores a finished result and records the submission; returns its document.
+
+    Results with failed sections are sent once but never stored: an
+    immutable, content-addressed copy would outlive the failure, and a
+    later resubmission would reuse the error text.
+    """
+    if has_error_sections(result):
+        return unstored_document(result)
+    # Compression happens here, once per distinct result, off the event loop.
+    document = await asyncio.to_thread(document_store.put, result)
+    await asyncio.to_thread(remember_submission, document.hash, request.question, request.code)
+    return document
 
 @app.post("/generate-documentation")
-async def generate_documentation(request: DocumentationRequest):
+async def generate_documentation(request: DocumentationRequest, http_request: Request):
     """Generate documentation based on question and code."""
-    return generate_documentation_with_ai(
-        question=request.question,
-        code=request.code,
-        options=request.options
+    document = await run_until_disconnect(http_request, build_documentation(request))
+    return document_response(document, http_request, cacheable=False)
+
+async def run_documentation_job(payload: Dict) -> Dict:
+    """Job and batch item handler: the work of /generate-documentation, with the result and its hash."""
+    document = await build_documentation(DocumentationRequest(**payload))
+    return {
+        "document": document.hash,
+        "location": f"/documentation/{document.hash}" if document.hash else None,
+        "result": json.loads(document.encodings["identity"]),
+    }
+
+job_workers = JobWorkerPool(job_queue, run_documentation_job)
+
+@app.post("/jobs", status_code=202)
+async def create_job(request: DocumentationRequest):
+    """
+    Queue a documentation request and return its job id at once.
+
+    Poll `GET /jobs/{id}` (optionally with `?wait=<seconds>` to long-poll)
+    for its status; finished jobs include the result. Jobs are stored in
+    SQLite and survive server restarts.
+    """
+    job_id = await asyncio.to_thread(job_queue.enqueue, request.model_dump())
+    job_workers.notify()
+    location = f"/jobs/{job_id}"
+    return JSONResponse(status_code=202, content={"id": job_id, "status": "queued", "location": location},
+                        headers={"Location": location})
+
+@app.get("/jobs/{job_id}")
+async def get_job(job_id: str, wait: float = 0):
+    """Status of a job; with `wait`, holds the request until it finishes (at most 30 seconds)."""
+    job = await wait_for_job(job_queue, job_id, wait)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found or expired.")
+    headers = {} if job["status"] in (JOB_DONE, JOB_FAILED) else {"Retry-After": "1"}
+    return JSONResponse(content=job, headers=headers)
+
+DOCUMENT_HASH = re.compile(r'^[0-9a-f]{64}$')
+
+def document_response(document, http_request: Request, cacheable: bool = True) -> Response:
+    """Sends a stored document in the best encoding the client accepts."""
+    encoding = choose_encoding(http_request.headers.get("accept-encoding"), document.encodings)
+    headers = document_headers(document, encoding, cacheable)
+    if encoding != "identity":
+        headers["Content-Encoding"] = encoding
+    return Response(content=document.encodings[encoding], media_type="application/json", headers=headers)
+
+@app.get("/documentation/{document_hash}")
+async def get_documentation(document_hash: str, http_request: Request):
+    """
+    Fetch a generated result by the hash in its `Content-Location`.
+
+    Documents never change, so responses carry a strong ETag and may be
+    cached for good; a matching `If-None-Match` gets 304 Not Modified.
+    """
+    if not DOCUMENT_HASH.match(document_hash):
+        raise HTTPException(status_code=404, detail="Document not found.")
+    document = await asyncio.to_thread(document_store.get, document_hash)
+    if document is None:
+        raise HTTPException(status_code=404, detail="Document not found or expired; generate it again.")
+    if etag_matches(http_request.headers.get("if-none-match"), document.hash):
+        document_store.stats["not_modified"] += 1
+        encoding = choose_encoding(http_request.headers.get("accept-encoding"), document.encodings)
+        return Response(status_code=304, headers=document_headers(document, encoding))
+    return document_response(document, http_request)
+
+def format_sse(event: str, data) -> str:
+    """Formats one Server-Sent Events message."""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+@app.post("/generate-documentation/stream")
+async def generate_documentation_stream(request: DocumentationRequest):
+    """
+    Stream documentation as Server-Sent Events.
+
+    Emits a `section` event per top-level key as soon as its value is
+    complete, then a `done` event with the full result (or an `error` event).
+    With verification on, a `verification` event with the report comes just
+    before `done`; a `document` event with the result's hash and GET URL
+    does too, unless some sections failed (those results are not stored).
+    Starlette cancels the generator when the client disconnects.
+    """
+    async def event_stream():
+        try:
+            with request_deadline():
+                async for event, data in stream_documentation_with_ai(
+                    question=request.question,
+                    code=request.code,
+                    options=request.options
+                ):
+                    if event == "done" and request.wants_verification():
+                        data = await attach_verification(data, request.sample_input)
+                        if "verification" in data:
+                            yield format_sse("verification", data["verification"])
+                    if event == "done":
+                        document = await store_documentation(data, request)
+                        if document.hash is not None:
+                            yield format_sse("document", {"hash": document.hash,
+                                                          "location": f"/documentation/{document.hash}"})
+                    yield format_sse(event, data)
+        except Exception as e:
+            yield format_sse("error", {"detail": str(e)})
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
     )
 
+@app.post("/generate-documentation/batch")
+async def generate_documentation_batch(request: BatchDocumentationRequest):
+    """
+    Generate documentation for many questions in one request.
+
+    At most BATCH_MAX_ITEMS items are accepted (422 otherwise). Each item
+    is handled like a /generate-documentation request (including
+    `parallel_sections`, `verify` and `previous_document`), and duplicate
+    items are generated once. Results stream back as NDJSON, one line per
+    item in completion order, each carrying the item's `index` and, on
+    success, its `result`, `document` hash and `location`.
+    """
+    async def ndjson_stream():
+        # Batch items yield model quota to interactive requests.
+        with admission_priority(PRIORITY_LOW):
+            async for outcome in run_batch(
+                [item.model_dump() for item in request.items],
+                run_documentation_job,
+                concurrency=request.concurrency or BATCH_CONCURRENCY,
+                item_timeout=BATCH_ITEM_TIMEOUT,
+            ):
+                yield json.dumps(outcome) + "\n"
+
+    return StreamingResponse(ndjson_stream(), media_type="application/x-ndjson")
+
+PDF_FILENAME = "os-lab-documentation.pdf"
+# A full eight-section result is a few tens of KB; larger bodies are refused before rendering.
+PDF_MAX_REQUEST_BYTES = int(os.getenv("PDF_MAX_REQUEST_BYTES", str(512 * 1024)))
+
+async def read_limited_body(http_request: Request, limit: int) -> bytes:
+    """Reads the request body, answering 413 as soon as it exceeds `limit` bytes."""
+    too_large = HTTPException(status_code=413, detail=f"Request body is larger than {limit} bytes.")
+    declared = http_request.headers.get("content-length", "")
+    if declared.isdigit() and int(declared) > limit:
+        raise too_large
+    body = bytearray()
+    async for chunk in http_request.stream():
+        body += chunk
+        if len(body) > limit:
+            raise too_large
+    return bytes(body)
+
+def pdf_response(identifier: str, path: str) -> FileResponse:
+    """Streams a rendered PDF from disk; the file never changes, so clients may cache it for good."""
+    return FileResponse(path, media_type="application/pdf", filename=PDF_FILENAME, headers={
+        "ETag": f'"{identifier}"',
+        "Cache-Control": "public, max-age=31536000, immutable",
+        "Content-Location": f"/documentation/pdf/{identifier}",
+    })
+
+@app.post("/documentation/pdf", openapi_extra={"requestBody": {
+    "required": True, "content": {"application/json": {"schema": PdfExportRequest.model_json_schema()}},
+}})
+async def export_documentation_pdf(http_request: Request):
+    """
+    Render the selected sections of a generated result to PDF.
+
+    The file is stored under a hash of the result and the section selection,
+    so repeat exports are served from disk; `Content-Location` gives a URL
+    for downloading it again without re-sending the result. Bodies over
+    PDF_MAX_REQUEST_BYTES get 413.
+    """
+    body = await read_limited_body(http_request, PDF_MAX_REQUEST_BYTES)
+    try:
+        request = PdfExportRequest.model_validate_json(body)
+    except ValidationError as e:
+        raise RequestValidationError(e.errors())
+    sections = request.sections or {key: True for key in request.result}
+    identifier, path = await pdf_exporter.export(request.question, request.result, sections)
+    return pdf_response(identifier, path)
+
+@app.get("/documentation/pdf/{artifact_id}")
+async def download_documentation_pdf(artifact_id: str):
+    """Download a previously rendered PDF."""
+    path = pdf_exporter.path_for(artifact_id)
+    if path is None:
+        raise HTTPException(status_code=404, detail="PDF not found; export it first.")
+    return pdf_response(artifact_id, path)
+
+@app.get("/cache/stats")
+async def cache_stats():
+    """Hit/miss/eviction counters for the documentation cache, plus request coalescing."""
+    stats = documentation_cache.get_stats()
+    stats["singleflight"] = generation_flight.get_stats()
+    stats["prebuilt_corpus"] = prebuilt_corpus.stats
+    stats["similarity_index"] = similarity_index.stats
+    return stats
+
+def metrics_stats() -> Dict:
+    """Counters of every component, keyed by metric prefix."""
+    return {
+        "doc_cache": documentation_cache.get_stats(),
+        "doc_singleflight": generation_flight.get_stats(),
+        "doc_prebuilt_corpus": prebuilt_corpus.stats,
+        "doc_similarity_index": similarity_index.stats,
+        "doc_llm_backend": model.get_stats(),
+        "doc_llm_routing": llm_router.get_stats(),
+        "doc_admission": admission_controller.get_stats(),
+        "doc_pdf": pdf_exporter.get_stats(),
+        "doc_verification": code_verifier.get_stats(),
+        "doc_documents": document_store.get_stats(),
+        "doc_jobs": job_workers.get_stats(),
+    }
+
+@app.get("/metrics")
+async def metrics():
+    """Prometheus metrics: stage latencies, model calls/tokens, lookups, errors and cache counters."""
+    # Shared quota levels and job counts are SQLite reads; gather everything off the event loop.
+    stats = await asyncio.to_thread(metrics_stats)
+    return Response(content=render_metrics(stats), media_type=PROMETHEUS_CONTENT_TYPE)
+
 @app.get("/")
 async def root():
     """Root endpoint providing API overview."""
@@ -48,6 +435,9 @@ async def root():
         "description": "This API provides code documentation generation services using AI"
     }
 
+# Added last so it wraps the whole app; only known paths get their own label.
+app.add_middleware(MetricsMiddleware, paths=[route.path for route in app.routes])
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=8000)
\ No newline at end of file
@@ -0,0 +1,43 @@
+"""
+Production entry point: serves the API from several worker processes.
+
+Usage:
+    python serve.py --workers 4 --port 8000
+
+Workers share the documentation cache, the similarity index and the model
+rate limits (GEMINI_RPM/GEMINI_TPM apply to all workers together) through
+SQLite files in WAL mode under cache/. Each worker keeps its own in-memory
+LRU, request coalescing and admission queue, and creates its Gemini
+clients on the first request that needs them. Background jobs (POST /jobs)
+are run by JOB_WORKERS workers in each process, or by job_worker.py.
+"""
+import os
+import argparse
+from dotenv import load_dotenv
+
+load_dotenv()
+
+SERVER_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_SHARED_STORE = os.path.join(SERVER_DIR, "cache", "shared.sqlite3")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Run the documentation API with several worker processes.")
+    parser.add_argument("--workers", type=int, default=int(os.getenv("SERVER_WORKERS", str(os.cpu_count() or 1))))
+    parser.add_argument("--host", default=os.getenv("HOST", "0.0.0.0"))
+    parser.add_argument("--port", type=int, default=int(os.getenv("PORT", "8000")))
+    args = parser.parse_args()
+
+    # Read by the workers at import time; they inherit this process's environment.
+    if args.workers > 1:
+        os.environ.setdefault("SHARED_STORE_PATH", DEFAULT_SHARED_STORE)
+    # Split the cores between the workers' code-verification pools instead of giving each all of them.
+    os.environ.setdefault("VERIFY_WORKERS", str(max(1, (os.cpu_count() or 1) // args.workers)))
+
+    # Imported late so this supervisor process never loads the app itself.
+    import uvicorn
+    uvicorn.run("main:app", host=args.host, port=args.port, workers=args.workers, app_dir=SERVER_DIR)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,219 @@
+import os
+import time
+import heapq
+import asyncio
+import itertools
+import contextvars
+from contextlib import contextmanager
+from typing import Dict, List, Optional
+from dotenv import load_dotenv
+
+from services.llm_backend import LLMBackend, is_classification_call, key_count
+from services.metrics import Counter, Histogram
+from services.resilience import LLMUnavailableError
+from services.shared_store import SharedTokenBuckets, shared_token_buckets
+from services.token_budget import estimate_tokens
+
+load_dotenv()
+
+# Outbound limits per API key (requests and prompt tokens per minute). Keys are assumed to
+# belong to separate projects, so the limits add up across GEMINI_API_KEYS.
+GEMINI_RPM = float(os.getenv("GEMINI_RPM", "2000"))
+GEMINI_TPM = float(os.getenv("GEMINI_TPM", "4000000"))
+# Calls allowed to wait for quota; beyond this the server answers 429.
+ADMISSION_MAX_QUEUE = int(os.getenv("ADMISSION_MAX_QUEUE", "100"))
+
+# Lower value = served first.
+PRIORITY_HIGH = 0     # language detection: tiny, and a full generation is waiting on it
+PRIORITY_NORMAL = 1   # interactive generations
+PRIORITY_LOW = 2      # batch items and other background work
+PRIORITY_NAMES = {PRIORITY_HIGH: "high", PRIORITY_NORMAL: "normal", PRIORITY_LOW: "low"}
+
+wait_seconds = Histogram("doc_admission_wait_seconds", "Time model calls waited for quota.", ["priority"])
+rejected_total = Counter("doc_admission_rejected_total", "Model calls rejected because the wait queue was full.",
+                         ["priority"])
+
+
+class AdmissionRejected(LLMUnavailableError):
+    """The quota wait queue is full; answered with 429 and Retry-After."""
+
+
+_priority: contextvars.ContextVar[Optional[int]] = contextvars.ContextVar("admission_priority", default=None)
+
+
+@contextmanager
+def admission_priority(priority: int):
+    """Runs model calls made inside the block (and tasks started there) at `priority`."""
+    token = _priority.set(priority)
+    try:
+        yield
+    finally:
+        _priority.reset(token)
+
+
+class _TokenBucket:
+    """Holds up to one minute of quota and refills continuously."""
+
+    def __init__(self, per_minute: float):
+        self.capacity = per_minute
+        self.rate = per_minute / 60.0
+        self.level = per_minute
+        self.updated = time.monotonic()
+
+    def _refill(self, now: float) -> None:
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, amount: float, now: float) -> float:
+        self._refill(now)
+        missing = min(amount, self.capacity) - self.level
+        return max(0.0, missing / self.rate) if self.rate > 0 else 0.0
+
+    def take(self, amount: float) -> None:
+        self.level -= min(amount, self.capacity)
+
+
+class _LocalTokenBuckets:
+    """Named token buckets private to this process; same interface as SharedTokenBuckets."""
+
+    def __init__(self, limits: Dict[str, float]):
+        self.limits = dict(limits)
+        self._buckets = {name: _TokenBucket(per_minute) for name, per_minute in limits.items()}
+
+    def try_take(self, amounts: Dict[str, float]) -> float:
+        """Debits `amounts` and returns 0, or returns the seconds to wait if any bucket is short."""
+        now = time.monotonic()
+        wait = max(self._buckets[name].wait_time(amount, now) for name, amount in amounts.items())
+        if wait == 0:
+            for name, amount in amounts.items():
+                self._buckets[name].take(amount)
+        return wait
+
+    def levels(self) -> Dict[str, float]:
+        now = time.monotonic()
+        for bucket in self._buckets.values():
+            bucket._refill(now)
+        return {name: bucket.level for name, bucket in self._buckets.items()}
+
+
+class AdmissionController:
+    """
+    Meters outbound model calls against requests-per-minute and tokens-per-minute.
+
+    A call that fits within both token buckets (and has nobody queued ahead
+    of it) proceeds at once. Otherwise it waits in a priority queue, served
+    by priority and then arrival order, until enough quota has refilled. When
+    `max_queue` calls are already waiting, new calls are rejected with
+    AdmissionRejected rather than piling up behind an exhausted quota.
+
+    With a shared store configured (SHARED_STORE_PATH, set by serve.py for
+    several workers) the buckets live in SQLite and all workers share them;
+    the wait queue stays per worker.
+    """
+
+    def __init__(self, rpm: float = GEMINI_RPM, tpm: float = GEMINI_TPM, max_queue: int = ADMISSION_MAX_QUEUE):
+        self.max_queue = max_queue
+        self.rpm = rpm
+        limits = {"requests": rpm, "tokens": tpm}
+        self._quota = shared_token_buckets(limits) or _LocalTokenBuckets(limits)
+        self._queue: List[tuple] = []  # heap of (priority, seq, cost, future)
+        self._seq = itertools.count()
+        self._pump_task: Optional[asyncio.Task] = None
+        self.stats = {"admitted": 0, "queued": 0, "rejected": 0}
+
+    async def _try_take(self, cost: int) -> float:
+        """Takes quota for one call and returns 0, or returns how long until it would fit."""
+        amounts = {"requests": 1, "tokens": cost}
+        if isinstance(self._quota, SharedTokenBuckets):
+            # A write transaction that may wait up to busy_timeout on other workers; keep it off the loop.
+            wait = await asyncio.to_thread(self._quota.try_take, amounts)
+        else:
+            wait = self._quota.try_take(amounts)
+        if wait == 0:
+            self.stats["admitted"] += 1
+        return wait
+
+    def retry_after(self) -> float:
+        """Rough time for the current queue to drain, for the Retry-After header."""
+        rate = self.rpm / 60.0 or 1.0
+        return max(1.0, (len(self._queue) + 1) / rate)
+
+    async def acquire(self, cost: int, priority: int = PRIORITY_NORMAL) -> None:
+        """Waits until a call estimated at `cost` prompt tokens may be sent."""
+        start = time.monotonic()
+        if not self._queue and await self._try_take(cost) == 0:
+            wait_seconds.observe(0.0, priority=PRIORITY_NAMES[priority])
+            return
+        if len(self._queue) >= self.max_queue:
+            self.stats["rejected"] += 1
+            rejected_total.inc(priority=PRIORITY_NAMES[priority])
+            raise AdmissionRejected("Too many requests are waiting for model quota; try again later.",
+                                    retry_after=self.retry_after())
+
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._queue, (priority, next(self._seq), cost, future))
+        self.stats["queued"] += 1
+        if self._pump_task is None or self._pump_task.done():
+            self._pump_task = asyncio.ensure_future(self._pump())
+        try:
+            await future
+        finally:
+            # A cancelled waiter (deadline, client disconnect) is skipped by the pump.
+            future.cancel()
+            wait_seconds.observe(time.monotonic() - start, priority=PRIORITY_NAMES[priority])
+
+    async def _pump(self) -> None:
+        """Admits queued calls in order as quota refills."""
+        while self._queue:
+            entry = self._queue[0]
+            priority, _, cost, future = entry
+            if future.done():
+                heapq.heappop(self._queue)
+                continue
+            delay = await self._try_take(cost)
+            if delay > 0:
+                await asyncio.sleep(delay)
+                continue
+            # Taking shared quota awaits a thread, so a more urgent call may have been queued meanwhile.
+            self._queue.remove(entry)
+            heapq.heapify(self._queue)
+            if not future.done():
+                future.set_result(None)
+
+    def get_stats(self) -> Dict[str, float]:
+        levels = self._quota.levels()
+        return dict(
+            self.stats,
+            queue_depth=sum(1 for _, _, _, future in self._queue if not future.done()),
+            requests_available=round(levels["requests"], 2),
+            tokens_available=round(levels["tokens"]),
+        )
+
+
+class AdmittedBackend(LLMBackend):
+    """
+    Passes async calls through an AdmissionController before reaching `backend`.
+
+    The priority comes from `admission_priority` when set, otherwise
+    detection-sized calls run at PRIORITY_HIGH and everything else at
+    PRIORITY_NORMAL. Sync calls (CLI tools) are not metered.
+    """
+
+    def __init__(self, backend: LLMBackend, controller: AdmissionController):
+        self.backend = backend
+        self.controller = controller
+        self.model_name = backend.model_name
+
+    def generate_content(self, prompt: str, generation_config: Optional[Dict] = None):
+        return self.backend.generate_content(prompt, generation_config=generation_config)
+
+    async def generate_content_async(self, prompt: str, generation_config: Optional[Dict] = None,
+                                     stream: bool = False):
+        priority = _priority.get()
+        if priority is None:
+            priority = PRIORITY_HIGH if is_classification_call(generation_config) else PRIORITY_NORMAL
+        await self.controller.acquire(estimate_tokens(prompt), priority)
+        return await self.backend.generate_content_async(prompt, generation_config=generation_config, stream=stream)
+
+
+admission_controller = AdmissionController(GEMINI_RPM * key_count(), GEMINI_TPM * key_count())
@@ -0,0 +1,67 @@
+import json
+import asyncio
+from typing import Callable, Dict, List, Optional
+
+from services.cache import make_cache_key
+
+# Upper bound on concurrent generations per batch, whatever the caller asks for.
+MAX_BATCH_CONCURRENCY = 16
+
+
+def batch_item_key(item: dict) -> str:
+    """Items with the same question, code, options and per-request settings share one generation."""
+    settings = {name: value for name, value in item.items() if name not in ("question", "code", "options")}
+    return make_cache_key(item["question"], item.get("code"), item["options"]) + json.dumps(settings, sort_keys=True)
+
+
+async def run_batch(items: List[dict], generate: Callable, concurrency: int = 4,
+                    item_timeout: Optional[float] = None):
+    """
+    Runs a batch of documentation requests and yields per-item outcomes as they finish.
+
+    Identical items (same normalized cache key and settings) are generated
+    once and their outcome is reported for every index that asked for it.
+    At most `concurrency` generations are in flight at a time, and results
+    are yielded in completion order so one slow or failing item never holds
+    back the others.
+
+    Args:
+        items: Request dicts with `question`, `code` and `options` keys plus
+            any per-request settings (`verify`, `previous_document`, ...).
+        generate: Coroutine function taking one item and returning a dict of
+            outcome fields (e.g. `result` and `document`).
+        concurrency: Maximum number of concurrent generations.
+        item_timeout: Optional per-item limit in seconds.
+
+    Yields:
+        {"index": i, "status": "ok", **outcome fields} or
+        {"index": i, "status": "error", "error": "..."}
+    """
+    groups: Dict[str, List[int]] = {}
+    unique: Dict[str, dict] = {}
+    for index, item in enumerate(items):
+        key = batch_item_key(item)
+        groups.setdefault(key, []).append(index)
+        unique.setdefault(key, item)
+
+    semaphore = asyncio.Semaphore(max(1, min(concurrency, MAX_BATCH_CONCURRENCY)))
+
+    async def run_one(key: str, item: dict):
+        async with semaphore:
+            try:
+                outcome = await asyncio.wait_for(generate(item), timeout=item_timeout)
+                return key, dict(outcome, status="ok")
+            except asyncio.TimeoutError:
+                return key, {"status": "error", "error": f"Timed out after {item_timeout}s"}
+            except Exception as e:
+                return key, {"status": "error", "error": str(e)}
+
+    tasks = [asyncio.ensure_future(run_one(key, item)) for key, item in unique.items()]
+    try:
+        for next_done in asyncio.as_completed(tasks):
+            key, outcome = await next_done
+            for index in groups[key]:
+                yield dict(outcome, index=index)
+    finally:
+        for task in tasks:
+            task.cancel()
@@ -0,0 +1,381 @@
+import re
+from bisect import bisect_right
+from typing import Dict, List, Optional
+
+# Submissions beyond this size are analyzed up to the limit only.
+MAX_SOURCE_CHARS = 2_000_000
+
+# Leading whitespace is folded into every match so whitespace never costs a
+# token of its own. Outside strings and comments `#` only ever starts a
+# preprocessor directive, which runs to the end of the (continued) line.
+_TOKEN_PATTERN = re.compile(r'''
+    \s*(?:
+      (?P<comment>//[^\n]*|/\*[\s\S]*?(?:\*/|\Z))
+    | (?P<preprocessor>\#(?:[^\n\\]|\\[\s\S])*)
+    | (?P<string>"(?:[^"\\\n]|\\.)*"?|'(?:[^'\\\n]|\\.)*'?)
+    | (?P<ident>[A-Za-z_]\w*)
+    | (?P<number>\.?\d[\w.]*)
+    | (?P<punct>->|\+\+|--|<<=?|>>=?|[<>=!+\-*/%&|^]=|&&|\|\||.)
+    )
+''', re.VERBOSE)
+
+_INCLUDE_PATTERN = re.compile(r'#\s*include\s*[<"]([^>"]+)[>"]')
+_COMMENT_PATTERN = re.compile(r'//[^\n]*|/\*[\s\S]*?(?:\*/|\Z)')
+_DEFINE_PATTERN = re.compile(r'#\s*define\s+(\w+)(\([^)]*\))?\s*(.*)', re.DOTALL)
+
+TYPE_KEYWORDS = {
+    "int", "float", "double", "char", "void", "long", "short", "signed", "unsigned", "_Bool", "bool",
+    "size_t", "pid_t", "key_t", "sem_t", "pthread_t", "pthread_mutex_t", "pthread_cond_t", "FILE",
+}
+QUALIFIERS = {"const", "static", "extern", "volatile", "register", "inline", "auto", "restrict"}
+TAG_KEYWORDS = {"struct", "union", "enum"}
+STATEMENT_KEYWORDS = {"return", "if", "else", "while", "do", "switch", "case", "goto", "break", "continue",
+                      "sizeof", "default"}
+
+
+class _Token:
+    __slots__ = ("kind", "text", "start", "end")
+
+    def __init__(self, kind: str, text: str, start: int, end: int):
+        self.kind = kind
+        self.text = text
+        self.start = start
+        self.end = end
+
+
+def tokenize(code: str) -> List[_Token]:
+    """Splits C source into tokens in one linear pass, dropping whitespace and comments."""
+    tokens = []
+    for match in _TOKEN_PATTERN.finditer(code):
+        kind = match.lastgroup
+        if kind != "comment":
+            start = match.start(kind)
+            tokens.append(_Token(kind, code[start:match.end()], start, match.end()))
+    return tokens
+
+
+def _split_top_level(tokens: List[_Token], separator: str) -> List[List[_Token]]:
+    """Splits tokens at `separator` occurrences outside any (), [] or {}."""
+    parts, current, depth = [], [], 0
+    for token in tokens:
+        if token.kind == "punct":
+            if token.text in "([{":
+                depth += 1
+            elif token.text in ")]}":
+                depth -= 1
+            elif token.text == separator and depth == 0:
+                parts.append(current)
+                current = []
+                continue
+        current.append(token)
+    if current:
+        parts.append(current)
+    return parts
+
+
+class CAnalyzer:
+    """
+    Single-pass structural analyzer for C lab submissions.
+
+    The source is tokenized once (comments, strings and preprocessor lines
+    are recognised by the tokenizer, so braces inside them are ignored) and
+    the token stream is walked once with an explicit brace depth counter.
+    Function bodies are delimited by brace matching, so nested blocks are
+    handled, and nothing recurses, so deeply nested or unbalanced input
+    cannot blow the stack. Work is linear in the size of the input.
+    """
+
+    def __init__(self, code: str):
+        self.code = code[:MAX_SOURCE_CHARS]
+        self.tokens = tokenize(self.code)
+        self._newlines = [m.start() for m in re.finditer("\n", self.code)]
+        self.includes: List[str] = []
+        self.macros: List[Dict] = []
+        self.structs: List[Dict] = []
+        self.functions: List[Dict] = []
+        self.prototypes: List[Dict] = []
+        self.variables: List[Dict] = []
+        self._type_names = set(TYPE_KEYWORDS)
+
+    def analyze(self) -> Dict[str, List]:
+        """Walks the token stream once and returns everything it found."""
+        tokens = self.tokens
+        i, count = 0, len(tokens)
+        statement: List[_Token] = []
+        while i < count:
+            token = tokens[i]
+            if token.kind == "preprocessor":
+                self._preprocessor(token.text)
+                i += 1
+                continue
+            if token.kind == "punct" and token.text == ";":
+                self._file_scope_declaration(statement)
+                statement = []
+                i += 1
+                continue
+            if token.kind == "punct" and token.text == "{":
+                close = self._matching_brace(i)
+                if self._is_function_header(statement):
+                    self._function(statement, i, close)
+                    statement = []
+                elif statement and statement[-1].text != "=" and any(t.text in TAG_KEYWORDS for t in statement):
+                    self._struct(statement, i, close)
+                    # Declarators after the closing brace (`} procs[10];`) are handled at the `;`.
+                    statement.append(_Token("braced", "", token.start, token.end))
+                else:
+                    statement.append(self._initializer(i, close))
+                i = close + 1
+                continue
+            statement.append(token)
+            i += 1
+
+        return {
+            "includes": self.includes,
+            "macros": self.macros,
+            "structs": self.structs,
+            "functions": self.functions,
+            "prototypes": self.prototypes,
+            "variables": self.variables,
+        }
+
+    # --- File scope ---
+
+    def _preprocessor(self, text: str) -> None:
+        include = _INCLUDE_PATTERN.match(text.strip())
+        if include:
+            self.includes.append(include.group(1).strip())
+            return
+        define = _DEFINE_PATTERN.match(text.strip())
+        if define:
+            self.macros.append({
+                "name": define.group(1),
+                "parameters": define.group(2),
+                "value": _COMMENT_PATTERN.sub(' ', re.sub(r'\\\n', ' ', define.group(3))).strip() or None,
+            })
+
+    def _matching_brace(self, open_index: int) -> int:
+        depth = 0
+        tokens = self.tokens
+        for i in range(open_index, len(tokens)):
+            text = tokens[i].text
+            if tokens[i].kind != "punct":
+                continue
+            if text == "{":
+                depth += 1
+            elif text == "}":
+                depth -= 1
+                if depth == 0:
+                    return i
+        return len(tokens)  # Unbalanced: the block runs to the end of the input.
+
+    def _line(self, offset: int) -> int:
+        return bisect_right(self._newlines, offset - 1) + 1
+
+    def _initializer(self, open_index: int, close_index: int) -> _Token:
+        """Collapses a brace-enclosed initializer list into a single token."""
+        start = self.tokens[open_index]
+        end = self.tokens[close_index].end if close_index < len(self.tokens) else len(self.code)
+        return _Token("initializer", self.code[start.start:end], start.start, end)
+
+    @staticmethod
+    def _is_function_header(statement: List[_Token]) -> bool:
+        if len(statement) < 3 or statement[-1].text != ")":
+            return False
+        if any(t.text == "=" or t.kind == "braced" for t in statement):
+            return False
+        paren = next((k for k, t in enumerate(statement) if t.text == "("), None)
+        return paren is not None and paren > 0 and statement[paren - 1].kind == "ident" \
+            and statement[paren - 1].text not in STATEMENT_KEYWORDS
+
+    def _function(self, header: List[_Token], open_index: int, close_index: int) -> None:
+        paren = next(k for k, t in enumerate(header) if t.text == "(")
+        name_token = header[paren - 1]
+        return_type = " ".join(t.text for t in header[:paren - 1])
+        parameter_tokens = header[paren + 1:-1]
+        parameters = []
+        for part in _split_top_level(parameter_tokens, ","):
+            if len(part) == 1 and part[0].text == "void":
+                continue
+            declarator = self._declarator(part)
+            if declarator:
+                parameters.append(declarator)
+
+        end = self.tokens[close_index].end if close_index < len(self.tokens) else len(self.code)
+        self.functions.append({
+            "name": name_token.text,
+            "return_type": return_type,
+            "parameters": parameters,
+            "signature": self.code[header[0].start:header[-1].end],
+            "body": self.code[header[0].start:end],
+            "start_line": self._line(header[0].start),
+            "end_line": self._line(end - 1),
+        })
+        self._local_declarations(open_index + 1, close_index, name_token.text)
+
+    def _struct(self, statement: List[_Token], open_index: int, close_index: int) -> None:
+        tag_index = max(k for k, t in enumerate(statement) if t.text in TAG_KEYWORDS)
+        kind = statement[tag_index].text
+        name = statement[tag_index + 1].text if tag_index + 1 < len(statement) else None
+        members = []
+        if kind != "enum":
+            body = self.tokens[open_index + 1:close_index]
+            for member in _split_top_level(body, ";"):
+                for declarator in self._declarations(member):
+                    members.append(declarator)
+        entry = {"kind": kind, "name": name, "members": members, "typedef": None}
+        # `typedef struct {...} Name;` -- the alias is the identifier after the brace.
+        following = self.tokens[close_index + 1] if close_index + 1 < len(self.tokens) else None
+        if statement[0].text == "typedef" and following is not None and following.kind == "ident":
+            entry["typedef"] = following.text
+            self._type_names.add(following.text)
+        if name:
+            self._type_names.add(name)
+        self.structs.append(entry)
+
+    def _file_scope_declaration(self, statement: List[_Token]) -> None:
+        if not statement:
+            return
+        if statement[0].text == "typedef":
+            if statement[-1].kind == "ident":
+                self._type_names.add(statement[-1].text)
+            return
+        marker = next((k for k, t in enumerate(statement) if t.kind == "braced"), None)
+        if marker is not None:
+            # struct definition, possibly followed by variable declarators.
+            tag_index = max(k for k, t in enumerate(statement[:marker]) if t.text in TAG_KEYWORDS)
+            type_tokens = statement[tag_index:marker]
+            if len(type_tokens) == 1:
+                type_tokens.append(_Token("ident", "(anonymous)", statement[marker].start, statement[marker].end))
+            declarators = statement[marker + 1:]
+            if declarators:
+                self._add_variables(type_tokens[:2] + declarators, "global")
+            return
+        if self._is_function_header(statement):
+            paren = next(k for k, t in enumerate(statement) if t.text == "(")
+            self.prototypes.append({
+                "name": statement[paren - 1].text,
+                "signature": self.code[statement[0].start:statement[-1].end],
+            })
+            return
+        self._add_variables(statement, "global")
+
+    # --- Declarations ---
+
+    def _local_declarations(self, start: int, stop: int, scope: str) -> None:
+        tokens = self.tokens
+        stop = min(stop, len(tokens))
+        statement: List[_Token] = []
+        depth = 0
+        i = start
+        while i < stop:
+            token = tokens[i]
+            i += 1
+            if token.kind == "preprocessor":
+                continue
+            if token.kind == "punct":
+                if token.text == "{" and statement and statement[-1].text in ("=", ","):
+                    close = self._matching_brace(i - 1)
+                    statement.append(self._initializer(i - 1, close))
+                    i = close + 1
+                    continue
+                if token.text in ";{}" and depth == 0:
+                    self._add_variables(statement, scope)
+                    statement = []
+                    continue
+                if token.text in "([":
+                    depth += 1
+                elif token.text in ")]":
+                    depth = max(depth - 1, 0)
+            statement.append(token)
+            # `for (int i = 0; ...)`: the init clause is a declaration of its own.
+            if len(statement) == 2 and statement[0].text == "for" and statement[1].text == "(":
+                statement = []
+                depth -= 1
+
+    def _add_variables(self, statement: List[_Token], scope: str) -> None:
+        for declarator in self._declarations(statement):
+            declarator["scope"] = scope
+            self.variables.append(declarator)
+
+    def _declarations(self, statement: List[_Token]) -> List[Dict]:
+        """Parses `type a = 1, *b, c[N][M];` into one entry per declarator."""
+        if not statement:
+            return []
+        k = 0
+        while k < len(statement) and statement[k].text in QUALIFIERS:
+            k += 1
+        type_start = k
+        if k < len(statement) and statement[k].text in TAG_KEYWORDS:
+            k += 2
+        elif k < len(statement) and statement[k].text in self._type_names:
+            while k < len(statement) and statement[k].text in self._type_names:
+                k += 1
+        else:
+            return []
+        if k >= len(statement):
+            return []
+        type_name = " ".join(t.text for t in statement[type_start:k])
+
+        declarations = []
+        for part in _split_top_level(statement[k:], ","):
+            declarator = self._declarator(part, type_name)
+            if declarator:
+                declarations.append(declarator)
+        return declarations
+
+    def _declarator(self, tokens: List[_Token], type_name: Optional[str] = None) -> Optional[Dict]:
+        """
+        Parses one declarator. With `type_name` given, `tokens` start at the
+        declarator; otherwise (parameters) the type is everything before the name.
+        """
+        if not tokens:
+            return None
+        equals = next((k for k, t in enumerate(tokens) if t.text == "="), len(tokens))
+        head = tokens[:equals]
+        bracket = next((k for k, t in enumerate(head) if t.text == "["), len(head))
+        name_index = next((k for k in range(bracket - 1, -1, -1) if head[k].kind == "ident"), None)
+        if name_index is None:
+            return None
+        if name_index > 0 and head[name_index - 1].text == "(" and type_name is not None:
+            return None  # Function pointer or call expression: not worth guessing.
+        pointer = sum(1 for t in head[:name_index] if t.text == "*")
+        if type_name is None:
+            type_tokens = [t.text for t in head[:name_index] if t.text != "*"]
+            if not type_tokens:
+                return None
+            type_name = " ".join(type_tokens)
+        elif any(t.kind != "punct" or t.text != "*" for t in head[:name_index]):
+            return None
+
+        dimensions = []
+        current: List[str] = []
+        depth = 0
+        for t in head[bracket:]:
+            if t.text == "[":
+                depth += 1
+                if depth == 1:
+                    current = []
+                    continue
+            elif t.text == "]":
+                depth -= 1
+                if depth == 0:
+                    dimensions.append(" ".join(current))
+                    continue
+            if depth >= 1:
+                current.append(t.text)
+
+        initial_value = None
+        if equals + 1 < len(tokens):
+            initial_value = self.code[tokens[equals + 1].start:tokens[-1].end].strip()
+        return {
+            "type": type_name + ("*" * pointer if pointer else ""),
+            "name": head[name_index].text,
+            "initial_value": initial_value,
+            "pointer": pointer,
+            "dimensions": dimensions,
+        }
+
+
+def analyze_c_code(code: str) -> Dict[str, List]:
+    """Returns includes, macros, structs, functions, prototypes and variables of `code`."""
+    return CAnalyzer(code).analyze()
@@ -0,0 +1,169 @@
+import os
+import re
+import json
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Dict, Optional
+from dotenv import load_dotenv
+
+from services.shared_store import connect
+
+load_dotenv()
+
+
+def normalize_question(question: str) -> str:
+    """Lower-cases the question and collapses whitespace/trailing punctuation."""
+    return re.sub(r'\s+', ' ', question.strip().lower()).rstrip(' .?!')
+
+
+def normalize_code(code: Optional[str]) -> str:
+    """Strips trailing whitespace per line and surrounding blank lines."""
+    if not code:
+        return ""
+    return "\n".join(line.rstrip() for line in code.strip().splitlines())
+
+
+def make_cache_key(question: str, code: Optional[str], options: Dict[str, bool], language: str = "auto") -> str:
+    """
+    Returns a content-addressed key for a documentation request.
+
+    Two requests map to the same key when they differ only in question
+    casing/whitespace, code indentation at line ends, or the order and
+    unselected entries of `options`.
+    """
+    requested_sections = sorted(option for option, selected in options.items() if selected)
+    payload = json.dumps({
+        "question": normalize_question(question),
+        "code": normalize_code(code),
+        "sections": requested_sections,
+        "language": language,
+    }, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def make_section_cache_key(question: str, source_code: Optional[str], language: str, section: str) -> str:
+    """
+    Returns the key for one independently generated section.
+
+    `source_code` is the code the section documents (user-provided or
+    generated), so dependent sections are invalidated when the code changes.
+    """
+    payload = json.dumps({
+        "question": normalize_question(question),
+        "code": normalize_code(source_code),
+        "language": language,
+        "section": section,
+    }, sort_keys=True, separators=(",", ":"))
+    return "section:" + hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class DocumentationCache:
+    """
+    Two-tier result cache: an in-memory LRU with TTL in front of a SQLite file.
+
+    The memory tier answers repeat questions without any I/O; the disk tier
+    survives restarts and is promoted into memory on first access. Entries in
+    both tiers expire `ttl` seconds after they were stored; `purge` deletes
+    expired disk rows nobody asked for again. The disk tier is in WAL mode,
+    so several worker processes can share one file.
+    """
+
+    def __init__(self, path: Optional[str], max_entries: int = 512, ttl: float = 7 * 24 * 3600):
+        self.path = path
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._memory: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._conn = None
+        self.stats = {"hits": 0, "disk_hits": 0, "misses": 0, "evictions": 0, "expirations": 0, "purged": 0}
+
+        if path:
+            self._conn = connect(path)
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS documentation_cache ("
+                "key TEXT PRIMARY KEY, value TEXT NOT NULL, created_at REAL NOT NULL)"
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS documentation_cache_by_age ON documentation_cache (created_at)")
+            self._conn.commit()
+
+    def get(self, key: str) -> Optional[dict]:
+        """Returns the cached result for `key`, or None on a miss."""
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                created_at, value = entry
+                if now - created_at <= self.ttl:
+                    self._memory.move_to_end(key)
+                    self.stats["hits"] += 1
+                    return json.loads(value)
+                del self._memory[key]
+                self.stats["expirations"] += 1
+
+            if self._conn is not None:
+                row = self._conn.execute(
+                    "SELECT value, created_at FROM documentation_cache WHERE key = ?", (key,)
+                ).fetchone()
+                if row is not None:
+                    value, created_at = row
+                    if now - created_at <= self.ttl:
+                        self._remember(key, created_at, value)
+                        self.stats["hits"] += 1
+                        self.stats["disk_hits"] += 1
+                        return json.loads(value)
+                    self._conn.execute("DELETE FROM documentation_cache WHERE key = ?", (key,))
+                    self._conn.commit()
+                    self.stats["expirations"] += 1
+
+            self.stats["misses"] += 1
+            return None
+
+    def set(self, key: str, result: dict) -> None:
+        """Stores `result` in both tiers."""
+        value = json.dumps(result, separators=(",", ":"))
+        created_at = time.time()
+        with self._lock:
+            self._remember(key, created_at, value)
+            if self._conn is not None:
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO documentation_cache (key, value, created_at) VALUES (?, ?, ?)",
+                    (key, value, created_at),
+                )
+                self._conn.commit()
+
+    def purge(self) -> int:
+        """Deletes expired disk entries and returns how many were removed."""
+        if self._conn is None:
+            return 0
+        with self._lock:
+            removed = self._conn.execute(
+                "DELETE FROM documentation_cache WHERE created_at < ?", (time.time() - self.ttl,)
+            ).rowcount
+            self._conn.commit()
+            self.stats["purged"] += removed
+        return removed
+
+    def _remember(self, key: str, created_at: float, value: str) -> None:
+        # Caller holds self._lock. Values are kept serialized so callers can
+        # never mutate a cached result in place.
+        self._memory[key] = (created_at, value)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+            self.stats["evictions"] += 1
+
+    def get_stats(self) -> Dict[str, int]:
+        """Returns a snapshot of the hit/miss/eviction counters."""
+        with self._lock:
+            stats = dict(self.stats)
+            stats["memory_entries"] = len(self._memory)
+        return stats
+
+
+documentation_cache = DocumentationCache(
+    path=os.getenv("DOC_CACHE_PATH", os.path.join(os.path.dirname(os.path.dirname(__file__)), "cache", "documentation.sqlite3")),
+    max_entries=int(os.getenv("DOC_CACHE_MAX_ENTRIES", "512")),
+    ttl=float(os.getenv("DOC_CACHE_TTL_SECONDS", str(7 * 24 * 3600))),
+)
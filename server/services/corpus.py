@@ -0,0 +1,161 @@
+import os
+import re
+import gzip
+import json
+import threading
+from typing import Dict, List, Optional
+from dotenv import load_dotenv
+
+from services.cache import normalize_question
+
+load_dotenv()
+
+# Bump when the artifact layout changes; old artifacts are then ignored.
+CORPUS_FORMAT_VERSION = 1
+
+CORPUS_PATH = os.getenv(
+    "CORPUS_PATH",
+    os.path.join(os.path.dirname(os.path.dirname(__file__)), "corpus", f"os_lab_corpus.v{CORPUS_FORMAT_VERSION}.json.gz"),
+)
+
+# The canonical OS lab syllabus, mirroring the problems the generation prompts call out.
+CATALOGUE: List[Dict] = [
+    {"id": "fcfs", "language": "C",
+     "question": "Implement FCFS CPU scheduling algorithm.",
+     "aliases": ["fcfs", "fcfs scheduling", "fcfs cpu scheduling", "first come first serve scheduling",
+                 "first come first serve cpu scheduling", "first come first served scheduling"]},
+    {"id": "sjf", "language": "C",
+     "question": "Implement SJF CPU scheduling algorithm.",
+     "aliases": ["sjf", "sjf scheduling", "sjf cpu scheduling", "shortest job first scheduling",
+                 "shortest job first cpu scheduling"]},
+    {"id": "round_robin", "language": "C",
+     "question": "Implement Round Robin CPU scheduling algorithm.",
+     "aliases": ["round robin", "round robin scheduling", "rr scheduling", "round robin cpu scheduling"]},
+    {"id": "priority", "language": "C",
+     "question": "Implement Priority CPU scheduling algorithm.",
+     "aliases": ["priority scheduling", "priority cpu scheduling"]},
+    {"id": "first_fit", "language": "C",
+     "question": "Implement First Fit memory allocation.",
+     "aliases": ["first fit", "first fit memory allocation", "first fit algorithm"]},
+    {"id": "best_fit", "language": "C",
+     "question": "Implement Best Fit memory allocation.",
+     "aliases": ["best fit", "best fit memory allocation", "best fit algorithm"]},
+    {"id": "worst_fit", "language": "C",
+     "question": "Implement Worst Fit memory allocation.",
+     "aliases": ["worst fit", "worst fit memory allocation", "worst fit algorithm"]},
+    {"id": "bankers", "language": "C",
+     "question": "Implement Bankers algorithm for deadlock avoidance.",
+     "aliases": ["bankers algorithm", "banker's algorithm", "bankers algorithm for deadlock avoidance",
+                 "banker's algorithm for deadlock avoidance", "deadlock avoidance using bankers algorithm"]},
+    {"id": "shared_memory", "language": "C",
+     "question": "Implement inter process communication using shared memory.",
+     "aliases": ["shared memory", "ipc using shared memory", "inter process communication using shared memory",
+                 "interprocess communication using shared memory"]},
+    {"id": "producer_consumer", "language": "C",
+     "question": "Implement the producer consumer problem using semaphores.",
+     "aliases": ["producer consumer", "producer consumer problem", "producer consumer problem using semaphores",
+                 "producer-consumer problem"]},
+    {"id": "list_directory", "language": "Shell",
+     "question": "Create a shell programming which lists files and folders in a directory, and save this information into a textfile.",
+     "aliases": ["shell script to list files and folders in a directory and save into a textfile"]},
+    {"id": "file_exists", "language": "Shell",
+     "question": "Create a shell script which checks a file exists or not in a given directory. If it doesnt exist, create that file. If it exists , delete that file.",
+     "aliases": ["shell script to check if a file exists in a directory"]},
+]
+
+# Leading phrases students add that do not change which problem is meant.
+_FILLER = re.compile(r'^(write|create|develop)?\s*(a|an)?\s*(c\s+)?(program|code)?\s*(to|for)?\s*'
+                     r'(implement|simulate)?\s*(the)?\s*')
+_TRAILING = re.compile(r'(\s+(algorithm|program|problem))?(\s+in\s+c)?$')
+
+
+def canonical_question(question: str) -> str:
+    """Normalizes a question and strips filler such as "write a C program to implement"."""
+    normalized = normalize_question(question)
+    stripped = _TRAILING.sub("", _FILLER.sub("", normalized, count=1), count=1)
+    return stripped or normalized
+
+
+class PrebuiltCorpus:
+    """
+    Read-only documentation for the standard syllabus, loaded lazily from one gzip'd JSON file.
+
+    The artifact holds `entries` (catalogue id -> question, language,
+    prompt hash and full eight-section result) and an `index` from
+    canonical question text to catalogue id.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._loaded = False
+        self.entries: Dict[str, Dict] = {}
+        self.index: Dict[str, str] = {}
+        self.stats = {"hits": 0, "misses": 0}
+
+    def load(self) -> None:
+        """Loads the artifact once; a missing or outdated file leaves the corpus empty."""
+        if self._loaded:
+            return
+        with self._lock:
+            if self._loaded:
+                return
+            artifact = read_artifact(self.path)
+            if artifact is not None:
+                self.entries = artifact["entries"]
+                self.index = artifact["index"]
+                print(f"Loaded prebuilt corpus with {len(self.entries)} entries from {self.path}")
+            self._loaded = True
+
+    def lookup(self, question: str, code: Optional[str], options: Dict[str, bool]) -> Optional[Dict[str, str]]:
+        """
+        Returns prebuilt documentation for a catalogue question, or None.
+
+        Only questions without user code can match, since the prebuilt
+        answers document their own generated code. Unrequested sections are
+        blanked so the result looks exactly like a fresh generation.
+        """
+        if code and code.strip():
+            return None
+        self.load()
+        entry_id = self.index.get(canonical_question(question))
+        if entry_id is None:
+            self.stats["misses"] += 1
+            return None
+        self.stats["hits"] += 1
+        result = self.entries[entry_id]["result"]
+        return {key: (value if options.get(key) else "") for key, value in result.items()}
+
+
+def read_artifact(path: str) -> Optional[Dict]:
+    """Reads a corpus artifact, returning None if it is missing or of another format version."""
+    if not os.path.exists(path):
+        return None
+    with gzip.open(path, "rt", encoding="utf-8") as f:
+        artifact = json.load(f)
+    if artifact.get("format_version") != CORPUS_FORMAT_VERSION:
+        print(f"Warning: Ignoring corpus {path} with format version {artifact.get('format_version')}")
+        return None
+    return artifact
+
+
+def write_artifact(path: str, entries: Dict[str, Dict]) -> None:
+    """Writes `entries` plus the alias index as a single compact gzip'd JSON file."""
+    index = {}
+    for item in CATALOGUE:
+        if item["id"] not in entries:
+            continue
+        for text in [item["question"]] + item["aliases"]:
+            index[canonical_question(text)] = item["id"]
+
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    tmp_path = path + ".tmp"
+    with gzip.open(tmp_path, "wt", encoding="utf-8", compresslevel=9) as f:
+        json.dump({"format_version": CORPUS_FORMAT_VERSION, "entries": entries, "index": index},
+                  f, separators=(",", ":"))
+    os.replace(tmp_path, path)
+
+
+prebuilt_corpus = PrebuiltCorpus(CORPUS_PATH)
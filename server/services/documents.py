@@ -0,0 +1,221 @@
+import os
+import json
+import gzip
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Dict, Optional
+from dotenv import load_dotenv
+
+from services.shared_store import connect
+
+try:
+    import brotli
+except ImportError:  # optional: without it documents are served gzip-compressed or plain
+    brotli = None
+
+load_dotenv()
+
+# Responses smaller than this are not worth compressing.
+MIN_COMPRESS_BYTES = 512
+GZIP_LEVEL = 9
+BROTLI_QUALITY = 9
+
+# Encodings in order of preference, with the ETag suffix for each representation.
+_ETAG_SUFFIXES = {"br": ".br", "gzip": ".gz", "identity": ""}
+
+
+def canonical_json(result: Dict) -> bytes:
+    """The exact bytes served for a result; equal results always serialize identically."""
+    return json.dumps(result, sort_keys=True, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+
+
+def document_hash(body: bytes) -> str:
+    return hashlib.sha256(body).hexdigest()
+
+
+class Document:
+    """One stored result: its canonical JSON and the precompressed variants."""
+    __slots__ = ("hash", "encodings")
+
+    def __init__(self, digest: str, encodings: Dict[str, bytes]):
+        self.hash = digest
+        self.encodings = encodings
+
+    def etag(self, encoding: str) -> str:
+        # Strong ETags must differ between encodings of the same content.
+        return f'"{self.hash}{_ETAG_SUFFIXES[encoding]}"'
+
+
+def _compress(body: bytes) -> Dict[str, bytes]:
+    encodings = {"identity": body}
+    if len(body) >= MIN_COMPRESS_BYTES:
+        # mtime=0 keeps the gzip bytes (and so the stored variant) deterministic.
+        encodings["gzip"] = gzip.compress(body, compresslevel=GZIP_LEVEL, mtime=0)
+        if brotli is not None:
+            encodings["br"] = brotli.compress(body, quality=BROTLI_QUALITY)
+    return encodings
+
+
+def choose_encoding(accept_encoding: Optional[str], available) -> str:
+    """Picks the preferred encoding in `available` that the Accept-Encoding header allows."""
+    accepted: Dict[str, float] = {}
+    for part in (accept_encoding or "").split(","):
+        name, _, params = part.strip().partition(";")
+        quality = 1.0
+        if params.strip().startswith("q="):
+            try:
+                quality = float(params.strip()[2:])
+            except ValueError:
+                continue
+        if name:
+            accepted[name.strip().lower()] = quality
+    for encoding in _ETAG_SUFFIXES:
+        if encoding == "identity":
+            return encoding
+        if encoding in available and accepted.get(encoding, accepted.get("*", 0.0)) > 0:
+            return encoding
+    return "identity"
+
+
+def etag_matches(if_none_match: Optional[str], digest: str) -> bool:
+    """True if If-None-Match names any representation of `digest` (or is `*`)."""
+    if not if_none_match:
+        return False
+    for tag in if_none_match.split(","):
+        tag = tag.strip()
+        if tag == "*":
+            return True
+        if tag.startswith("W/"):
+            tag = tag[2:]
+        value = tag.strip('"')
+        for suffix in _ETAG_SUFFIXES.values():
+            if suffix and value.endswith(suffix):
+                value = value[:-len(suffix)]
+                break
+        if value == digest:
+            return True
+    return False
+
+
+class DocumentStore:
+    """
+    Generated results stored under the SHA-256 of their canonical JSON.
+
+    A document never changes once stored, so it can be served with a strong
+    ETag and cached forever by browsers and proxies. Compressed variants
+    are made once, when the document is stored. Recent documents are also
+    kept in memory; the SQLite table (WAL, shareable between workers) keeps
+    them for `ttl` seconds, after which `purge` deletes them.
+    """
+
+    def __init__(self, path: Optional[str], max_entries: int = 256, ttl: float = 30 * 24 * 3600):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._memory: "OrderedDict[str, Document]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._conn = None
+        self.stats = {"stored": 0, "hits": 0, "misses": 0, "not_modified": 0, "purged": 0}
+        if path:
+            self._conn = connect(path)
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS documents ("
+                "hash TEXT PRIMARY KEY, identity BLOB NOT NULL, gzip BLOB, br BLOB, created_at REAL NOT NULL)"
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS documents_by_age ON documents (created_at)")
+            self._conn.commit()
+
+    def put(self, result: Dict) -> Document:
+        """Stores `result` (if new) and returns its document."""
+        body = canonical_json(result)
+        digest = document_hash(body)
+        with self._lock:
+            document = self._memory.get(digest)
+            if document is not None:
+                self._memory.move_to_end(digest)
+                return document
+        document = Document(digest, _compress(body))
+        with self._lock:
+            self._remember(document)
+            self.stats["stored"] += 1
+            if self._conn is not None:
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO documents (hash, identity, gzip, br, created_at) VALUES (?, ?, ?, ?, ?)",
+                    (digest, body, document.encodings.get("gzip"), document.encodings.get("br"), time.time()),
+                )
+                self._conn.commit()
+        return document
+
+    def get(self, digest: str) -> Optional[Document]:
+        """Returns the stored document, or None if it is unknown or has expired."""
+        with self._lock:
+            document = self._memory.get(digest)
+            if document is not None:
+                self._memory.move_to_end(digest)
+                self.stats["hits"] += 1
+                return document
+            if self._conn is not None:
+                row = self._conn.execute(
+                    "SELECT identity, gzip, br, created_at FROM documents WHERE hash = ?", (digest,)
+                ).fetchone()
+                if row is not None and time.time() - row[3] <= self.ttl:
+                    encodings = {name: data for name, data in zip(("identity", "gzip", "br"), row[:3]) if data}
+                    document = Document(digest, encodings)
+                    self._remember(document)
+                    self.stats["hits"] += 1
+                    return document
+            self.stats["misses"] += 1
+            return None
+
+    def purge(self) -> int:
+        """Deletes expired documents from disk and returns how many were removed."""
+        if self._conn is None:
+            return 0
+        with self._lock:
+            removed = self._conn.execute("DELETE FROM documents WHERE created_at < ?",
+                                         (time.time() - self.ttl,)).rowcount
+            self._conn.commit()
+            self.stats["purged"] += removed
+        return removed
+
+    def _remember(self, document: Document) -> None:
+        # Caller holds self._lock.
+        self._memory[document.hash] = document
+        self._memory.move_to_end(document.hash)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+
+    def get_stats(self) -> Dict[str, int]:
+        with self._lock:
+            return dict(self.stats, memory_entries=len(self._memory))
+
+
+def unstored_document(result: Dict) -> Document:
+    """A result served once and never stored (e.g. one with failed sections); it has no hash."""
+    return Document(None, {"identity": canonical_json(result)})
+
+
+def document_headers(document: Document, encoding: str, cacheable: bool = True) -> Dict[str, str]:
+    """
+    Validator and caching headers for a document sent with `encoding`.
+
+    `cacheable` marks it as immutable for a year; off for the POST that
+    created it, which only points at the GET URL via Content-Location.
+    Unstored documents get neither validators nor a location.
+    """
+    if document.hash is None:
+        return {"Cache-Control": "no-store"}
+    headers = {
+        "ETag": document.etag(encoding),
+        "Vary": "Accept-Encoding",
+        "Content-Location": f"/documentation/{document.hash}",
+    }
+    if cacheable:
+        headers["Cache-Control"] = "public, max-age=31536000, immutable"
+    return headers
+
+
+document_store = DocumentStore(
+    path=os.getenv("DOC_CACHE_PATH", os.path.join(os.path.dirname(os.path.dirname(__file__)), "cache", "documentation.sqlite3")) or None,
+)
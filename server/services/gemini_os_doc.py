@@ -1,82 +1,95 @@
 import os
 import re
 import json
+import asyncio
 from typing import Dict, List, Optional
 from dotenv import load_dotenv
-import google.generativeai as genai
-from google.generativeai import GenerativeModel
+from services.cache import documentation_cache, make_cache_key, make_section_cache_key, normalize_question
+from services.language_classifier import classify_language
+from services.json_stream import IncrementalJSONParser
+from services.singleflight import SingleFlight
+from services.corpus import prebuilt_corpus
+from services.similarity import similarity_index
+from services.c_analyzer import analyze_c_code
+from services.llm_backend import create_backend
+from services.resilience import LLMUnavailableError, ResilientBackend
+from services.admission import AdmittedBackend, admission_controller
+from services.metrics import errors_total, lookups_total, record_llm_call, salvage_total, span
+from services.json_salvage import repair_json, salvage_sections
+from services.token_budget import (
+    PROMPT_TOKEN_BUDGET, PromptTooLarge, compact_code, estimate_tokens, output_token_limit
+)
+from services.incremental import (
+    incremental_requests_total,
+    incremental_sections_total,
+    previous_submission,
+    stale_sections,
+    structural_changes,
+)
 
 load_dotenv()
-model = GenerativeModel('gemini-pro')
 
-# Initialize Gemini API
-genai.configure(api_key=os.getenv("GEMINI_API_KEY"))
-model = genai.GenerativeModel('gemini-2.0-flash')
+# Gemini by default; LLM_BACKEND=stub swaps in the offline stub (see services/llm_backend.py).
+# Calls get deadlines, retries on transient errors and optional hedging (see services/resilience.py),
+# every attempt waits for RPM/TPM quota first (see services/admission.py), and is then
+# routed to an API key and model (see services/routing.py).
+llm_router = create_backend()
+model = ResilientBackend(AdmittedBackend(llm_router, admission_controller))
+
+# Shares one in-flight generation between identical concurrent requests.
+generation_flight = SingleFlight()
 
 
 class CParser:
+    """
+    Thin wrapper over the tokenizer-based CAnalyzer, kept for existing callers.
+
+    Prefer `analyze_c_code`, which returns everything from a single pass.
+    """
     @staticmethod
     def extract_includes(code: str) -> List[str]:
         """Extract included libraries from C code."""
-        include_pattern = r'#include\s*<([^>]+)>'
-        return re.findall(include_pattern, code)
-    
+        return analyze_c_code(code)["includes"]
+
     @staticmethod
     def extract_functions(code: str) -> List[Dict]:
-        """Extract function definitions from C code."""
-        # Basic function pattern (simplified)
-        function_pattern = r'(\w+\s+\w+\s*\([^)]*\)\s*\{[^}]*\})'
-        functions = re.findall(function_pattern, code, re.DOTALL)
-        
-        result = []
-        for func in functions:
-            # Extract function signature
-            signature_match = re.match(r'(\w+\s+\w+\s*\([^)]*\))', func)
-            if signature_match:
-                signature = signature_match.group(1).strip()
-                # Extract function name
-                name_match = re.search(r'\s(\w+)\s*\(', signature)
-                if name_match:
-                    name = name_match.group(1)
-                    result.append({
-                        "name": name,
-                        "signature": signature,
-                        "body": func
-                    })
-        
-        return result
-    
+        """Extract function definitions (name, signature, body, ...) from C code."""
+        return analyze_c_code(code)["functions"]
+
     @staticmethod
     def extract_variables(code: str) -> List[Dict]:
-        """Extract variable declarations from C code."""
-        # This is a simplified version
-        var_pattern = r'(int|float|double|char|void)\s+(\w+)(?:\s*=\s*([^;]+))?;'
-        variables = re.findall(var_pattern, code)
-        
-        result = []
-        for var_type, var_name, initial_value in variables:
-            result.append({
-                "type": var_type,
-                "name": var_name,
-                "initial_value": initial_value.strip() if initial_value else None
-            })
-        
-        return result
-
-
-
-def detect_language(question: str, model) -> str:
-    """
-    Uses Gemini to detect if the question requires a C program or a Shell script.
+        """Extract variable declarations (type, name, initial_value, ...) from C code."""
+        return analyze_c_code(code)["variables"]
 
-    Args:
-        question: The OS lab question text.
-        model: The initialized Gemini model instance.
 
-    Returns:
-        "Shell" or "C". Defaults to "C" if detection is unclear.
-    """
-    prompt = f"""
+# Caps the CODE ANALYSIS block so huge submissions cannot balloon the prompt.
+MAX_ANALYSIS_ITEMS = 40
+
+
+def _format_code_analysis(analysis: Dict[str, List]) -> str:
+    def listing(items: List[str]) -> str:
+        if not items:
+            return 'None detected'
+        extra = len(items) - MAX_ANALYSIS_ITEMS
+        return ', '.join(items[:MAX_ANALYSIS_ITEMS]) + (f' (+{extra} more)' if extra > 0 else '')
+
+    variables = list(dict.fromkeys(f"{v['type']} {v['name']}" for v in analysis["variables"]))
+    structs = [f"{s['kind']} {s['typedef'] or s['name'] or '(anonymous)'}" for s in analysis["structs"]]
+    macros = [f"{m['name']}={m['value']}" if m['value'] else m['name'] for m in analysis["macros"]]
+    return f"""
+        CODE ANALYSIS (C):
+        - Includes: {listing(analysis["includes"])}
+        - Macros: {listing(macros)}
+        - Structs: {listing(structs)}
+        - Functions: {listing([f['name'] for f in analysis["functions"]])}
+        - Key Variables/Structs: {listing(variables)}
+        Use this analysis to inform your documentation.
+        """
+
+
+def _build_detection_prompt(question: str) -> str:
+    """Returns the one-word classification prompt used by detect_language."""
+    return f"""
     Analyze the following Operating Systems lab question and determine if the primary implementation requirement is a C program or a Bash Shell Script.
 
     QUESTION:
@@ -89,25 +102,105 @@ def detect_language(question: str, model) -> str:
     Respond with ONLY the single word "C" or "Shell". Do not include any other text, explanation, or formatting.
     """
 
-    generation_config = {
-        "temperature": 0, # Deterministic classification
-        "max_output_tokens": 5, # Just need one word
-        "top_p": 1,
-        "top_k": 1,
-    }
 
+detection_config = {
+    "temperature": 0, # Deterministic classification
+    "max_output_tokens": 5, # Just need one word
+    "top_p": 1,
+    "top_k": 1,
+}
+
+
+def _interpret_detection(detected: str, question: str) -> str:
+    """Maps the raw model answer to "Shell" or "C"."""
+    if "shell" in detected.strip().lower():
+        print(f"Language Detected: Shell for question: '{question[:50]}...'")
+        return "Shell"
+    # Default to C if response is not clearly "Shell"
+    print(f"Language Detected: C (or default) for question: '{question[:50]}...'")
+    return "C"
+
+
+# Below this confidence the local classifier defers to the model.
+LANGUAGE_CONFIDENCE_THRESHOLD = float(os.getenv("LANGUAGE_CONFIDENCE_THRESHOLD", "0.7"))
+
+# Remembers model answers for questions the local classifier was unsure about.
+_detected_languages: Dict[str, str] = {}
+_DETECTED_LANGUAGES_LIMIT = 4096
+
+
+def _detect_language_locally(question: str, code: Optional[str]) -> Optional[str]:
+    """Returns the local classification when it is confident enough, else None."""
+    language, confidence = classify_language(question, code)
+    if confidence >= LANGUAGE_CONFIDENCE_THRESHOLD:
+        print(f"Language Detected locally: {language} ({confidence:.2f}) for question: '{question[:50]}...'")
+        return language
+    return _detected_languages.get(normalize_question(question))
+
+
+def _remember_language(question: str, language: str) -> str:
+    if len(_detected_languages) >= _DETECTED_LANGUAGES_LIMIT:
+        _detected_languages.clear()
+    _detected_languages[normalize_question(question)] = language
+    return language
+
+
+def detect_language(question: str, model, code: Optional[str] = None) -> str:
+    """
+    Detects if the question requires a C program or a Shell script.
+
+    A local rule-based classifier answers first; Gemini is only asked when
+    its confidence is below LANGUAGE_CONFIDENCE_THRESHOLD.
+
+    Args:
+        question: The OS lab question text.
+        model: The LLM backend (see services/llm_backend.py).
+        code: Optional user-provided code, used for the shebang check.
+
+    Returns:
+        "Shell" or "C". Defaults to "C" if detection is unclear or fails;
+        LLMUnavailableError (including AdmissionRejected) is re-raised.
+    """
+    with span("detect"):
+        local = _detect_language_locally(question, code)
+    if local is not None:
+        return local
+    prompt = _build_detection_prompt(question)
+    try:
+        with span("detect"):
+            response = model.generate_content(prompt, generation_config=detection_config)
+        record_llm_call("detect", estimate_tokens(prompt), response.text)
+        return _remember_language(question, _interpret_detection(response.text, question))
+    except Exception as e:
+        record_llm_call("detect", estimate_tokens(prompt), None, outcome="error")
+        # Quota rejections and an unavailable model are the request's answer (429/503/504),
+        # not a reason to guess; generating anyway would only fail again or bypass the quota.
+        if isinstance(e, LLMUnavailableError):
+            raise
+        print(f"Warning: Language detection failed: {e}. Defaulting to C.")
+        return "C"
+
+
+async def detect_language_async(question: str, model, code: Optional[str] = None) -> str:
+    """Async variant of detect_language; does not block the event loop."""
+    with span("detect"):
+        local = _detect_language_locally(question, code)
+    if local is not None:
+        return local
+    prompt = _build_detection_prompt(question)
     try:
-        response = model.generate_content(prompt, generation_config=generation_config)
-        detected = response.text.strip().lower()
-
-        if "shell" in detected:
-            print(f"Language Detected: Shell for question: '{question[:50]}...'")
-            return "Shell"
-        else:
-            # Default to C if response is not clearly "Shell"
-            print(f"Language Detected: C (or default) for question: '{question[:50]}...'")
-            return "C"
+        with span("detect"):
+            response = await model.generate_content_async(prompt, generation_config=detection_config)
+        record_llm_call("detect", estimate_tokens(prompt), response.text)
+        return _remember_language(question, _interpret_detection(response.text, question))
+    except asyncio.CancelledError:
+        raise
     except Exception as e:
+        record_llm_call("detect", estimate_tokens(prompt), None, outcome="error")
+        # Quota rejections and an unavailable model are the request's answer (429/503/504),
+        # not a reason to guess; generating anyway would only fail again or bypass the quota.
+        if isinstance(e, LLMUnavailableError):
+            raise
         print(f"Warning: Language detection failed: {e}. Defaulting to C.")
         return "C"
 
@@ -266,35 +359,33 @@ def get_c_generation_prompt(question: str, code_instruction: str, options_list:
 
 
 
-# --- Main Orchestration Function ---
-def generate_documentation_with_ai(question: str, code: Optional[str], options: Dict[str, bool]):
-    """
-    Generates documentation using a two-step process:
-    1. Detect language (C or Shell).
-    2. Call the appropriate language-specific generation prompt.
-    """
+# --- Prompt Assembly & Response Handling ---
+EXPECTED_KEYS = ("overview", "shortAlgorithm", "detailedAlgorithm", "code",
+                 "requiredModules", "variablesAndConstants", "functions", "explanation")
+
+generation_config = {
+    "temperature": 0.1, # Focused output
+    "top_p": 0.95,
+    "top_k": 40,
+    "max_output_tokens": 8192,
+    "response_mime_type": "application/json", # Request JSON output
+}
+
 
-    # Step 1: Detect Language
-    language = detect_language(question, model) # Pass the model instance
 
-    # --- Prepare Inputs for Generation Prompt ---
+
+def build_generation_prompt(question: str, code: Optional[str], options: Dict[str, bool], language: str) -> str:
+    """Builds the language-specific generation prompt for the given inputs."""
     is_shell_script_provided = code and code.strip().startswith("#!/")
     parsed_code_info = ""
 
     # Perform C parsing only if language is C and code is provided and doesn't look like shell
     if language == "C" and code and not is_shell_script_provided:
         try:
-            includes = CParser.extract_includes(code)
-            functions = CParser.extract_functions(code)
-            variables = CParser.extract_variables(code)
-            parsed_code_info = f"""
-        CODE ANALYSIS (C):
-        - Includes: {', '.join(includes) if includes else 'None detected'}
-        - Functions: {', '.join([f['name'] for f in functions]) if functions else 'None detected'}
-        - Key Variables/Structs: {', '.join([f"{v['type']} {v['name']}" for v in variables]) if variables else 'None detected'}
-        Use this analysis to inform your documentation.
-        """
+            with span("c_parse"):
+                parsed_code_info = _format_code_analysis(analyze_c_code(code))
         except Exception as e:
+            errors_total.inc(stage="c_parse")
             print(f"Warning: C Code parsing failed - {e}")
             parsed_code_info = "\n        CODE ANALYSIS: Could not perform static C code analysis.\n"
     elif is_shell_script_provided:
@@ -334,73 +425,564 @@ def generate_documentation_with_ai(question: str, code: Optional[str], options:
     Generate a standard, correct, and well-commented implementation in **{language}**. **Crucially, ensure the generated code includes the mandatory output/feedback specified in the {language} guidelines.** Base other relevant sections on this generated code.
     """
 
-    # Step 2: Select and Call Generation Prompt
     if language == "Shell":
-        prompt = get_shell_generation_prompt(question, code_instruction, options_list)
-    else: # Default to C
-        prompt = get_c_generation_prompt(question, code_instruction, options_list)
+        return get_shell_generation_prompt(question, code_instruction, options_list)
+    # Default to C
+    return get_c_generation_prompt(question, code_instruction, options_list)
 
 
-    # --- AI Call ---
-    generation_config = {
-        "temperature": 0.1, # Focused output
-        "top_p": 0.95,
-        "top_k": 40,
-        "max_output_tokens": 8192,
-        "response_mime_type": "application/json", # Request JSON output
-    }
+def plan_generation(question: str, code: Optional[str], options: Dict[str, bool], language: str):
+    """
+    Builds the prompt and generation config for a request within PROMPT_TOKEN_BUDGET.
 
-    try:
-        # Assuming your 'model' object has a 'generate_content' method
-        response = model.generate_content(
-            prompt,
-            generation_config=generation_config
-            # Add safety_settings if needed
+    User code that would push the prompt over budget is compacted first
+    (comments/whitespace stripped, then the longest function bodies replaced
+    by summaries), and `max_output_tokens` is sized to the requested sections.
+    Code that is still over budget after compaction is rejected with
+    PromptTooLarge rather than sent.
+
+    Returns:
+        (prompt, config)
+    """
+    with span("prompt_build"):
+        prompt = build_generation_prompt(question, code, options, language)
+        prompt_tokens = estimate_tokens(prompt)
+        code_tokens = submitted_tokens = estimate_tokens(code)
+        steps = []
+        if code and prompt_tokens > PROMPT_TOKEN_BUDGET:
+            target = max(PROMPT_TOKEN_BUDGET - (prompt_tokens - code_tokens), 0)
+            code, steps = compact_code(code, language, target)
+            prompt = build_generation_prompt(question, code, options, language)
+            prompt_tokens = estimate_tokens(prompt)
+            code_tokens = estimate_tokens(code)
+    if steps and prompt_tokens > PROMPT_TOKEN_BUDGET:
+        errors_total.inc(stage="prompt_budget")
+        raise PromptTooLarge(
+            f"The submitted code is too long to document: about {submitted_tokens} tokens "
+            f"({code_tokens} after removing comments and summarising function bodies), but the "
+            f"prompt is limited to {PROMPT_TOKEN_BUDGET} tokens. Submit a shorter program."
         )
 
-        # --- Response Handling ---
-        response_text = response.text
+    config = dict(generation_config, max_output_tokens=output_token_limit(options, code))
+    print(f"Token budget: prompt~{prompt_tokens} (code~{code_tokens}"
+          f"{', ' + '+'.join(steps) if steps else ''}), max_output={config['max_output_tokens']} "
+          f"for question: '{question[:50]}...'")
+    return prompt, config
 
-        # Basic validation/cleanup before parsing
-        response_text = re.sub(r'^```json\s*', '', response_text.strip(), flags=re.IGNORECASE)
-        response_text = re.sub(r'\s*```$', '', response_text)
 
+def keep_submitted_code(result: Dict[str, str], code: Optional[str], options: Dict[str, bool]) -> Dict[str, str]:
+    """
+    Reports the user's own code in the `code` section.
+
+    The model only sees (and echoes back) the compacted code when the
+    submission was over PROMPT_TOKEN_BUDGET.
+    """
+    if code and options.get("code"):
+        result["code"] = code
+    return result
+
+
+def parse_generation_response(response_text: str, options: Dict[str, bool]) -> Dict[str, str]:
+    """
+    Parses the model's JSON answer, filling in any missing keys.
+
+    Common defects (raw newlines in strings, invalid escapes, trailing
+    commas, prose around the object) are repaired locally.
+
+    Raises:
+        json.JSONDecodeError: If the text is not valid JSON even after repair.
+    """
+    # Basic validation/cleanup before parsing
+    response_text = re.sub(r'^```json\s*', '', response_text.strip(), flags=re.IGNORECASE)
+    response_text = re.sub(r'\s*```$', '', response_text)
+
+    # The response should ideally be clean JSON now
+    with span("json_decode"):
         try:
-            # The response should ideally be clean JSON now
             result = json.loads(response_text)
+        except json.JSONDecodeError:
+            result = repair_json(response_text)
+            if result is None:
+                raise
+            salvage_total.inc(outcome="repaired")
+            print("Warning: Repaired malformed JSON response locally.")
 
-            # Validate expected keys exist, even if empty
-            expected_keys = {"overview", "shortAlgorithm", "detailedAlgorithm", "code",
-                             "requiredModules", "variablesAndConstants", "functions", "explanation"}
-            for key in expected_keys:
-                if key not in result:
-                    print(f"Warning: Key '{key}' missing in JSON response. Adding as empty string.")
-                    result[key] = "" # Add missing keys as empty strings
+    # Validate expected keys exist, even if empty
+    for key in EXPECTED_KEYS:
+        if key not in result:
+            print(f"Warning: Key '{key}' missing in JSON response. Adding as empty string.")
+            result[key] = "" # Add missing keys as empty strings
 
-            # Ensure requested sections that might be empty in the response are still present
-            for option, selected in options.items():
-                 if selected and option not in result:
-                     print(f"Warning: Requested key '{option}' missing in JSON response despite being requested. Adding as empty string.")
-                     result[option] = ""
+    # Ensure requested sections that might be empty in the response are still present
+    for option, selected in options.items():
+         if selected and option not in result:
+             print(f"Warning: Requested key '{option}' missing in JSON response despite being requested. Adding as empty string.")
+             result[option] = ""
 
+    return result
 
-            return result
-        except json.JSONDecodeError as json_err:
-            print(f"Error: Failed to decode JSON response: {json_err}")
-            print(f"Raw Response Text:\n---\n{response_text}\n---")
-            # Fallback: Return error structure or attempt manual extraction as last resort
-            # Your original regex fallback could go here if needed.
-            # For now, return a dict indicating error for requested sections.
-            error_result = {key: "" for key in {"overview", "shortAlgorithm", "detailedAlgorithm", "code",
-                                                "requiredModules", "variablesAndConstants", "functions", "explanation"}}
-            for option, selected in options.items():
-                if selected:
-                    error_result[option] = f"Error parsing JSON response. Raw text might contain info. Error: {json_err}"
-            return error_result
+
+# Starts every section that stands in for one the model's answer did not yield.
+SECTION_ERROR_PREFIX = "Error parsing JSON response."
+
+
+def _build_error_result(options: Dict[str, bool], json_err: json.JSONDecodeError, response_text: str) -> Dict[str, str]:
+    """Returns an error structure for requested sections when the JSON cannot be decoded."""
+    errors_total.inc(stage="json_decode")
+    print(f"Error: Failed to decode JSON response: {json_err}")
+    print(f"Raw Response Text:\n---\n{response_text}\n---")
+    error_result = {key: "" for key in EXPECTED_KEYS}
+    for option, selected in options.items():
+        if selected:
+            error_result[option] = f"{SECTION_ERROR_PREFIX} Raw text might contain info. Error: {json_err}"
+    return error_result
+
+
+def is_error_section(value) -> bool:
+    """True for a section holding the error message of a failed generation."""
+    return isinstance(value, str) and value.startswith(SECTION_ERROR_PREFIX)
 
 
+def has_error_sections(result: Dict) -> bool:
+    """True when any section of `result` failed; such results are neither cached nor stored."""
+    return any(is_error_section(value) for value in result.values())
+
+
+# --- Salvaging Undecodable Responses ---
+def _start_salvage(response_text: str, options: Dict[str, bool]):
+    """Returns (intact requested sections, requested sections still missing)."""
+    requested = [key for key, selected in options.items() if selected]
+    recovered = salvage_sections(response_text, requested)
+    missing = [key for key in requested if key not in recovered]
+    print(f"Salvaged {len(recovered)}/{len(requested)} sections from an undecodable response"
+          + (f"; re-requesting {', '.join(missing)}" if missing else ""))
+    return recovered, missing
+
+
+def _plan_rerequest(question: str, code: Optional[str], recovered: Dict[str, str], missing: List[str], language: str):
+    # The missing sections must describe the same code as the recovered ones.
+    return plan_generation(question, code or recovered.get("code"), {key: True for key in missing}, language)
+
+
+def _decode_rerequest(response_text: str, missing: List[str]) -> Dict[str, str]:
+    decoded = repair_json(response_text) or salvage_sections(response_text, missing)
+    return {key: decoded[key] for key in missing if isinstance(decoded.get(key), str)}
+
+
+def _finish_salvage(options: Dict[str, bool], recovered: Dict[str, str], rerequested: bool,
+                    json_err: json.JSONDecodeError, response_text: str):
+    """Returns (result, complete); sections that could not be recovered carry an error message."""
+    missing = {key: True for key, selected in options.items() if selected and key not in recovered}
+    if missing:
+        salvage_total.inc(outcome="failed")
+        result = _build_error_result(missing, json_err, response_text)
+    else:
+        salvage_total.inc(outcome="rerequested" if rerequested else "extracted")
+        result = {key: "" for key in EXPECTED_KEYS}
+    result.update(recovered)
+    return result, not missing
+
+
+def _salvage_response(question: str, code: Optional[str], options: Dict[str, bool], language: str,
+                      response_text: str, json_err: json.JSONDecodeError):
+    """
+    Recovers what it can from an undecodable response instead of failing every section.
+
+    Intact sections are kept and only the missing ones are re-requested,
+    with a prompt listing just those sections.
+    """
+    recovered, missing = _start_salvage(response_text, options)
+    if missing:
+        prompt, config = _plan_rerequest(question, code, recovered, missing, language)
+        try:
+            with span("llm"):
+                retry_text = model.generate_content(prompt, generation_config=config).text
+            record_llm_call("salvage", estimate_tokens(prompt), retry_text)
+            recovered.update(_decode_rerequest(retry_text, missing))
+        except Exception as e:
+            record_llm_call("salvage", estimate_tokens(prompt), None, outcome="error")
+            print(f"Warning: Re-requesting missing sections failed: {e}")
+    return _finish_salvage(options, recovered, bool(missing), json_err, response_text)
+
+
+async def _salvage_response_async(question: str, code: Optional[str], options: Dict[str, bool], language: str,
+                                  response_text: str, json_err: json.JSONDecodeError):
+    """Async variant of _salvage_response."""
+    recovered, missing = _start_salvage(response_text, options)
+    if missing:
+        prompt, config = await asyncio.to_thread(_plan_rerequest, question, code, recovered, missing, language)
+        try:
+            with span("llm"):
+                response = await model.generate_content_async(prompt, generation_config=config)
+                retry_text = response.text
+            record_llm_call("salvage", estimate_tokens(prompt), retry_text)
+            recovered.update(_decode_rerequest(retry_text, missing))
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            record_llm_call("salvage", estimate_tokens(prompt), None, outcome="error")
+            print(f"Warning: Re-requesting missing sections failed: {e}")
+    return _finish_salvage(options, recovered, bool(missing), json_err, response_text)
+
+
+def _lookup_existing(question: str, code: Optional[str], options: Dict[str, bool], cache_key: str):
+    """
+    Returns a prebuilt, cached or near-duplicate result for the request, or None.
+
+    Reads the SQLite cache; async callers run it (and `_store_result`) in a worker thread.
+    """
+    with span("cache_lookup"):
+        source, result = _find_existing(question, code, options, cache_key)
+    lookups_total.inc(source=source)
+    return result
+
+
+def _find_existing(question: str, code: Optional[str], options: Dict[str, bool], cache_key: str):
+    prebuilt = prebuilt_corpus.lookup(question, code, options)
+    if prebuilt is not None:
+        return "corpus", prebuilt
+    cached = documentation_cache.get(cache_key)
+    if cached is not None:
+        return "cache", cached
+    if code and code.strip():
+        return "miss", None
+
+    # Paraphrase of a question answered before (only meaningful without user code).
+    match = similarity_index.lookup(question, options)
+    if match is None:
+        return "miss", None
+    similar_key, score = match
+    similar = documentation_cache.get(similar_key)
+    if similar is None:
+        return "miss", None
+    print(f"Near-duplicate hit ({score:.2f}) for question: '{question[:50]}...'")
+    return "similar", {key: (value if options.get(key) else "") for key, value in similar.items()}
+
+
+def _store_result(question: str, code: Optional[str], options: Dict[str, bool], cache_key: str, result: dict) -> None:
+    """Caches a successful result and, for code-less questions, indexes it for paraphrase lookup."""
+    with span("cache_store"):
+        documentation_cache.set(cache_key, result)
+        if not (code and code.strip()):
+            similarity_index.add(question, cache_key, options)
+
+
+# --- Main Orchestration Function ---
+def generate_documentation_with_ai(question: str, code: Optional[str], options: Dict[str, bool]):
+    """
+    Generates documentation using a two-step process:
+    1. Detect language (C or Shell).
+    2. Call the appropriate language-specific generation prompt.
+
+    Successful results are cached, so a repeated request skips both calls.
+    """
+    cache_key = make_cache_key(question, code, options)
+    cached = _lookup_existing(question, code, options, cache_key)
+    if cached is not None:
+        return cached
+
+    # Step 1: Detect Language
+    language = detect_language(question, model, code) # Pass the model instance
+
+    # Step 2: Select and Call Generation Prompt
+    prompt, config = plan_generation(question, code, options, language)
+
+    try:
+        with span("llm"):
+            response = model.generate_content(
+                prompt,
+                generation_config=config
+                # Add safety_settings if needed
+            )
+            response_text = response.text
+        record_llm_call("generate", estimate_tokens(prompt), response_text)
+
     except Exception as e:
+        record_llm_call("generate", estimate_tokens(prompt), None, outcome="error")
         # Handle API errors, connection issues etc.
         print(f"Error generating documentation via API: {str(e)}") # Use print or logging
         # Consider raising a custom exception or returning an error structure
-        raise Exception(f"Error generating documentation via API: {str(e)}") # Or use HTTPException if in a web context
\ No newline at end of file
+        if isinstance(e, LLMUnavailableError):
+            raise
+        raise Exception(f"Error generating documentation via API: {str(e)}") # Or use HTTPException if in a web context
+
+    try:
+        result = keep_submitted_code(parse_generation_response(response_text, options), code, options)
+    except json.JSONDecodeError as json_err:
+        result, complete = _salvage_response(question, code, options, language, response_text, json_err)
+        keep_submitted_code(result, code, options)
+        # Error structures are not cached so the next attempt can succeed.
+        if not complete:
+            return result
+    _store_result(question, code, options, cache_key, result)
+    return result
+
+
+async def generate_documentation_with_ai_async(question: str, code: Optional[str], options: Dict[str, bool]):
+    """
+    Async variant of generate_documentation_with_ai used by the API server.
+
+    Both model calls go through the async Gemini client, so a slow generation
+    never holds up other requests on the same worker. Cancelling the awaiting
+    task (e.g. on client disconnect) cancels the in-flight call once no other
+    request is waiting on it: concurrent identical requests share a single
+    generation through `generation_flight`.
+    """
+    cache_key = make_cache_key(question, code, options)
+    cached = await asyncio.to_thread(_lookup_existing, question, code, options, cache_key)
+    if cached is not None:
+        return cached
+
+    result = await generation_flight.do(
+        cache_key, lambda: _generate_documentation_uncached_async(question, code, options, cache_key)
+    )
+    # Coalesced callers share one result object; hand each its own copy.
+    return dict(result)
+
+
+async def _generate_documentation_uncached_async(question: str, code: Optional[str], options: Dict[str, bool],
+                                                 cache_key: str):
+    language = await detect_language_async(question, model, code)
+    # Parsing and compacting the user's C code is CPU-bound; keep it off the event loop.
+    prompt, config = await asyncio.to_thread(plan_generation, question, code, options, language)
+
+    try:
+        with span("llm"):
+            response = await model.generate_content_async(
+                prompt,
+                generation_config=config
+            )
+            response_text = response.text
+        record_llm_call("generate", estimate_tokens(prompt), response_text)
+
+    except asyncio.CancelledError:
+        record_llm_call("generate", estimate_tokens(prompt), None, outcome="cancelled")
+        print(f"Generation cancelled for question: '{question[:50]}...'")
+        raise
+    except Exception as e:
+        record_llm_call("generate", estimate_tokens(prompt), None, outcome="error")
+        print(f"Error generating documentation via API: {str(e)}")
+        if isinstance(e, LLMUnavailableError):
+            raise
+        raise Exception(f"Error generating documentation via API: {str(e)}")
+
+    try:
+        result = keep_submitted_code(parse_generation_response(response_text, options), code, options)
+    except json.JSONDecodeError as json_err:
+        result, complete = await _salvage_response_async(question, code, options, language, response_text, json_err)
+        keep_submitted_code(result, code, options)
+        if not complete:
+            return result
+    await asyncio.to_thread(_store_result, question, code, options, cache_key, result)
+    return result
+
+
+async def stream_documentation_with_ai(question: str, code: Optional[str], options: Dict[str, bool]):
+    """
+    Streaming variant of generate_documentation_with_ai_async.
+
+    Async generator yielding ("section", {"key": ..., "value": ...}) as soon as
+    each top-level key of the model's JSON answer is complete, followed by a
+    single ("done", result) carrying the full, validated result.
+    """
+    cache_key = make_cache_key(question, code, options)
+    cached = await asyncio.to_thread(_lookup_existing, question, code, options, cache_key)
+    if cached is not None:
+        for key, value in cached.items():
+            yield "section", {"key": key, "value": value}
+        yield "done", cached
+        return
+
+    language = await detect_language_async(question, model, code)
+    # Parsing and compacting the user's C code is CPU-bound; keep it off the event loop.
+    prompt, config = await asyncio.to_thread(plan_generation, question, code, options, language)
+
+    parser = IncrementalJSONParser()
+    chunks = []
+    try:
+        with span("llm"):
+            response = await model.generate_content_async(
+                prompt,
+                generation_config=config,
+                stream=True
+            )
+            async for chunk in response:
+                try:
+                    text = chunk.text
+                except ValueError:
+                    # Chunks without text parts (e.g. the final usage chunk)
+                    continue
+                chunks.append(text)
+                for key, value in parser.feed(text):
+                    if key == "code":
+                        value = keep_submitted_code({key: value}, code, options)[key]
+                    yield "section", {"key": key, "value": value}
+        record_llm_call("stream", estimate_tokens(prompt), "".join(chunks))
+
+    except asyncio.CancelledError:
+        record_llm_call("stream", estimate_tokens(prompt), "".join(chunks), outcome="cancelled")
+        print(f"Streaming generation cancelled for question: '{question[:50]}...'")
+        raise
+    except Exception as e:
+        record_llm_call("stream", estimate_tokens(prompt), "".join(chunks), outcome="error")
+        print(f"Error generating documentation via API: {str(e)}")
+        if isinstance(e, LLMUnavailableError):
+            raise
+        raise Exception(f"Error generating documentation via API: {str(e)}")
+
+    response_text = "".join(chunks)
+    try:
+        result = keep_submitted_code(parse_generation_response(response_text, options), code, options)
+    except json.JSONDecodeError as json_err:
+        result, complete = await _salvage_response_async(question, code, options, language, response_text, json_err)
+        keep_submitted_code(result, code, options)
+        # Sections recovered beyond what was already streamed.
+        streamed = keep_submitted_code(dict(parser.result), code, options)
+        for key, value in result.items():
+            if streamed.get(key) != value:
+                yield "section", {"key": key, "value": value}
+        if not complete:
+            yield "done", result
+            return
+    await asyncio.to_thread(_store_result, question, code, options, cache_key, result)
+    yield "done", result
+
+
+# --- Per-Section Generation ---
+async def _generate_section(question: str, source_code: Optional[str], language: str, section: str) -> str:
+    """Generates (or fetches from cache) a single documentation section about `source_code`."""
+    cache_key = make_section_cache_key(question, source_code, language, section)
+    with span("cache_lookup"):
+        cached = await asyncio.to_thread(documentation_cache.get, cache_key)
+    if cached is not None:
+        return cached["value"]
+    return await generation_flight.do(
+        cache_key, lambda: _generate_section_uncached(question, source_code, language, section, cache_key)
+    )
+
+
+async def _generate_section_uncached(question: str, source_code: Optional[str], language: str, section: str,
+                                     cache_key: str) -> str:
+    prompt, config = await asyncio.to_thread(plan_generation, question, source_code, {section: True}, language)
+    try:
+        with span("llm"):
+            response = await model.generate_content_async(prompt, generation_config=config)
+            response_text = response.text
+        record_llm_call("section", estimate_tokens(prompt), response_text)
+    except asyncio.CancelledError:
+        record_llm_call("section", estimate_tokens(prompt), None, outcome="cancelled")
+        raise
+    except Exception as e:
+        record_llm_call("section", estimate_tokens(prompt), None, outcome="error")
+        print(f"Error generating section '{section}' via API: {str(e)}")
+        if isinstance(e, LLMUnavailableError):
+            raise
+        raise Exception(f"Error generating documentation via API: {str(e)}")
+
+    try:
+        value = parse_generation_response(response_text, {section: True})[section]
+    except json.JSONDecodeError as json_err:
+        value = salvage_sections(response_text, [section]).get(section)
+        if value is None:
+            salvage_total.inc(outcome="failed")
+            if section == "code":
+                # The other sections document this code; an error message must never stand in for it.
+                errors_total.inc(stage="json_decode")
+                raise Exception(f"Error generating documentation: the generated code could not be decoded: {json_err}")
+            return _build_error_result({section: True}, json_err, response_text)[section]
+        salvage_total.inc(outcome="extracted")
+    if section == "code" and not value.strip():
+        errors_total.inc(stage="json_decode")
+        raise Exception("Error generating documentation: the model returned no code.")
+    await asyncio.to_thread(documentation_cache.set, cache_key, {"value": value})
+    return value
+
+
+async def generate_documentation_by_section_async(question: str, code: Optional[str], options: Dict[str, bool]):
+    """
+    Generates each requested section with its own, smaller prompt.
+
+    The `code` section is produced first (or taken from the user's
+    submission) because every other section documents it; if it cannot
+    be generated the request fails rather than documenting an error
+    message. The remaining sections then run concurrently. Each section is cached on its own, so
+    toggling one option only generates the section that is missing.
+    """
+    prebuilt = prebuilt_corpus.lookup(question, code, options)
+    if prebuilt is not None:
+        return prebuilt
+
+    language = await detect_language_async(question, model, code)
+    requested = [key for key in EXPECTED_KEYS if options.get(key)]
+    result = {key: "" for key in EXPECTED_KEYS}
+
+    if code:
+        source_code = code
+    elif requested:
+        source_code = await _generate_section(question, None, language, "code")
+    else:
+        source_code = None
+
+    if "code" in requested:
+        result["code"] = source_code or ""
+
+    dependent = [section for section in requested if section != "code"]
+    values = await asyncio.gather(*[
+        _generate_section(question, source_code, language, section)
+        for section in dependent
+    ])
+    result.update(zip(dependent, values))
+    return result
+
+
+# --- Incremental Regeneration ---
+async def generate_documentation_incrementally_async(question: str, code: Optional[str], options: Dict[str, bool],
+                                                     previous_document: str):
+    """
+    Regenerates only the sections a student's edit makes stale.
+
+    `previous_document` is the hash of the result served for the earlier
+    submission (see services/documents.py). The two versions of the code
+    are diffed by their CAnalyzer structure: e.g. a changed function body
+    regenerates `functions` and `explanation` and reuses the other sections,
+    while edits to comments or layout reuse everything. The stale sections
+    come from one smaller generation call. Anything that cannot be compared
+    (unknown or expired document, another question, Shell scripts, a
+    rewrite-sized change) falls back to a full generation.
+    """
+    cache_key = make_cache_key(question, code, options)
+    cached = await asyncio.to_thread(_lookup_existing, question, code, options, cache_key)
+    if cached is not None:
+        return cached
+
+    previous = await asyncio.to_thread(previous_submission, previous_document)
+    changes = None
+    if previous is not None and code and normalize_question(previous["question"]) == normalize_question(question):
+        language = await detect_language_async(question, model, code)
+        if language == "C":
+            with span("c_parse"):
+                changes = await asyncio.to_thread(structural_changes, previous["code"], code)
+    if changes is None:
+        incremental_requests_total.inc(mode="full")
+        return await generate_documentation_with_ai_async(question, code, options)
+
+    requested = [key for key in EXPECTED_KEYS if options.get(key)]
+    stale = stale_sections(changes)
+    # Sections the earlier request did not ask for, or that failed then, have nothing to reuse.
+    reusable = {key for key, value in previous["result"].items() if value and not is_error_section(value)}
+    regenerate = [key for key in requested if key != "code" and (key in stale or key not in reusable)]
+    result = {key: "" for key in EXPECTED_KEYS}
+    result.update({key: previous["result"][key] for key in requested if key != "code" and key not in regenerate})
+    if "code" in requested:
+        result["code"] = code
+
+    print(f"Incremental regeneration of {regenerate or 'no sections'} "
+          f"({', '.join(f'{kind} {name}'.strip() for kind, name in changes) or 'formatting only'}) "
+          f"for question: '{question[:50]}...'")
+    incremental_requests_total.inc(mode="incremental")
+    incremental_sections_total.inc(len(requested) - len(regenerate), outcome="reused")
+    incremental_sections_total.inc(len(regenerate), outcome="regenerated")
+    if regenerate:
+        fresh = await generate_documentation_with_ai_async(question, code, {key: True for key in regenerate})
+        result.update({key: fresh[key] for key in regenerate})
+    return result
@@ -0,0 +1,118 @@
+import json
+from typing import Dict, List, Optional, Set, Tuple
+
+from services.c_analyzer import analyze_c_code, tokenize
+from services.cache import documentation_cache
+from services.documents import document_store
+from services.metrics import Counter
+
+# Beyond this share of changed functions an edit is treated as a rewrite.
+REWRITE_FRACTION = 0.5
+
+# The sections each kind of structural change makes stale. `code` is never
+# listed: it is always the new submission itself.
+STALE_SECTIONS = {
+    "includes": {"requiredModules"},
+    "macros": {"variablesAndConstants", "explanation"},
+    "types": {"variablesAndConstants", "functions", "explanation"},
+    "globals": {"variablesAndConstants", "explanation"},
+    "locals": {"variablesAndConstants"},
+    "function_added": {"shortAlgorithm", "detailedAlgorithm", "functions", "explanation"},
+    "function_removed": {"shortAlgorithm", "detailedAlgorithm", "functions", "explanation"},
+    "signature": {"functions", "explanation"},
+    "body": {"functions", "explanation"},
+    # main() is the program's control flow, which the detailed algorithm walks through.
+    "main_body": {"detailedAlgorithm"},
+    "rewrite": {"overview", "shortAlgorithm", "detailedAlgorithm", "requiredModules",
+                "variablesAndConstants", "functions", "explanation"},
+}
+
+incremental_requests_total = Counter(
+    "doc_incremental_requests_total", "Resubmissions by how they were answered.", ["mode"]
+)
+incremental_sections_total = Counter(
+    "doc_incremental_sections_total", "Sections of incremental answers, reused or regenerated.", ["outcome"]
+)
+
+
+def _normalized(source: str) -> str:
+    # Token texts only, so edits to comments, whitespace or layout never count as changes.
+    return " ".join(token.text for token in tokenize(source))
+
+
+def _structure(code: str) -> Dict:
+    analysis = analyze_c_code(code)
+    locals_: Dict[str, List] = {}
+    for variable in analysis["variables"]:
+        if variable["scope"] != "global":
+            locals_.setdefault(variable["scope"], []).append((variable["type"], variable["name"]))
+    return {
+        "includes": sorted(set(analysis["includes"])),
+        "macros": sorted((m["name"], m["parameters"] or "", m["value"] or "") for m in analysis["macros"]),
+        "types": sorted(json.dumps(s, sort_keys=True) for s in analysis["structs"]),
+        "globals": sorted((v["type"], v["name"], v["initial_value"] or "", tuple(v["dimensions"]))
+                          for v in analysis["variables"] if v["scope"] == "global"),
+        "functions": {f["name"]: (_normalized(f["signature"]), _normalized(f["body"]))
+                      for f in analysis["functions"]},
+        "locals": {name: sorted(set(variables)) for name, variables in locals_.items()},
+    }
+
+
+def structural_changes(old_code: str, new_code: str) -> Optional[List[Tuple[str, str]]]:
+    """
+    Compares two C submissions by their parsed structure.
+
+    Returns (kind, detail) pairs, kinds being the keys of STALE_SECTIONS,
+    and an empty list when only comments or formatting changed. Returns
+    None when the code cannot be compared (no functions found in either).
+    """
+    old, new = _structure(old_code), _structure(new_code)
+    if not old["functions"] or not new["functions"]:
+        return None
+
+    changes = [(kind, "") for kind in ("includes", "macros", "types", "globals") if old[kind] != new[kind]]
+    changed_functions = 0
+    for name in sorted(set(old["functions"]) | set(new["functions"])):
+        before, after = old["functions"].get(name), new["functions"].get(name)
+        if before == after:
+            continue
+        changed_functions += 1
+        if before is None:
+            changes.append(("function_added", name))
+        elif after is None:
+            changes.append(("function_removed", name))
+        elif before[0] != after[0]:
+            changes.append(("signature", name))
+        else:
+            changes.append(("main_body" if name == "main" else "body", name))
+        if before is not None and after is not None and old["locals"].get(name) != new["locals"].get(name):
+            changes.append(("locals", name))
+
+    if changed_functions > REWRITE_FRACTION * len(set(old["functions"]) | set(new["functions"])):
+        return [("rewrite", "")]
+    return changes
+
+
+def stale_sections(changes: List[Tuple[str, str]]) -> Set[str]:
+    """The sections that no longer describe the code after `changes`."""
+    sections: Set[str] = set()
+    for kind, _ in changes:
+        sections |= STALE_SECTIONS[kind]
+        if kind == "main_body":
+            sections |= STALE_SECTIONS["body"]
+    return sections
+
+
+def remember_submission(document_hash: str, question: str, code: Optional[str]) -> None:
+    """Records which question and code a served document answers, so it can be diffed against later."""
+    if code and code.strip():
+        documentation_cache.set("submission:" + document_hash, {"question": question, "code": code})
+
+
+def previous_submission(document_hash: str) -> Optional[Dict]:
+    """Returns the question, code and result of an earlier submission, or None if unknown or expired."""
+    submission = documentation_cache.get("submission:" + document_hash)
+    document = document_store.get(document_hash) if submission is not None else None
+    if document is None:
+        return None
+    return dict(submission, result=json.loads(document.encodings["identity"]))
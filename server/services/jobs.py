@@ -0,0 +1,285 @@
+import os
+import json
+import time
+import uuid
+import socket
+import asyncio
+import threading
+from typing import Awaitable, Callable, Dict, List, Optional
+from dotenv import load_dotenv
+
+from services.admission import AdmissionRejected
+from services.metrics import Counter
+from services.resilience import LLMUnavailableError, backoff_delay
+from services.shared_store import connect
+
+load_dotenv()
+
+JOBS_PATH = os.getenv("JOBS_PATH", os.path.join(os.path.dirname(os.path.dirname(__file__)), "cache", "jobs.sqlite3"))
+# Job workers per server process; 0 leaves the queue to `python job_worker.py` processes.
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "2"))
+JOB_QUEUE_LIMIT = int(os.getenv("JOB_QUEUE_LIMIT", "1000"))
+JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", "3"))
+# Finished jobs (and their results) are kept this long for clients to collect.
+JOB_RETENTION_SECONDS = float(os.getenv("JOB_RETENTION_SECONDS", str(24 * 3600)))
+
+# A running job's lease is renewed every LEASE_SECONDS / 3; a job whose worker died
+# (crash, restart, kill -9) is picked up again once its lease runs out.
+LEASE_SECONDS = 30.0
+IDLE_POLL_INTERVAL = 1.0
+PURGE_INTERVAL = 300.0
+LONG_POLL_INTERVAL = 0.25
+MAX_LONG_POLL_SECONDS = 30.0
+
+QUEUED, RUNNING, DONE, FAILED = "queued", "running", "done", "failed"
+
+jobs_total = Counter("doc_jobs_total", "Background jobs by outcome.", ["outcome"])
+
+
+class JobQueueFull(Exception):
+    """Raised by `enqueue` when JOB_QUEUE_LIMIT jobs are already waiting."""
+
+    retry_after = 30
+
+
+class JobQueue:
+    """
+    Persistent FIFO of documentation jobs in a SQLite file.
+
+    Jobs outlive the process that queued them: every state change is
+    committed, and workers hold a renewable lease on the job they run, so
+    jobs of a worker that died are handed out again. Claims happen in a
+    write transaction, so any number of worker processes can share one
+    queue file (WAL mode, see services/shared_store.py).
+    """
+
+    def __init__(self, path: str):
+        self._lock = threading.Lock()
+        self._conn = connect(path)
+        self._conn.isolation_level = None  # transactions are managed explicitly below
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS jobs ("
+            "id TEXT PRIMARY KEY, status TEXT NOT NULL, request TEXT NOT NULL, result TEXT, error TEXT, "
+            "attempts INTEGER NOT NULL DEFAULT 0, worker TEXT, lease_until REAL, available_at REAL NOT NULL, "
+            "created_at REAL NOT NULL, started_at REAL, finished_at REAL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS jobs_by_status ON jobs (status, available_at)")
+
+    def _write(self, sql: str, params=()) -> int:
+        with self._lock:
+            return self._conn.execute(sql, params).rowcount
+
+    def enqueue(self, request: Dict) -> str:
+        """Stores a job for `request` and returns its id."""
+        job_id = uuid.uuid4().hex
+        now = time.time()
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                queued = self._conn.execute("SELECT COUNT(*) FROM jobs WHERE status = ?", (QUEUED,)).fetchone()[0]
+                if queued >= JOB_QUEUE_LIMIT:
+                    raise JobQueueFull("Too many queued jobs; try again later.")
+                self._conn.execute(
+                    "INSERT INTO jobs (id, status, request, available_at, created_at) VALUES (?, ?, ?, ?, ?)",
+                    (job_id, QUEUED, json.dumps(request), now, now),
+                )
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+        jobs_total.inc(outcome="queued")
+        return job_id
+
+    def claim(self, worker: str) -> Optional[Dict]:
+        """Leases the oldest runnable job to `worker`; returns {"id", "request", "attempts"} or None."""
+        now = time.time()
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = self._conn.execute(
+                    "SELECT id, request, attempts FROM jobs "
+                    "WHERE (status = ? AND available_at <= ?) OR (status = ? AND lease_until < ?) "
+                    "ORDER BY available_at LIMIT 1",
+                    (QUEUED, now, RUNNING, now),
+                ).fetchone()
+                if row is not None:
+                    self._conn.execute(
+                        "UPDATE jobs SET status = ?, worker = ?, lease_until = ?, attempts = attempts + 1, "
+                        "started_at = ? WHERE id = ?",
+                        (RUNNING, worker, now + LEASE_SECONDS, now, row[0]),
+                    )
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+        if row is None:
+            return None
+        return {"id": row[0], "request": json.loads(row[1]), "attempts": row[2] + 1}
+
+    def renew(self, job_id: str, worker: str) -> bool:
+        """Extends the lease; False if the job was meanwhile handed to another worker."""
+        return self._write("UPDATE jobs SET lease_until = ? WHERE id = ? AND worker = ? AND status = ?",
+                           (time.time() + LEASE_SECONDS, job_id, worker, RUNNING)) == 1
+
+    def complete(self, job_id: str, worker: str, result: Dict) -> None:
+        self._write("UPDATE jobs SET status = ?, result = ?, error = NULL, finished_at = ?, lease_until = NULL "
+                    "WHERE id = ? AND worker = ?", (DONE, json.dumps(result), time.time(), job_id, worker))
+
+    def fail(self, job_id: str, worker: str, error: str) -> None:
+        self._write("UPDATE jobs SET status = ?, error = ?, finished_at = ?, lease_until = NULL "
+                    "WHERE id = ? AND worker = ?", (FAILED, error, time.time(), job_id, worker))
+
+    def retry(self, job_id: str, worker: str, delay: float, error: Optional[str] = None) -> None:
+        """Puts a job back in the queue, runnable after `delay` seconds."""
+        self._write("UPDATE jobs SET status = ?, error = ?, available_at = ?, worker = NULL, lease_until = NULL "
+                    "WHERE id = ? AND worker = ?", (QUEUED, error, time.time() + delay, job_id, worker))
+
+    def get(self, job_id: str) -> Optional[Dict]:
+        """Returns the job's public view, or None if it is unknown or was purged."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT id, status, result, error, attempts, created_at, started_at, finished_at "
+                "FROM jobs WHERE id = ?", (job_id,)
+            ).fetchone()
+            position = None
+            if row is not None and row[1] == QUEUED:
+                position = self._conn.execute(
+                    "SELECT COUNT(*) FROM jobs WHERE status = ? AND available_at < "
+                    "(SELECT available_at FROM jobs WHERE id = ?)", (QUEUED, job_id)
+                ).fetchone()[0]
+        if row is None:
+            return None
+        job = {"id": row[0], "status": row[1], "attempts": row[4],
+               "created_at": row[5], "started_at": row[6], "finished_at": row[7]}
+        if position is not None:
+            job["queue_position"] = position
+        if row[2] is not None:
+            job.update(json.loads(row[2]))
+        if row[3] is not None:
+            job["error"] = row[3]
+        return job
+
+    def purge(self, older_than: float = JOB_RETENTION_SECONDS) -> int:
+        """Deletes finished jobs older than `older_than` seconds."""
+        return self._write("DELETE FROM jobs WHERE status IN (?, ?) AND finished_at < ?",
+                           (DONE, FAILED, time.time() - older_than))
+
+    def counts(self) -> Dict[str, int]:
+        with self._lock:
+            rows = self._conn.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall()
+        return dict({QUEUED: 0, RUNNING: 0, DONE: 0, FAILED: 0}, **dict(rows))
+
+
+class JobWorkerPool:
+    """
+    Runs queued jobs with `workers` concurrent asyncio workers.
+
+    `handler` turns a job's request into its JSON result. Transient
+    failures (model unavailable, quota queue full) are retried with
+    backoff up to JOB_MAX_ATTEMPTS; other errors fail the job. Jobs
+    interrupted by `stop()` go back to the queue.
+    """
+
+    def __init__(self, queue: JobQueue, handler: Callable[[Dict], Awaitable[Dict]], workers: int = JOB_WORKERS):
+        self.queue = queue
+        self.handler = handler
+        self.workers = workers
+        self._tasks: List[asyncio.Task] = []
+        self._wakeup: Optional[asyncio.Event] = None
+        self._purged_at = 0.0
+        self.stats = {"completed": 0, "failed": 0, "retried": 0, "running": 0}
+
+    def start(self) -> None:
+        if self._tasks or self.workers <= 0:
+            return
+        self._wakeup = asyncio.Event()
+        prefix = f"{socket.gethostname()}:{os.getpid()}"
+        self._tasks = [asyncio.create_task(self._work(f"{prefix}:{n}")) for n in range(self.workers)]
+
+    def notify(self) -> None:
+        """Wakes idle workers in this process after a job was queued here."""
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    async def stop(self) -> None:
+        tasks, self._tasks = self._tasks, []
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    async def _work(self, worker: str) -> None:
+        while True:
+            job = await asyncio.to_thread(self.queue.claim, worker)
+            if job is None:
+                await self._idle()
+                continue
+            await self._run(worker, job)
+
+    async def _idle(self) -> None:
+        if time.time() - self._purged_at > PURGE_INTERVAL:
+            self._purged_at = time.time()
+            await asyncio.to_thread(self.queue.purge)
+        try:
+            await asyncio.wait_for(self._wakeup.wait(), timeout=IDLE_POLL_INTERVAL)
+        except asyncio.TimeoutError:
+            pass
+        self._wakeup.clear()
+
+    async def _run(self, worker: str, job: Dict) -> None:
+        job_id = job["id"]
+        if job["attempts"] > JOB_MAX_ATTEMPTS:
+            # Its earlier workers all died while running it; don't let it take down more.
+            await self._fail(worker, job_id, Exception("Job was interrupted too many times."))
+            return
+        self.stats["running"] += 1
+        heartbeat = asyncio.create_task(self._heartbeat(job_id, worker))
+        try:
+            result = await self.handler(job["request"])
+        except asyncio.CancelledError:
+            # Shutting down: hand the job straight to the next worker (here or after a restart).
+            self.queue.retry(job_id, worker, 0)
+            raise
+        except (LLMUnavailableError, AdmissionRejected) as e:
+            if job["attempts"] < JOB_MAX_ATTEMPTS:
+                self.stats["retried"] += 1
+                jobs_total.inc(outcome="retried")
+                delay = max(getattr(e, "retry_after", 0), backoff_delay(job["attempts"]))
+                await asyncio.to_thread(self.queue.retry, job_id, worker, delay, str(e))
+            else:
+                await self._fail(worker, job_id, e)
+        except Exception as e:
+            await self._fail(worker, job_id, e)
+        else:
+            self.stats["completed"] += 1
+            jobs_total.inc(outcome="done")
+            await asyncio.to_thread(self.queue.complete, job_id, worker, result)
+        finally:
+            heartbeat.cancel()
+            self.stats["running"] -= 1
+
+    async def _fail(self, worker: str, job_id: str, error: Exception) -> None:
+        print(f"Job {job_id} failed: {error}")
+        self.stats["failed"] += 1
+        jobs_total.inc(outcome="failed")
+        await asyncio.to_thread(self.queue.fail, job_id, worker, str(error))
+
+    async def _heartbeat(self, job_id: str, worker: str) -> None:
+        while True:
+            await asyncio.sleep(LEASE_SECONDS / 3)
+            await asyncio.to_thread(self.queue.renew, job_id, worker)
+
+    def get_stats(self) -> Dict[str, int]:
+        return dict(self.stats, workers=len(self._tasks), **self.queue.counts())
+
+
+async def wait_for_job(queue: JobQueue, job_id: str, wait: float) -> Optional[Dict]:
+    """Long-polls the job until it finishes or `wait` seconds (capped) have passed."""
+    deadline = time.monotonic() + min(max(wait, 0.0), MAX_LONG_POLL_SECONDS)
+    while True:
+        job = await asyncio.to_thread(queue.get, job_id)
+        if job is None or job["status"] in (DONE, FAILED) or time.monotonic() >= deadline:
+            return job
+        await asyncio.sleep(LONG_POLL_INTERVAL)
+
+
+job_queue = JobQueue(JOBS_PATH)
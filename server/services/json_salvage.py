@@ -0,0 +1,66 @@
+import re
+import json
+from typing import Any, Dict, Iterable, Optional
+
+from services.json_stream import IncrementalJSONParser
+
+_FENCE = re.compile(r'^\s*```(?:json)?\s*|\s*```\s*$', re.IGNORECASE)
+# A backslash escape: \uXXXX or a backslash followed by any single character.
+_ESCAPE = re.compile(r'\\(u[0-9a-fA-F]{4}|.)', re.DOTALL)
+_VALID_ESCAPES = set('"\\/bfnrt')
+_TRAILING_COMMA = re.compile(r',(\s*[}\]])')
+
+
+def _fix_escapes(text: str) -> str:
+    """Doubles backslashes that do not start a valid JSON escape (e.g. `\\%` or `\\e` copied from C code)."""
+    def fix(match):
+        escaped = match.group(1)
+        if len(escaped) == 5 or escaped in _VALID_ESCAPES:
+            return match.group(0)
+        return "\\\\" + escaped
+    return _ESCAPE.sub(fix, text)
+
+
+def _strip_wrapping(text: str) -> str:
+    """Removes code fences and any prose around the outermost JSON object."""
+    text = _FENCE.sub("", text.strip())
+    start = text.find("{")
+    end = text.rfind("}")
+    if start < 0:
+        return text
+    return text[start:end + 1] if end > start else text[start:]
+
+
+def repair_json(text: str) -> Optional[Dict[str, Any]]:
+    """
+    Tries to decode a complete-but-malformed JSON object.
+
+    Handles stray fences or prose, raw newlines/tabs inside strings, invalid
+    backslash escapes and trailing commas. Returns None if the object is
+    still undecodable (e.g. it was truncated).
+    """
+    candidate = _strip_wrapping(text)
+    for attempt in (candidate, _TRAILING_COMMA.sub(r'\1', _fix_escapes(candidate))):
+        try:
+            result = json.loads(attempt, strict=False)
+        except json.JSONDecodeError:
+            continue
+        if isinstance(result, dict):
+            return result
+    return None
+
+
+def salvage_sections(text: str, keys: Iterable[str]) -> Dict[str, str]:
+    """
+    Returns every section among `keys` whose string value is intact in `text`.
+
+    Used when the object cannot be repaired as a whole, typically because
+    the model hit its output token limit: the members before the cut are
+    complete and kept, the truncated one is dropped.
+    """
+    wanted = set(keys)
+    parser = IncrementalJSONParser()
+    # No _strip_wrapping: a truncated object has no closing brace, and cutting at
+    # the last "}" would land inside a code section.
+    parser.feed(_fix_escapes(_FENCE.sub("", text.strip())))
+    return {key: value for key, value in parser.result.items() if key in wanted and isinstance(value, str)}
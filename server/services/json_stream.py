@@ -0,0 +1,102 @@
+import json
+from typing import Any, Dict, List, Optional, Tuple
+
+
+class IncrementalJSONParser:
+    """
+    Emits the top-level members of a JSON object as soon as each one is complete.
+
+    Text is fed in arbitrary chunks (e.g. streamed model output). Every
+    character is scanned exactly once, so total work is linear in the size of
+    the response. Anything before the opening brace, such as a ```json fence,
+    is skipped.
+    """
+
+    def __init__(self):
+        self.buffer = ""
+        self.result: Dict[str, Any] = {}
+        self.finished = False
+        self._pos = 0
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+        self._state = "start"  # start -> key -> colon -> value -> comma -> key ... -> end
+        self._token_start: Optional[int] = None
+        self._key: Optional[str] = None
+
+    def feed(self, chunk: str) -> List[Tuple[str, Any]]:
+        """Consumes `chunk` and returns the (key, value) pairs it completed."""
+        self.buffer += chunk
+        completed = []
+        buffer = self.buffer
+        for i in range(self._pos, len(buffer)):
+            if self.finished:
+                break
+            char = buffer[i]
+
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif char == "\\":
+                    self._escape = True
+                elif char == '"':
+                    self._in_string = False
+                    if self._depth == 1:
+                        if self._state == "key":
+                            self._key = json.loads(buffer[self._token_start:i + 1], strict=False)
+                            self._token_start = None
+                            self._state = "colon"
+                        elif self._state == "value":
+                            self._complete(buffer[self._token_start:i + 1], completed)
+                continue
+
+            if self._state == "start":
+                if char == "{":
+                    self._depth = 1
+                    self._state = "key"
+                continue
+
+            if char == '"':
+                self._in_string = True
+                if self._depth == 1 and self._state in ("key", "value") and self._token_start is None:
+                    self._token_start = i
+            elif char in "{[":
+                if self._depth == 1 and self._state == "value" and self._token_start is None:
+                    self._token_start = i
+                self._depth += 1
+            elif char in "}]":
+                self._depth -= 1
+                if self._depth == 1 and self._state == "value":
+                    self._complete(buffer[self._token_start:i + 1], completed)
+                elif self._depth == 0:
+                    if self._state == "value" and self._token_start is not None:
+                        self._complete(buffer[self._token_start:i], completed)
+                    self._state = "end"
+                    self.finished = True
+            elif self._depth == 1:
+                if char == ":" and self._state == "colon":
+                    self._state = "value"
+                elif char == ",":
+                    if self._state == "value" and self._token_start is not None:
+                        self._complete(buffer[self._token_start:i], completed)
+                    self._state = "key"
+                elif not char.isspace() and self._state == "value" and self._token_start is None:
+                    # Start of a scalar literal (number, true, false, null).
+                    self._token_start = i
+        self._pos = len(buffer)
+        return completed
+
+    def _complete(self, raw_value: str, completed: List[Tuple[str, Any]]) -> None:
+        key = self._key
+        self._key = None
+        self._token_start = None
+        self._state = "comma"
+        try:
+            # strict=False tolerates raw newlines/tabs inside strings, which
+            # the model occasionally emits instead of \n escapes.
+            value = json.loads(raw_value.strip(), strict=False)
+        except json.JSONDecodeError as e:
+            print(f"Warning: Skipping undecodable value for key '{key}': {e}")
+            return
+        self.result[key] = value
+        completed.append((key, value))
@@ -0,0 +1,85 @@
+import re
+from functools import lru_cache
+from typing import Optional, Tuple
+
+from services.cache import normalize_question
+
+# Written against tests/fixtures/lab_questions.json; accuracy is measured on the
+# separate held-out set (benchmarks/language_detection.py), which must not be
+# used to tune these rules.
+# (pattern, weight) pairs. Weight 3 marks a phrase that on its own settles the
+# question; weight 1 marks a hint that only matters in combination.
+SHELL_RULES = [
+    (r'\bshell\s*(script|program|programming)\b', 3),
+    (r'\bbash\b', 3),
+    (r'\bsh\s+script\b', 3),
+    (r'\b(file|folder|directory|directories|files|folders)\b', 1),
+    (r'\b(exists?|existence)\b', 1),
+    (r'\b(textfile|text file)\b', 1),
+    (r'\b(grep|sed|awk|chmod|permissions?)\b', 1),
+    (r'\b(list|lists|listing)\b', 1),
+    (r'\b(create|delete|rename|copy|move)\b', 1),
+]
+
+C_RULES = [
+    (r'\bc\s+(program|code|language|implementation)\b', 3),
+    (r'\bin\s+c\b', 3),
+    (r'\b(fcfs|sjf|srtf|round\s*robin|first\s+come\s+first\s+serve[d]?|shortest\s+job)\b', 3),
+    (r'\b(banker\'?s?|deadlock)\b', 3),
+    (r'\b(first|best|worst|next)\s+fit\b', 3),
+    (r'\b(fork|exec|pthread|threads?|semaphores?|mutex)\b', 3),
+    # System-call and libc vocabulary: these questions often mention files and
+    # directories too, which on their own point at shell scripts.
+    (r'\bsystem\s+calls?\b|\b\w+\s*\(\s*\)', 3),
+    (r'\b(readdir|opendir|closedir|lseek|[lf]?stat|dup2?|waitpid|exec[lv]p?e?|getp?pid|mkfifo|'
+     r'shm(get|at|dt|ctl)|msg(get|snd|rcv|ctl)|sem(get|op|ctl)|sem_\w+)\b', 3),
+    (r'\bshared\s+memory\b|\bshm\w*\b|\bipc\b|\bmessage\s+queues?\b|\bpipes?\b', 3),
+    (r'\bproducer\b|\bconsumer\b|\bdining\s+philosophers?\b|\breaders?\s*-?\s*writers?\b', 3),
+    (r'\bpage\s+replacement\b|\b(lru|fifo|optimal)\s+page\b|\bpaging\b', 3),
+    (r'\bdisk\s+scheduling\b|\b(scan|c-scan|look|c-look|sstf)\b', 3),
+    (r'\bscheduling\b|\bpriority\b|\bgantt\b', 1),
+    (r'\b(memory|allocation|process(es)?|algorithm)\b', 1),
+]
+
+_SHELL_PATTERNS = [(re.compile(pattern), weight) for pattern, weight in SHELL_RULES]
+_C_PATTERNS = [(re.compile(pattern), weight) for pattern, weight in C_RULES]
+
+# Added to the denominator so a single weak hint never reads as certainty.
+CONFIDENCE_SMOOTHING = 0.3
+
+
+def _score(text: str, patterns) -> int:
+    return sum(weight for pattern, weight in patterns if pattern.search(text))
+
+
+@lru_cache(maxsize=4096)
+def _classify_question(normalized_question: str) -> Tuple[str, float]:
+    shell_score = _score(normalized_question, _SHELL_PATTERNS)
+    c_score = _score(normalized_question, _C_PATTERNS)
+    total = shell_score + c_score + CONFIDENCE_SMOOTHING
+    if shell_score > c_score:
+        return "Shell", round(shell_score / total, 3)
+    if c_score > shell_score:
+        return "C", round(c_score / total, 3)
+    # No signal (or a tie): C is the repo-wide default, but with low confidence.
+    return "C", 0.5 if shell_score == 0 else round(c_score / total, 3)
+
+
+def classify_language(question: str, code: Optional[str] = None) -> Tuple[str, float]:
+    """
+    Classifies an OS lab question as "C" or "Shell" without calling the model.
+
+    Args:
+        question: The OS lab question text.
+        code: Optional user-provided code; a `#!/` shebang or C markers settle it.
+
+    Returns:
+        A (language, confidence) tuple with confidence in [0, 1].
+    """
+    if code:
+        stripped = code.strip()
+        if stripped.startswith("#!/"):
+            return "Shell", 1.0
+        if re.search(r'#include\s*[<"]|\bint\s+main\s*\(', stripped):
+            return "C", 0.99
+    return _classify_question(normalize_question(question))
@@ -0,0 +1,255 @@
+import os
+import re
+import json
+import time
+import random
+import asyncio
+import threading
+from typing import Dict, List, Optional
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# "gemini" (default) or "stub" for offline runs and load tests.
+LLM_BACKEND = os.getenv("LLM_BACKEND", "gemini").lower()
+GEMINI_MODEL = os.getenv("GEMINI_MODEL", "gemini-2.0-flash")
+
+# Calls asking for at most this many output tokens are classification calls (language detection).
+CLASSIFICATION_MAX_OUTPUT_TOKENS = 16
+
+
+def is_classification_call(generation_config: Optional[Dict]) -> bool:
+    """True for tiny classification calls, which are scheduled and routed apart from generations."""
+    max_output = (generation_config or {}).get("max_output_tokens", 0)
+    return 0 < max_output <= CLASSIFICATION_MAX_OUTPUT_TOKENS
+
+
+# Mirrors gemini_os_doc.EXPECTED_KEYS; kept here so the stub has no import cycle.
+_SECTIONS = ("overview", "shortAlgorithm", "detailedAlgorithm", "code",
+             "requiredModules", "variablesAndConstants", "functions", "explanation")
+
+
+class LLMBackend:
+    """
+    Minimal interface the documentation service needs from a model.
+
+    It matches the subset of `google.generativeai.GenerativeModel` used by
+    the service: responses expose `.text`, and streamed async responses are
+    async-iterable chunks that expose `.text`.
+    """
+    model_name = ""
+
+    def generate_content(self, prompt: str, generation_config: Optional[Dict] = None):
+        raise NotImplementedError
+
+    async def generate_content_async(self, prompt: str, generation_config: Optional[Dict] = None,
+                                     stream: bool = False):
+        raise NotImplementedError
+
+
+_global_key: Optional[str] = None
+
+
+def _configure_global_key(genai, api_key: Optional[str]) -> None:
+    """Fallback for SDKs without per-model clients: one process-wide key only."""
+    global _global_key
+    if _global_key is not None and _global_key != api_key:
+        raise RuntimeError(
+            f"google-generativeai {getattr(genai, '__version__', '?')} has no per-model clients, "
+            "so only one GEMINI_API_KEYS entry can be used; install the version in requirements.txt."
+        )
+    if _global_key is None:
+        genai.configure(api_key=api_key)
+        _global_key = api_key
+
+
+class GeminiBackend(LLMBackend):
+    """
+    One Gemini model behind one API key, set up on first use so importing
+    the service needs no key.
+
+    Each instance gets its own clients instead of going through the global
+    `genai.configure`, so several keys can be used side by side. The SDK has
+    no public per-model key option: the clients are built with the public
+    `google.ai.generativelanguage` constructors and attached to the model's
+    `_client`/`_async_client` attributes, present throughout the 0.8 SDK
+    series that requirements.txt pins. Should an SDK lack them, a single key
+    falls back to the global configuration and several keys are refused.
+    """
+
+    def __init__(self, model_name: str = GEMINI_MODEL, api_key: Optional[str] = None):
+        self.model_name = model_name
+        self._api_key = api_key
+        self._model = None
+        self._lock = threading.Lock()
+
+    def _get_model(self):
+        if self._model is None:
+            with self._lock:
+                if self._model is None:
+                    import google.generativeai as genai
+                    api_key = self._api_key or os.getenv("GEMINI_API_KEY")
+                    model = genai.GenerativeModel(self.model_name)
+                    if hasattr(model, "_client") and hasattr(model, "_async_client"):
+                        from google.ai import generativelanguage as glm
+                        options = {"api_key": api_key}
+                        model._client = glm.GenerativeServiceClient(client_options=options)
+                        model._async_client = glm.GenerativeServiceAsyncClient(client_options=options)
+                    else:
+                        _configure_global_key(genai, api_key)
+                    self._model = model
+        return self._model
+
+    def generate_content(self, prompt: str, generation_config: Optional[Dict] = None):
+        return self._get_model().generate_content(prompt, generation_config=generation_config)
+
+    async def generate_content_async(self, prompt: str, generation_config: Optional[Dict] = None,
+                                     stream: bool = False):
+        return await self._get_model().generate_content_async(
+            prompt, generation_config=generation_config, stream=stream
+        )
+
+
+class StubBackendError(Exception):
+    """Raised by StubBackend to simulate a failed (retryable) API call."""
+    transient = True
+
+
+class _StubResponse:
+    def __init__(self, text: str):
+        self.text = text
+
+
+class _StubStream:
+    """Async-iterable stand-in for a streamed Gemini response."""
+
+    def __init__(self, chunks: List[str], delay: float):
+        self._chunks = chunks
+        self._delay = delay
+
+    async def __aiter__(self):
+        for chunk in self._chunks:
+            await asyncio.sleep(self._delay)
+            yield _StubResponse(chunk)
+
+
+class StubBackend(LLMBackend):
+    """
+    Deterministic local backend returning canned JSON documentation.
+
+    Every call waits `latency` seconds plus uniform jitter of up to
+    `jitter` seconds (`slow_latency` instead, with probability `slow_rate`,
+    to model a long tail) and fails with StubBackendError with probability
+    `error_rate`; the random source is seeded, so a run is reproducible.
+    Detection prompts get "C" or "Shell"; generation prompts get a JSON
+    object with a short placeholder for each section listed under
+    REQUESTED DOCUMENTATION SECTIONS.
+    """
+
+    def __init__(self, latency: float = 0.2, jitter: float = 0.05, error_rate: float = 0.0,
+                 seed: int = 0, stream_chunks: int = 8, slow_rate: float = 0.0, slow_latency: float = 2.0,
+                 max_concurrency: int = 0, model_name: str = "stub"):
+        self.model_name = model_name
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.slow_rate = slow_rate
+        self.slow_latency = slow_latency
+        self.stream_chunks = stream_chunks
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        # Models a per-key throughput limit: calls beyond it queue inside the "API".
+        self._slots = asyncio.Semaphore(max_concurrency) if max_concurrency > 0 else None
+        self.stats = {"calls": 0, "errors": 0}
+
+    def _next_delay(self) -> float:
+        with self._lock:
+            self.stats["calls"] += 1
+            failed = self._random.random() < self.error_rate
+            delay = self.latency + self._random.uniform(0, self.jitter)
+            if self._random.random() < self.slow_rate:
+                delay = self.slow_latency
+            if failed:
+                self.stats["errors"] += 1
+        if failed:
+            raise StubBackendError("Simulated backend error")
+        return delay
+
+    def generate_content(self, prompt: str, generation_config: Optional[Dict] = None):
+        delay = self._next_delay()
+        time.sleep(delay)
+        return _StubResponse(self.answer(prompt))
+
+    async def generate_content_async(self, prompt: str, generation_config: Optional[Dict] = None,
+                                     stream: bool = False):
+        delay = self._next_delay()
+        text = self.answer(prompt)
+        if stream:
+            size = max(1, -(-len(text) // self.stream_chunks))
+            chunks = [text[i:i + size] for i in range(0, len(text), size)]
+            return _StubStream(chunks, delay / len(chunks))
+        if self._slots is None:
+            await asyncio.sleep(delay)
+        else:
+            async with self._slots:
+                await asyncio.sleep(delay)
+        return _StubResponse(text)
+
+    @staticmethod
+    def answer(prompt: str) -> str:
+        """The canned reply for `prompt`."""
+        if 'Respond with ONLY the single word "C" or "Shell"' in prompt:
+            question = prompt.split("QUESTION:", 1)[-1].lower()
+            return "Shell" if "shell" in question or "bash" in question else "C"
+
+        listed = re.search(r'REQUESTED DOCUMENTATION SECTIONS:\*\*\s*((?:\s*- \w+)*)', prompt)
+        requested = set(re.findall(r'- (\w+)', listed.group(1))) if listed else set()
+        return json.dumps({
+            section: (f"Stub {section} content." if section in requested else "")
+            for section in _SECTIONS
+        })
+
+
+def api_keys() -> List[Optional[str]]:
+    """Gemini API keys from GEMINI_API_KEYS (comma-separated), else the single GEMINI_API_KEY."""
+    keys = [key.strip() for key in os.getenv("GEMINI_API_KEYS", "").split(",") if key.strip()]
+    return keys or [os.getenv("GEMINI_API_KEY")]
+
+
+def key_count(name: str = LLM_BACKEND) -> int:
+    """Number of API keys the backend selected by `name` spreads calls over."""
+    if name == "stub":
+        return max(1, int(os.getenv("STUB_KEYS", "1")))
+    return len(api_keys())
+
+
+def create_backend(name: str = LLM_BACKEND) -> LLMBackend:
+    """
+    Returns the routed backend selected by `name` (the LLM_BACKEND setting by default).
+
+    Gemini uses one client per key in GEMINI_API_KEYS (comma-separated;
+    falls back to GEMINI_API_KEY). The stub simulates STUB_KEYS keys, each
+    limited to STUB_KEY_CONCURRENCY concurrent calls (0 = unlimited).
+    """
+    # Imported here: routing builds on resilience, which imports this module.
+    from services.routing import RoutedBackend, model_routes
+
+    if name == "stub":
+        def make_stub(key_index: int, model_name: str) -> LLMBackend:
+            return StubBackend(
+                latency=float(os.getenv("STUB_LATENCY_MS", "200")) / 1000,
+                jitter=float(os.getenv("STUB_JITTER_MS", "50")) / 1000,
+                error_rate=float(os.getenv("STUB_ERROR_RATE", "0")),
+                seed=int(os.getenv("STUB_SEED", "0")) + key_index,
+                slow_rate=float(os.getenv("STUB_SLOW_RATE", "0")),
+                slow_latency=float(os.getenv("STUB_SLOW_MS", "2000")) / 1000,
+                max_concurrency=int(os.getenv("STUB_KEY_CONCURRENCY", "0")),
+                model_name=model_name,
+            )
+        return RoutedBackend(key_count(name), model_routes(), make_stub)
+
+    if name != "gemini":
+        print(f"Warning: Unknown LLM_BACKEND '{name}'. Using gemini.")
+    keys = api_keys()
+    return RoutedBackend(len(keys), model_routes(),
+                         lambda key_index, model_name: GeminiBackend(model_name, api_key=keys[key_index]))
@@ -0,0 +1,222 @@
+import os
+import re
+import time
+import bisect
+import threading
+import contextvars
+from contextlib import contextmanager
+from typing import Dict, List, Optional, Sequence, Tuple
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Always send a Server-Timing header, not only when the client asks with X-Request-Timing: 1.
+TIMING_HEADER_ALWAYS = os.getenv("METRICS_TIMING_HEADER", "0") == "1"
+
+PROMETHEUS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Seconds; spans range from microseconds (cache lookups) to tens of seconds (generation).
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+# Every Counter/Histogram registers itself here on creation, in definition order.
+REGISTRY: List = []
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+class Counter:
+    """Monotonic counter with a fixed set of label names."""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[Tuple, float] = {}
+        self._lock = threading.Lock()
+        REGISTRY.append(self)
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        key = tuple(labels[name] for name in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            values = list(self._values.items())
+        for key, value in sorted(values):
+            lines.append(f"{self.name}{_format_labels(self.labelnames, key)} {value}")
+        return lines
+
+
+class Histogram:
+    """Cumulative-bucket histogram with a fixed set of label names."""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        # label values -> [per-bucket counts (+Inf last), sum, count]
+        self._series: Dict[Tuple, list] = {}
+        self._lock = threading.Lock()
+        REGISTRY.append(self)
+
+    def observe(self, value: float, **labels) -> None:
+        key = tuple(labels[name] for name in self.labelnames)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            snapshot = [(key, list(series[0]), series[1], series[2]) for key, series in self._series.items()]
+        for key, counts, total, count in sorted(snapshot):
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += bucket_count
+                le = 'le="+Inf"' if bound == float("inf") else f'le="{bound!r}"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labelnames, key)} {total}")
+            lines.append(f"{self.name}_count{_format_labels(self.labelnames, key)} {count}")
+        return lines
+
+
+# --- Application metrics ---
+stage_seconds = Histogram(
+    "doc_stage_duration_seconds",
+    "Time spent per pipeline stage (prompt_build includes c_parse; llm covers the whole model call).",
+    ["stage"],
+)
+request_seconds = Histogram(
+    "doc_http_request_duration_seconds", "HTTP request latency until the last body byte is sent.", ["path"],
+)
+requests_total = Counter("doc_http_requests_total", "HTTP requests by path and status code.", ["path", "status"])
+llm_calls_total = Counter("doc_llm_calls_total", "Model calls by kind and outcome.", ["kind", "outcome"])
+llm_prompt_tokens_total = Counter("doc_llm_prompt_tokens_total", "Estimated prompt tokens sent to the model.", ["kind"])
+llm_response_bytes_total = Counter("doc_llm_response_bytes_total", "Bytes of model response text received.", ["kind"])
+lookups_total = Counter(
+    "doc_lookups_total", "Where a documentation request was answered from (corpus, cache, similar or miss).",
+    ["source"],
+)
+errors_total = Counter("doc_errors_total", "Errors by pipeline stage.", ["stage"])
+salvage_total = Counter(
+    "doc_json_salvage_total",
+    "Malformed model responses by recovery outcome (repaired, extracted, rerequested or failed).",
+    ["outcome"],
+)
+
+# Per-request stage timings for the Server-Timing header; None outside a request.
+_request_timings: contextvars.ContextVar[Optional[Dict[str, float]]] = contextvars.ContextVar(
+    "request_timings", default=None
+)
+
+
+@contextmanager
+def span(stage: str):
+    """Times the enclosed block into doc_stage_duration_seconds and the current request's timings."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        stage_seconds.observe(elapsed, stage=stage)
+        timings = _request_timings.get()
+        if timings is not None:
+            timings[stage] = timings.get(stage, 0.0) + elapsed
+
+
+def record_llm_call(kind: str, prompt_tokens: int, response_text: Optional[str], outcome: str = "ok") -> None:
+    """Counts one model call with its estimated prompt tokens and response size."""
+    llm_calls_total.inc(kind=kind, outcome=outcome)
+    llm_prompt_tokens_total.inc(prompt_tokens, kind=kind)
+    if response_text:
+        llm_response_bytes_total.inc(len(response_text.encode("utf-8")), kind=kind)
+
+
+def _stats_lines(prefix: str, stats: Dict) -> List[str]:
+    lines = []
+    for key, value in stats.items():
+        name = f"{prefix}_{re.sub(r'[^a-zA-Z0-9_]', '_', key)}"
+        if isinstance(value, dict):
+            lines.extend(_stats_lines(name, value))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            lines.append(f"# TYPE {name} gauge")
+            lines.append(f"{name} {value}")
+    return lines
+
+
+def render_metrics(stats: Optional[Dict[str, Dict]] = None) -> str:
+    """
+    Renders all metrics in the Prometheus text format.
+
+    `stats` maps a metric prefix to a (possibly nested) dict of numeric
+    counters owned by other components, e.g. the cache's get_stats().
+    """
+    lines = []
+    for metric in REGISTRY:
+        lines.extend(metric.render())
+    for prefix, values in (stats or {}).items():
+        lines.extend(_stats_lines(prefix, values))
+    return "\n".join(lines) + "\n"
+
+
+class MetricsMiddleware:
+    """
+    ASGI middleware recording request latency/status and collecting span timings per request.
+
+    When METRICS_TIMING_HEADER=1 or the request carries `X-Request-Timing: 1`,
+    the response gets a `Server-Timing` header with the stages finished
+    before the headers were sent (for streamed responses, those before the
+    first byte).
+    """
+
+    def __init__(self, app, paths: Sequence[str] = ()):
+        self.app = app
+        self.paths = set(paths)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        path = scope["path"] if scope["path"] in self.paths else "other"
+        want_header = TIMING_HEADER_ALWAYS or (b"x-request-timing", b"1") in scope["headers"]
+        timings: Dict[str, float] = {}
+        token = _request_timings.set(timings)
+        start = time.perf_counter()
+        status = 500
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                if want_header:
+                    entries = [f"{stage};dur={seconds * 1000:.2f}" for stage, seconds in timings.items()]
+                    entries.append(f"total;dur={(time.perf_counter() - start) * 1000:.2f}")
+                    message["headers"] = list(message.get("headers", [])) + [
+                        (b"server-timing", ", ".join(entries).encode("latin-1"))
+                    ]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            _request_timings.reset(token)
+            request_seconds.observe(time.perf_counter() - start, path=path)
+            requests_total.inc(path=path, status=str(status))
@@ -0,0 +1,343 @@
+import os
+import re
+import json
+import zlib
+import time
+import asyncio
+import hashlib
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Dict, List, Optional, Tuple
+from dotenv import load_dotenv
+
+from services.singleflight import SingleFlight
+
+load_dotenv()
+
+PDF_CACHE_DIR = os.getenv(
+    "PDF_CACHE_DIR", os.path.join(os.path.dirname(os.path.dirname(__file__)), "cache", "pdf")
+)
+PDF_RENDER_WORKERS = int(os.getenv("PDF_RENDER_WORKERS", "2"))
+# Rendered files unused for this long are deleted, then the least recently used
+# ones until the directory fits in PDF_CACHE_MAX_BYTES.
+PDF_MAX_AGE_SECONDS = float(os.getenv("PDF_MAX_AGE_SECONDS", str(7 * 24 * 3600)))
+PDF_CACHE_MAX_BYTES = int(os.getenv("PDF_CACHE_MAX_BYTES", str(256 * 2 ** 20)))
+# Temporary files of renders that died half way.
+STALE_TEMPORARY_SECONDS = 3600
+
+# Same titles and order as the client's documentation viewer.
+SECTION_TITLES = {
+    "overview": "Question Overview & Concepts",
+    "shortAlgorithm": "Short Algorithm",
+    "detailedAlgorithm": "Detailed Algorithm",
+    "code": "Code",
+    "requiredModules": "Required Modules",
+    "variablesAndConstants": "Variables & Constants",
+    "functions": "Functions",
+    "explanation": "Code Explanation",
+}
+
+_ARTIFACT_ID = re.compile(r'^[0-9a-f]{64}$')
+
+# --- Layout (A4 in points; the same sizes as the jsPDF export it replaces) ---
+PAGE_WIDTH = 595.28
+PAGE_HEIGHT = 841.89
+MARGIN = 28.35               # 10 mm
+TEXT_WIDTH = PAGE_WIDTH - 2 * MARGIN
+
+# Glyph widths of Helvetica for printable ASCII (1/1000 em, from the standard AFM metrics).
+_HELVETICA_WIDTHS = [
+    278, 278, 355, 556, 556, 889, 667, 191, 333, 333, 389, 584, 278, 333, 278, 278,
+    556, 556, 556, 556, 556, 556, 556, 556, 556, 556, 278, 278, 584, 584, 584, 556,
+    1015, 667, 667, 722, 722, 667, 611, 778, 722, 278, 500, 667, 556, 833, 722, 778,
+    667, 778, 722, 667, 611, 722, 667, 944, 667, 667, 611, 278, 278, 278, 469, 556,
+    333, 556, 556, 500, 556, 556, 278, 556, 556, 222, 222, 500, 222, 833, 556, 556,
+    556, 556, 333, 500, 278, 556, 500, 722, 500, 500, 500, 334, 260, 334, 584,
+]
+_COURIER_WIDTH = 600
+
+# Resource name -> base font; the three standard fonts every PDF viewer has built in.
+_FONTS = {"F1": "Helvetica", "F2": "Helvetica-Bold", "F3": "Courier"}
+
+
+def result_hash(question: str, result: Dict[str, str]) -> str:
+    """Content hash of a generated result: the question plus every documented section."""
+    payload = json.dumps({
+        "question": question,
+        "sections": {key: result.get(key) or "" for key in SECTION_TITLES},
+    }, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def artifact_id(result_digest: str, sections: Dict[str, bool]) -> str:
+    """Identifies one rendered PDF: a result hash plus the sections selected for export."""
+    selected = ",".join(key for key in SECTION_TITLES if sections.get(key))
+    return hashlib.sha256(f"{result_digest}:{selected}".encode("utf-8")).hexdigest()
+
+
+def _text_width(text: str, size: float, monospace: bool) -> float:
+    if monospace:
+        return len(text) * _COURIER_WIDTH * size / 1000
+    total = 0
+    for char in text:
+        code = ord(char)
+        total += _HELVETICA_WIDTHS[code - 32] if 32 <= code < 127 else 556
+    return total * size / 1000
+
+
+def _wrap(text: str, size: float, monospace: bool) -> List[str]:
+    """Splits `text` into lines no wider than TEXT_WIDTH, keeping blank lines and indentation."""
+    lines = []
+    for paragraph in text.expandtabs(4).splitlines() or [""]:
+        if _text_width(paragraph, size, monospace) <= TEXT_WIDTH:
+            lines.append(paragraph)
+            continue
+        current = ""
+        for word in re.findall(r'\s*\S+', paragraph):
+            candidate = current + word
+            if _text_width(candidate, size, monospace) <= TEXT_WIDTH:
+                current = candidate
+                continue
+            if current:
+                lines.append(current)
+                word = word.lstrip()
+            # A single word longer than the line (URLs, long expressions) is cut.
+            while _text_width(word, size, monospace) > TEXT_WIDTH:
+                cut = len(word)
+                while cut > 1 and _text_width(word[:cut], size, monospace) > TEXT_WIDTH:
+                    cut -= 1
+                lines.append(word[:cut])
+                word = word[cut:]
+            current = word
+        lines.append(current)
+    return lines
+
+
+def _pdf_string(text: str) -> bytes:
+    # The standard fonts use WinAnsiEncoding; anything outside it prints as "?".
+    data = text.encode("cp1252", errors="replace")
+    return b"(" + data.replace(b"\\", b"\\\\").replace(b"(", b"\\(").replace(b")", b"\\)") + b")"
+
+
+class _Pages:
+    """Places lines top to bottom, starting a new page when one is full."""
+
+    def __init__(self):
+        self.pages: List[List[bytes]] = [[]]
+        self.y = PAGE_HEIGHT - MARGIN
+
+    def space(self, points: float) -> None:
+        self.y -= points
+
+    def line(self, text: str, font: str, size: float, centered: bool = False) -> None:
+        leading = size * 1.4
+        if self.y - leading < MARGIN:
+            self.pages.append([])
+            self.y = PAGE_HEIGHT - MARGIN
+        self.y -= leading
+        x = MARGIN
+        if centered:
+            x = (PAGE_WIDTH - _text_width(text, size, font == "F3")) / 2
+        self.pages[-1].append(
+            b"BT /%s %.1f Tf %.2f %.2f Td %s Tj ET" % (font.encode(), size, x, self.y, _pdf_string(text))
+        )
+
+    def paragraph(self, text: str, font: str, size: float) -> None:
+        for line in _wrap(text, size, font == "F3"):
+            self.line(line, font, size)
+
+
+def _assemble(pages: List[List[bytes]]) -> bytes:
+    """Writes the page contents out as a PDF file."""
+    objects: List[bytes] = []
+    font_ids = {}
+    for name, base_font in _FONTS.items():
+        objects.append(b"<< /Type /Font /Subtype /Type1 /BaseFont /%s /Encoding /WinAnsiEncoding >>"
+                       % base_font.encode())
+        font_ids[name] = len(objects) + 2  # objects 1 and 2 are the catalog and page tree
+    fonts = b" ".join(b"/%s %d 0 R" % (name.encode(), object_id) for name, object_id in font_ids.items())
+
+    page_ids = []
+    for operations in pages:
+        stream = zlib.compress(b"\n".join(operations))
+        objects.append(b"<< /Length %d /Filter /FlateDecode >>\nstream\n%s\nendstream" % (len(stream), stream))
+        content_id = len(objects) + 2
+        objects.append(b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 %.2f %.2f] /Resources << /Font << %s >> >> "
+                       b"/Contents %d 0 R >>" % (PAGE_WIDTH, PAGE_HEIGHT, fonts, content_id))
+        page_ids.append(len(objects) + 2)
+
+    kids = b" ".join(b"%d 0 R" % page_id for page_id in page_ids)
+    objects = [b"<< /Type /Catalog /Pages 2 0 R >>",
+               b"<< /Type /Pages /Kids [%s] /Count %d >>" % (kids, len(page_ids))] + objects
+
+    output = bytearray(b"%PDF-1.4\n%\xe2\xe3\xcf\xd3\n")
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(len(output))
+        output += b"%d 0 obj\n%s\nendobj\n" % (number, body)
+    xref = len(output)
+    output += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    output += b"".join(b"%010d 00000 n \n" % offset for offset in offsets)
+    output += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref)
+    return bytes(output)
+
+
+def render_pdf(question: str, result: Dict[str, str], sections: Dict[str, bool]) -> bytes:
+    """
+    Renders the selected, non-empty sections of `result` as an A4 PDF.
+
+    The layout follows the browser export: a centred title, the question,
+    then each section under its heading. The code section is set in Courier.
+    Output is deterministic, so equal inputs give byte-identical files.
+    """
+    pages = _Pages()
+    pages.line("OS Lab Documentation", "F2", 18, centered=True)
+    pages.space(12)
+    if question:
+        pages.line("Question:", "F2", 12)
+        pages.paragraph(question, "F1", 10)
+        pages.space(12)
+    for key, title in SECTION_TITLES.items():
+        content = result.get(key) or ""
+        if not sections.get(key) or not content.strip():
+            continue
+        pages.line(title, "F2", 14)
+        pages.space(4)
+        if key == "code":
+            pages.paragraph(content, "F3", 9)
+        else:
+            pages.paragraph(content, "F1", 10)
+        pages.space(12)
+    return _assemble(pages.pages)
+
+
+def _render_to_file(path: str, question: str, result: Dict[str, str], sections: Dict[str, bool]) -> int:
+    """Runs in a pool process: renders and publishes the file atomically. Returns its size."""
+    data = render_pdf(question, result, sections)
+    temporary = f"{path}.{os.getpid()}.tmp"
+    with open(temporary, "wb") as handle:
+        handle.write(data)
+    os.replace(temporary, path)
+    return len(data)
+
+
+class PdfExporter:
+    """
+    Renders documentation PDFs in a process pool and keeps them on disk.
+
+    Files are named by `artifact_id`, so a repeat download of the same
+    result and section selection is served straight from disk. Concurrent
+    requests for the same artifact share one render. Serving a file bumps
+    its mtime, so `purge` can drop files by last use: first those older
+    than `max_age`, then the least recently used beyond `max_bytes`.
+    """
+
+    def __init__(self, directory: str = PDF_CACHE_DIR, workers: int = PDF_RENDER_WORKERS,
+                 max_bytes: int = PDF_CACHE_MAX_BYTES, max_age: float = PDF_MAX_AGE_SECONDS):
+        self.directory = directory
+        self.workers = workers
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._flight = SingleFlight()
+        self._rendered_since_purge = 0
+        self.stats = {"hits": 0, "renders": 0, "errors": 0, "bytes_rendered": 0, "purged": 0}
+
+    def path_for(self, identifier: str) -> Optional[str]:
+        """Returns the file for an artifact id if it has been rendered, else None."""
+        if not _ARTIFACT_ID.match(identifier):
+            return None
+        path = os.path.join(self.directory, f"{identifier}.pdf")
+        try:
+            os.utime(path)  # marks it as recently used for `purge`
+        except OSError:
+            return None
+        return path
+
+    def purge(self) -> int:
+        """Deletes expired and least recently used files; returns how many were removed."""
+        now = time.time()
+        try:
+            names = os.listdir(self.directory)
+        except FileNotFoundError:
+            return 0
+        files = []
+        removed = 0
+        for name in names:
+            path = os.path.join(self.directory, name)
+            try:
+                info = os.stat(path)
+                if name.endswith(".tmp"):
+                    if now - info.st_mtime > STALE_TEMPORARY_SECONDS:
+                        os.remove(path)
+                    continue
+                if now - info.st_mtime > self.max_age:
+                    os.remove(path)
+                    removed += 1
+                    continue
+            except FileNotFoundError:
+                continue  # removed by another worker meanwhile
+            files.append((info.st_mtime, info.st_size, path))
+
+        total = sum(size for _, size, _ in files)
+        for _, size, path in sorted(files):
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+                removed += 1
+            except FileNotFoundError:
+                pass
+            total -= size
+        self._rendered_since_purge = 0
+        self.stats["purged"] += removed
+        return removed
+
+    async def export(self, question: str, result: Dict[str, str], sections: Dict[str, bool]) -> Tuple[str, str]:
+        """Returns (artifact id, file path), rendering the PDF first unless it is already on disk."""
+        identifier = artifact_id(result_hash(question, result), sections)
+        path = self.path_for(identifier)
+        if path is not None:
+            self.stats["hits"] += 1
+            return identifier, path
+        path = os.path.join(self.directory, f"{identifier}.pdf")
+        await self._flight.do(identifier, lambda: self._render(path, question, result, sections))
+        return identifier, path
+
+    async def _render(self, path: str, question: str, result: Dict[str, str], sections: Dict[str, bool]) -> None:
+        if self._pool is None:
+            os.makedirs(self.directory, exist_ok=True)
+            # spawn, not fork: forking a process that is running threads (the event loop's
+            # executor, the SDK's gRPC channels) can deadlock the child.
+            self._pool = ProcessPoolExecutor(self.workers, mp_context=multiprocessing.get_context("spawn"))
+        try:
+            size = await asyncio.get_running_loop().run_in_executor(
+                self._pool, _render_to_file, path, question, result, sections
+            )
+        except BrokenProcessPool:
+            # A worker died (e.g. killed for memory); start a fresh pool next time.
+            self.stats["errors"] += 1
+            self.shutdown()
+            raise
+        except Exception:
+            self.stats["errors"] += 1
+            raise
+        self.stats["renders"] += 1
+        self.stats["bytes_rendered"] += size
+        self._rendered_since_purge += size
+        if self._rendered_since_purge > self.max_bytes // 10:
+            # Keeps a burst of exports from outgrowing the cap before the periodic purge.
+            self._rendered_since_purge = 0
+            await asyncio.to_thread(self.purge)
+
+    def shutdown(self) -> None:
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+
+    def get_stats(self) -> Dict[str, int]:
+        return dict(self.stats, in_flight=self._flight.get_stats()["in_flight"])
+
+
+pdf_exporter = PdfExporter()
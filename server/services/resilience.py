@@ -0,0 +1,305 @@
+import os
+import time
+import random
+import asyncio
+import threading
+import contextvars
+from collections import deque
+from contextlib import contextmanager
+from typing import Callable, Dict, Optional
+from dotenv import load_dotenv
+from google.api_core import exceptions as google_exceptions
+
+from services.llm_backend import LLMBackend
+from services.metrics import Counter
+
+load_dotenv()
+
+# Whole-request budget for model calls (detection, generation and any salvage re-request).
+LLM_DEADLINE_SECONDS = float(os.getenv("LLM_DEADLINE_SECONDS", "120"))
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "3"))
+LLM_BACKOFF_BASE = float(os.getenv("LLM_BACKOFF_BASE", "0.5"))
+LLM_BACKOFF_MAX = float(os.getenv("LLM_BACKOFF_MAX", "8"))
+
+# Hedging: once a call outlives the learned p95 latency, fire a duplicate and keep the faster one.
+LLM_HEDGING = os.getenv("LLM_HEDGING", "0") == "1"
+# At most this fraction of calls may be hedged (a token bucket refilled by every call).
+LLM_HEDGE_MAX_RATIO = float(os.getenv("LLM_HEDGE_MAX_RATIO", "0.05"))
+HEDGE_BURST = 5
+HEDGE_PERCENTILE = 0.95
+# Latency samples kept per call shape, and how many are needed before hedging starts.
+LATENCY_WINDOW = 200
+MIN_LATENCY_SAMPLES = 20
+
+TRANSIENT_ERRORS = (
+    google_exceptions.TooManyRequests,       # includes ResourceExhausted (429)
+    google_exceptions.InternalServerError,
+    google_exceptions.ServiceUnavailable,
+    google_exceptions.DeadlineExceeded,
+    ConnectionError,
+    asyncio.TimeoutError,
+)
+
+retries_total = Counter("doc_llm_retries_total", "Model call retries after transient errors.")
+hedges_total = Counter("doc_llm_hedges_total", "Hedged (duplicate) model calls by which call won.", ["winner"])
+deadline_exceeded_total = Counter("doc_llm_deadline_exceeded_total", "Model calls abandoned at the request deadline.")
+
+
+class LLMUnavailableError(Exception):
+    """The model could not be reached after retries; the caller may try again later."""
+
+    def __init__(self, message: str, retry_after: float = 5.0):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class LLMDeadlineExceeded(LLMUnavailableError):
+    """The request's deadline passed before the model answered."""
+
+
+def is_transient(exc: BaseException) -> bool:
+    """True for errors worth retrying: throttling, 5xx, timeouts, and fakes marked `transient`."""
+    return isinstance(exc, TRANSIENT_ERRORS) or getattr(exc, "transient", False)
+
+
+_deadline: contextvars.ContextVar[Optional[float]] = contextvars.ContextVar("llm_deadline", default=None)
+
+
+@contextmanager
+def request_deadline(seconds: float = LLM_DEADLINE_SECONDS):
+    """
+    Bounds every model call made inside the block to finish within `seconds`.
+
+    Nested scopes never extend an outer deadline. Tasks created inside the
+    block (e.g. a coalesced generation) inherit it.
+    """
+    outer = _deadline.get()
+    deadline = time.monotonic() + seconds
+    token = _deadline.set(deadline if outer is None else min(outer, deadline))
+    try:
+        yield
+    finally:
+        _deadline.reset(token)
+
+
+def _current_deadline() -> float:
+    deadline = _deadline.get()
+    return deadline if deadline is not None else time.monotonic() + LLM_DEADLINE_SECONDS
+
+
+def backoff_delay(attempt: int, rng: random.Random = random) -> float:
+    """Exponential backoff with full jitter for the given (0-based) retry attempt."""
+    return rng.uniform(0, min(LLM_BACKOFF_MAX, LLM_BACKOFF_BASE * (2 ** attempt)))
+
+
+class _LatencyTracker:
+    """Recent successful call latencies, grouped by the requested output size."""
+
+    def __init__(self, window: int = LATENCY_WINDOW):
+        self.window = window
+        self._samples: Dict[int, deque] = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def shape(generation_config: Optional[Dict]) -> int:
+        # Detection (a few tokens) and full generations (thousands) have very
+        # different latencies; bucketing by output size keeps them apart.
+        return int((generation_config or {}).get("max_output_tokens", 0)).bit_length()
+
+    def record(self, shape: int, seconds: float) -> None:
+        with self._lock:
+            self._samples.setdefault(shape, deque(maxlen=self.window)).append(seconds)
+
+    def percentile(self, shape: int, fraction: float) -> Optional[float]:
+        with self._lock:
+            samples = self._samples.get(shape)
+            if not samples or len(samples) < MIN_LATENCY_SAMPLES:
+                return None
+            ordered = sorted(samples)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+class _DeadlineStream:
+    """
+    Wraps a streamed response so that waiting for each chunk is bounded by
+    the request deadline; the stream is closed when the deadline passes.
+    """
+
+    def __init__(self, stream, deadline: float, on_deadline: Callable[[], Exception]):
+        self._stream = stream
+        self._deadline = deadline
+        self._on_deadline = on_deadline
+
+    def __getattr__(self, name):
+        return getattr(self._stream, name)
+
+    async def __aiter__(self):
+        chunks = self._stream.__aiter__()
+        try:
+            while True:
+                remaining = self._deadline - time.monotonic()
+                if remaining <= 0:
+                    raise self._on_deadline()
+                try:
+                    chunk = await asyncio.wait_for(chunks.__anext__(), timeout=remaining)
+                except StopAsyncIteration:
+                    return
+                except asyncio.TimeoutError as e:
+                    raise self._on_deadline() from e
+                yield chunk
+        finally:
+            close = getattr(chunks, "aclose", None)
+            if close is not None:
+                await close()
+
+
+class ResilientBackend(LLMBackend):
+    """
+    Wraps a backend with deadlines, retries and optional hedging.
+
+    - Every call is bounded by the current request deadline (see
+      `request_deadline`), or LLM_DEADLINE_SECONDS when none is set.
+    - Transient errors are retried up to `max_retries` times with
+      exponential backoff and full jitter, as long as the backoff still
+      fits before the deadline.
+    - Streamed responses are bounded chunk by chunk, so a stream that
+      stalls after opening still ends at the deadline.
+    - With hedging on, a non-streaming async call that is still running
+      after the learned p95 latency for its call shape gets a duplicate;
+      whichever finishes first wins and the other is cancelled. Hedges are
+      limited to `hedge_max_ratio` of calls by a small token bucket.
+
+    Exhausted retries raise LLMUnavailableError, a passed deadline
+    LLMDeadlineExceeded; other errors pass through unchanged.
+    """
+
+    def __init__(self, backend: LLMBackend, max_retries: int = LLM_MAX_RETRIES, hedging: bool = LLM_HEDGING,
+                 hedge_max_ratio: float = LLM_HEDGE_MAX_RATIO, seed: Optional[int] = None):
+        self.backend = backend
+        self.model_name = backend.model_name
+        self.max_retries = max_retries
+        self.hedging = hedging
+        self.hedge_max_ratio = hedge_max_ratio
+        self._hedge_tokens = 0.0
+        self._latencies = _LatencyTracker()
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self.stats = {"calls": 0, "retries": 0, "hedges": 0, "hedge_wins": 0, "deadline_exceeded": 0}
+
+    def get_stats(self) -> Dict[str, int]:
+        with self._lock:
+            return dict(self.stats)
+
+    def _count(self, stat: str) -> None:
+        with self._lock:
+            self.stats[stat] += 1
+
+    def _take_hedge_token(self) -> bool:
+        with self._lock:
+            if self._hedge_tokens >= 1:
+                self._hedge_tokens -= 1
+                return True
+            return False
+
+    def _refill_hedge_tokens(self) -> None:
+        with self._lock:
+            self.stats["calls"] += 1
+            self._hedge_tokens = min(HEDGE_BURST, self._hedge_tokens + self.hedge_max_ratio)
+
+    def _deadline_error(self) -> LLMDeadlineExceeded:
+        self._count("deadline_exceeded")
+        deadline_exceeded_total.inc()
+        return LLMDeadlineExceeded("The model did not answer before the request deadline.")
+
+    def _retry_delay(self, attempt: int, error: BaseException, deadline: float) -> float:
+        """Returns the backoff before the next attempt, or raises if no attempt is left."""
+        if not is_transient(error) or attempt >= self.max_retries:
+            if is_transient(error):
+                raise LLMUnavailableError(f"Model unavailable after {attempt + 1} attempts: {error}") from error
+            raise error
+        delay = backoff_delay(attempt, self._random)
+        if time.monotonic() + delay >= deadline:
+            raise self._deadline_error() from error
+        self._count("retries")
+        retries_total.inc()
+        print(f"Warning: Transient model error ({error}); retrying in {delay:.2f}s")
+        return delay
+
+    def generate_content(self, prompt: str, generation_config: Optional[Dict] = None):
+        # Sync callers (build_corpus.py, services/test.py) get retries but no hedging.
+        deadline = _current_deadline()
+        self._refill_hedge_tokens()
+        for attempt in range(self.max_retries + 1):
+            if time.monotonic() >= deadline:
+                raise self._deadline_error()
+            try:
+                return self.backend.generate_content(prompt, generation_config=generation_config)
+            except Exception as e:
+                time.sleep(self._retry_delay(attempt, e, deadline))
+
+    async def generate_content_async(self, prompt: str, generation_config: Optional[Dict] = None,
+                                     stream: bool = False):
+        deadline = _current_deadline()
+        self._refill_hedge_tokens()
+        for attempt in range(self.max_retries + 1):
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise self._deadline_error()
+            try:
+                if stream:
+                    # Opening the stream is retried; once chunks flow, each read is bounded
+                    # by what is left of the deadline (a stalled stream cannot be retried).
+                    response = await asyncio.wait_for(
+                        self.backend.generate_content_async(prompt, generation_config=generation_config, stream=True),
+                        timeout=remaining,
+                    )
+                    return _DeadlineStream(response, deadline, self._deadline_error)
+                return await self._call_with_hedge(prompt, generation_config, remaining)
+            except asyncio.TimeoutError as e:
+                if time.monotonic() >= deadline:
+                    raise self._deadline_error() from e
+                await asyncio.sleep(self._retry_delay(attempt, e, deadline))
+            except Exception as e:
+                await asyncio.sleep(self._retry_delay(attempt, e, deadline))
+
+    async def _timed_call(self, prompt: str, generation_config: Optional[Dict], shape: int):
+        start = time.monotonic()
+        response = await self.backend.generate_content_async(prompt, generation_config=generation_config)
+        self._latencies.record(shape, time.monotonic() - start)
+        return response
+
+    async def _call_with_hedge(self, prompt: str, generation_config: Optional[Dict], timeout: float):
+        shape = self._latencies.shape(generation_config)
+        primary = asyncio.ensure_future(self._timed_call(prompt, generation_config, shape))
+        tasks = {primary}
+        hedged = False
+        try:
+            threshold = self._latencies.percentile(shape, HEDGE_PERCENTILE) if self.hedging else None
+            start = time.monotonic()
+            if threshold is not None and threshold < timeout:
+                done, _ = await asyncio.wait(tasks, timeout=threshold)
+                if not done and self._take_hedge_token():
+                    hedged = True
+                    self._count("hedges")
+                    tasks.add(asyncio.ensure_future(self._timed_call(prompt, generation_config, shape)))
+
+            while tasks:
+                done, _ = await asyncio.wait(tasks, timeout=timeout - (time.monotonic() - start),
+                                             return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    raise asyncio.TimeoutError()
+                for task in done:
+                    tasks.discard(task)
+                    if task.exception() is None:
+                        if hedged:
+                            winner = "primary" if task is primary else "hedge"
+                            hedges_total.inc(winner=winner)
+                            if winner == "hedge":
+                                self._count("hedge_wins")
+                        return task.result()
+                    if not tasks:
+                        raise task.exception()
+            raise asyncio.TimeoutError()
+        finally:
+            for task in tasks:
+                task.cancel()
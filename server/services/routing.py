@@ -0,0 +1,193 @@
+import os
+import time
+import asyncio
+import itertools
+import threading
+from typing import Callable, Dict, List, Optional
+from dotenv import load_dotenv
+from google.api_core import exceptions as google_exceptions
+
+from services.llm_backend import GEMINI_MODEL, LLMBackend, is_classification_call
+from services.metrics import Counter
+from services.resilience import is_transient
+
+load_dotenv()
+
+# "least_loaded" (default) or "round_robin".
+LLM_ROUTING = os.getenv("LLM_ROUTING", "least_loaded").lower()
+# Model for classification calls (language detection); a small, fast model is enough.
+GEMINI_CLASSIFY_MODEL = os.getenv("GEMINI_CLASSIFY_MODEL", GEMINI_MODEL)
+# Comma-separated models to fall back to, in order, while every key is cooling down for the preferred one.
+GEMINI_FALLBACK_MODELS = [name.strip() for name in os.getenv("GEMINI_FALLBACK_MODELS", "").split(",") if name.strip()]
+
+# Cooldown after a throttled (429) call, and after other transient errors (5xx, timeouts).
+# Both double with every consecutive failure of the same key/model, up to KEY_COOLDOWN_MAX_SECONDS.
+KEY_THROTTLE_COOLDOWN_SECONDS = float(os.getenv("LLM_KEY_THROTTLE_COOLDOWN_SECONDS", "30"))
+KEY_ERROR_COOLDOWN_SECONDS = float(os.getenv("LLM_KEY_ERROR_COOLDOWN_SECONDS", "5"))
+KEY_COOLDOWN_MAX_SECONDS = 300
+
+ROUTE_CLASSIFY = "classify"
+ROUTE_GENERATE = "generate"
+
+routed_calls_total = Counter("doc_llm_routed_calls_total", "Model calls by route, key, model and outcome.",
+                             ["route", "key", "model", "outcome"])
+cooldowns_total = Counter("doc_llm_key_cooldowns_total", "Key/model pairs put into cooldown, by reason.",
+                          ["key", "model", "reason"])
+
+
+def model_routes() -> Dict[str, List[str]]:
+    """Models per call type, in order of preference (the configured model, then GEMINI_MODEL, then fallbacks)."""
+    def chain(preferred: str) -> List[str]:
+        return list(dict.fromkeys([preferred, GEMINI_MODEL] + GEMINI_FALLBACK_MODELS))
+    return {ROUTE_CLASSIFY: chain(GEMINI_CLASSIFY_MODEL), ROUTE_GENERATE: chain(GEMINI_MODEL)}
+
+
+def is_throttled(exc: BaseException) -> bool:
+    """True for quota errors (429), which get the longer cooldown."""
+    return isinstance(exc, google_exceptions.TooManyRequests) or getattr(exc, "throttled", False)
+
+
+class _Endpoint:
+    """One model behind one API key, with its load and cooldown state."""
+
+    def __init__(self, key: str, model_name: str, backend: LLMBackend):
+        self.key = key
+        self.model_name = model_name
+        self.backend = backend
+        self.in_flight = 0
+        self.calls = 0
+        self.errors = 0
+        self.consecutive_failures = 0
+        self.cooldown_until = 0.0
+
+
+class RoutedBackend(LLMBackend):
+    """
+    Spreads model calls over a pool of API keys and models.
+
+    Each call is routed by type: detection-sized calls take the "classify"
+    model chain, everything else the "generate" chain (see `model_routes`).
+    Within the first model of the chain that has a key available, the call
+    goes to the key with the fewest calls in flight (ties taken in turn), or
+    simply to the next key with LLM_ROUTING=round_robin.
+
+    A key/model that fails with a transient error is put into cooldown and
+    skipped until it expires, so the retry from ResilientBackend lands on
+    another key, or on a fallback model once every key is cooling down. If
+    the whole chain is cooling down, the endpoint that recovers first is
+    used anyway and the retry backoff paces the calls.
+
+    `factory(key_index, model_name)` builds the backend for one endpoint.
+    """
+
+    def __init__(self, key_count: int, routes: Dict[str, List[str]],
+                 factory: Callable[[int, str], LLMBackend], strategy: str = LLM_ROUTING):
+        self.routes = routes
+        self.strategy = strategy
+        self.model_name = routes[ROUTE_GENERATE][0]
+        self._endpoints: Dict[str, List[_Endpoint]] = {}
+        for model_name in dict.fromkeys(name for chain in routes.values() for name in chain):
+            self._endpoints[model_name] = [
+                _Endpoint(f"key{index}", model_name, factory(index, model_name)) for index in range(key_count)
+            ]
+        self._turn = itertools.count()
+        self._lock = threading.Lock()
+        self.stats = {"fallbacks": 0, "cooldowns": 0, "all_cooling_down": 0}
+
+    @staticmethod
+    def _route(generation_config: Optional[Dict]) -> str:
+        return ROUTE_CLASSIFY if is_classification_call(generation_config) else ROUTE_GENERATE
+
+    def _pick(self, candidates: List[_Endpoint]) -> _Endpoint:
+        start = next(self._turn) % len(candidates)
+        ordered = candidates[start:] + candidates[:start]
+        if self.strategy == "round_robin":
+            return ordered[0]
+        return min(ordered, key=lambda endpoint: endpoint.in_flight)
+
+    def _acquire(self, route: str) -> _Endpoint:
+        now = time.monotonic()
+        with self._lock:
+            chain = self.routes[route]
+            endpoint = None
+            for position, model_name in enumerate(chain):
+                ready = [candidate for candidate in self._endpoints[model_name] if candidate.cooldown_until <= now]
+                if ready:
+                    endpoint = self._pick(ready)
+                    if position > 0:
+                        self.stats["fallbacks"] += 1
+                    break
+            if endpoint is None:
+                self.stats["all_cooling_down"] += 1
+                endpoint = min((candidate for model_name in chain for candidate in self._endpoints[model_name]),
+                               key=lambda candidate: candidate.cooldown_until)
+            endpoint.in_flight += 1
+            endpoint.calls += 1
+            return endpoint
+
+    def _release(self, endpoint: _Endpoint, route: str, error: Optional[BaseException] = None) -> None:
+        with self._lock:
+            endpoint.in_flight -= 1
+            if error is None:
+                endpoint.consecutive_failures = 0
+                outcome = "ok"
+            elif isinstance(error, asyncio.CancelledError):
+                # A lost hedge or a disconnected client, not a fault of the key.
+                outcome = "cancelled"
+            else:
+                endpoint.errors += 1
+                outcome = "error"
+                if is_transient(error):
+                    reason = "throttled" if is_throttled(error) else "error"
+                    base = KEY_THROTTLE_COOLDOWN_SECONDS if reason == "throttled" else KEY_ERROR_COOLDOWN_SECONDS
+                    endpoint.consecutive_failures += 1
+                    cooldown = min(KEY_COOLDOWN_MAX_SECONDS, base * 2 ** (endpoint.consecutive_failures - 1))
+                    endpoint.cooldown_until = time.monotonic() + cooldown
+                    self.stats["cooldowns"] += 1
+                    cooldowns_total.inc(key=endpoint.key, model=endpoint.model_name, reason=reason)
+                    print(f"Warning: {endpoint.key}/{endpoint.model_name} {reason}; cooling down for {cooldown:.0f}s")
+        routed_calls_total.inc(route=route, key=endpoint.key, model=endpoint.model_name, outcome=outcome)
+
+    def generate_content(self, prompt: str, generation_config: Optional[Dict] = None):
+        route = self._route(generation_config)
+        endpoint = self._acquire(route)
+        try:
+            response = endpoint.backend.generate_content(prompt, generation_config=generation_config)
+        except Exception as e:
+            self._release(endpoint, route, e)
+            raise
+        self._release(endpoint, route)
+        return response
+
+    async def generate_content_async(self, prompt: str, generation_config: Optional[Dict] = None,
+                                     stream: bool = False):
+        # For streams only opening the stream counts as the call; chunks are consumed by the caller.
+        route = self._route(generation_config)
+        endpoint = self._acquire(route)
+        try:
+            response = await endpoint.backend.generate_content_async(
+                prompt, generation_config=generation_config, stream=stream
+            )
+        except BaseException as e:
+            self._release(endpoint, route, e)
+            raise
+        self._release(endpoint, route)
+        return response
+
+    def get_stats(self) -> Dict:
+        now = time.monotonic()
+        with self._lock:
+            endpoints = [endpoint for group in self._endpoints.values() for endpoint in group]
+            return dict(
+                self.stats,
+                keys=len(next(iter(self._endpoints.values()))),
+                cooling_down=sum(1 for endpoint in endpoints if endpoint.cooldown_until > now),
+                endpoints={
+                    f"{endpoint.key}_{endpoint.model_name}": {
+                        "calls": endpoint.calls,
+                        "errors": endpoint.errors,
+                        "in_flight": endpoint.in_flight,
+                    }
+                    for endpoint in endpoints
+                },
+            )
@@ -0,0 +1,105 @@
+import os
+import time
+import sqlite3
+import threading
+from typing import Dict, Optional
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# SQLite file holding state shared by all worker processes (rate-limit buckets).
+# Empty keeps that state in-process; serve.py sets it when running several workers.
+SHARED_STORE_PATH = os.getenv("SHARED_STORE_PATH", "")
+
+# How long a writer waits for another process's write lock before giving up.
+BUSY_TIMEOUT_MS = 5000
+
+
+def connect(path: str) -> sqlite3.Connection:
+    """
+    Opens a SQLite database for concurrent use by several processes.
+
+    WAL lets readers proceed while one process writes, synchronous=NORMAL
+    skips the fsync per commit (a crash can lose the last commits, never
+    corrupt the file), and busy_timeout makes writers queue for the lock
+    instead of failing with "database is locked".
+    """
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    conn = sqlite3.connect(path, check_same_thread=False, timeout=BUSY_TIMEOUT_MS / 1000)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.execute(f"PRAGMA busy_timeout={BUSY_TIMEOUT_MS}")
+    return conn
+
+
+class SharedTokenBuckets:
+    """
+    Token buckets stored in SQLite, so every worker process draws from one quota.
+
+    `limits` maps a bucket name to its size per minute; buckets refill
+    continuously and start full. `try_take` checks and debits all buckets
+    in a single write transaction, so two workers can never both spend the
+    last tokens. Wall-clock time is used since monotonic clocks are not
+    comparable across processes.
+    """
+
+    def __init__(self, path: str, limits: Dict[str, float]):
+        self.limits = dict(limits)
+        self._lock = threading.Lock()
+        self._conn = connect(path)
+        self._conn.isolation_level = None  # transactions are managed explicitly below
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS token_buckets ("
+            "name TEXT PRIMARY KEY, level REAL NOT NULL, updated REAL NOT NULL)"
+        )
+        now = time.time()
+        for name, per_minute in self.limits.items():
+            self._conn.execute("INSERT OR IGNORE INTO token_buckets (name, level, updated) VALUES (?, ?, ?)",
+                               (name, per_minute, now))
+
+    def _levels(self, now: float) -> Dict[str, float]:
+        names = list(self.limits)
+        rows = self._conn.execute(
+            f"SELECT name, level, updated FROM token_buckets WHERE name IN ({','.join('?' * len(names))})", names
+        ).fetchall()
+        levels = {}
+        for name, level, updated in rows:
+            capacity = self.limits[name]
+            levels[name] = min(capacity, level + max(0.0, now - updated) * capacity / 60.0)
+        return levels
+
+    def try_take(self, amounts: Dict[str, float]) -> float:
+        """Debits `amounts` and returns 0, or returns the seconds to wait if any bucket is short."""
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                now = time.time()
+                levels = self._levels(now)
+                wait = 0.0
+                for name, amount in amounts.items():
+                    capacity = self.limits[name]
+                    missing = min(amount, capacity) - levels[name]
+                    if missing > 0 and capacity > 0:
+                        wait = max(wait, missing * 60.0 / capacity)
+                if wait == 0:
+                    for name, amount in amounts.items():
+                        levels[name] -= min(amount, self.limits[name])
+                self._conn.executemany("UPDATE token_buckets SET level = ?, updated = ? WHERE name = ?",
+                                       [(level, now, name) for name, level in levels.items()])
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+        return wait
+
+    def levels(self) -> Dict[str, float]:
+        with self._lock:
+            return self._levels(time.time())
+
+
+def shared_token_buckets(limits: Dict[str, float], path: Optional[str] = None) -> Optional[SharedTokenBuckets]:
+    """SharedTokenBuckets on the configured shared store, or None when state is kept per process."""
+    path = SHARED_STORE_PATH if path is None else path
+    return SharedTokenBuckets(path, limits) if path else None
@@ -0,0 +1,467 @@
+import os
+import re
+import math
+import time
+import asyncio
+import threading
+from array import array
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+from dotenv import load_dotenv
+
+from services.corpus import canonical_question
+from services.language_classifier import classify_language
+from services.shared_store import connect
+
+load_dotenv()
+
+# Calibrated with benchmarks/similarity_threshold.py on tests/fixtures/question_pairs.json.
+# The content-word check below rejects the near misses n-grams cannot tell
+# apart, so the threshold only has to filter unrelated questions.
+SIMILARITY_THRESHOLD = float(os.getenv("SIMILARITY_THRESHOLD", "0.65"))
+# Questions stored by other worker processes are picked up at most this often.
+SYNC_INTERVAL = 5.0
+
+# Section name -> bit, so "stored result covers the requested sections" is one mask test.
+SECTION_BITS = {
+    "overview": 1, "shortAlgorithm": 2, "detailedAlgorithm": 4, "code": 8,
+    "requiredModules": 16, "variablesAndConstants": 32, "functions": 64, "explanation": 128,
+}
+
+# Acronyms and words students use interchangeably with the spelled-out name.
+_EXPANSIONS = {
+    "fcfs": "first come first serve",
+    "sjf": "shortest job first",
+    "srtf": "shortest remaining time first",
+    "rr": "round robin",
+    "ipc": "inter process communication",
+    "shm": "shared memory",
+    "lru": "least recently used",
+    "interprocess": "inter process",
+    "folder": "directory",
+}
+_EXPANSION_PATTERN = re.compile(r'\b(' + '|'.join(_EXPANSIONS) + r')\b')
+
+NGRAM_SIZES = (3, 4)
+
+# Names that decide *which* algorithm is meant. Paraphrases share these;
+# "worst fit" vs "first fit" share almost every n-gram but not the tag.
+_ALGORITHM_TAGS = re.compile(
+    r'\b(first come first serve|shortest job first|shortest remaining time first|round robin|priority|'
+    r'non preemptive|preemptive|first fit|best fit|worst fit|next fit|bankers?|deadlock detection|'
+    r'fifo|least recently used|optimal|producer|dining philosophers?|readers? writers?|shared memory|'
+    r'pipes?|message queues?|sstf|c scan|scan|c look|look|paging|segmentation)\b'
+)
+
+# "convert decimal to binary" and "convert binary to decimal" have the same words.
+_CONVERSION = re.compile(r'\bconver\w*\s+(?:an?\s+|the\s+)?(\w+)(?:\s+numbers?)?\s+(?:in)?to\s+(\w+)')
+
+# Words any lab question may contain; the rest are content words.
+_STOPWORDS = frozenset(
+    "a an the to of in on at for and or not with using use by from into as is are be it its this that these "
+    "which whether if do does given all any each write create develop program programs programming code "
+    "script shell bash c implement implementation simulate simulation algorithm technique problem find "
+    "display print show make perform check".split()
+)
+
+# How many top-scoring candidates are checked for matching algorithm tags and content words.
+CANDIDATES = 5
+
+
+def sections_mask(options: Dict[str, bool]) -> int:
+    """Returns the bitmask of selected sections."""
+    return sum(bit for section, bit in SECTION_BITS.items() if options.get(section))
+
+
+def _prepare(question: str) -> str:
+    text = _EXPANSION_PATTERN.sub(lambda m: _EXPANSIONS[m.group(1)], canonical_question(question))
+    return re.sub(r'\s+', ' ', re.sub(r'[^a-z0-9 ]+', ' ', text.replace("'", ""))).strip()
+
+
+def _algorithm_tags(question: str) -> frozenset:
+    text = _prepare(question)
+    # Singular forms, so "reader writer" and "readers writers" carry the same tag.
+    tags = {re.sub(r's\b', '', tag) for tag in _ALGORITHM_TAGS.findall(text)}
+    return frozenset(tags | {f"{source} to {target}" for source, target in _CONVERSION.findall(text)})
+
+
+def _content_words(question: str) -> frozenset:
+    # A crude stem: no plural "s", then the first five letters ("avoidance", "avoiding").
+    return frozenset(re.sub(r'(?<=[^s])s$', '', word)[:5]
+                     for word in _prepare(question).split() if word not in _STOPWORDS)
+
+
+# An explicit "shell script" / "in C" settles the language even against the
+# classifier's algorithm hints ("shell script to implement FCFS"). "C-SCAN" and
+# "C-LOOK" are disk scheduling, not the language.
+_STATED_SHELL = re.compile(r'\b(shell|bash)\b')
+_STATED_C = re.compile(r'\bc\b(?! (scan|look)\b)')
+
+
+def _language(question: str) -> str:
+    text = _prepare(question)
+    shell, c = bool(_STATED_SHELL.search(text)), bool(_STATED_C.search(text))
+    if shell != c:
+        return "Shell" if shell else "C"
+    return classify_language(question)[0]
+
+
+def _words_agree(query: frozenset, stored: frozenset) -> bool:
+    """
+    False when each question has a content word the other lacks, as in
+    "is even" vs "is prime": that is a different task with the same
+    phrasing. One extra word on one side ("CPU scheduling") is allowed;
+    more ("lines, words and characters" vs "lines") asks for more.
+    """
+    return len(query ^ stored) <= 1
+
+
+def _ngrams(question: str) -> Dict[str, int]:
+    text = " " + _prepare(question) + " "
+    counts: Dict[str, int] = {}
+    for size in NGRAM_SIZES:
+        for i in range(len(text) - size + 1):
+            gram = text[i:i + size]
+            counts[gram] = counts.get(gram, 0) + 1
+    return counts
+
+
+class SimilarityIndex:
+    """
+    Finds previously answered questions that are paraphrases of a new one.
+
+    Questions are embedded as TF-IDF weighted character 3/4-gram vectors
+    (after canonicalization and acronym expansion) and stored as an
+    inverted index in flat NumPy arrays: `_postings_rows`/`_postings_weights`
+    hold every (question, weight) pair grouped by n-gram, with
+    `_feature_offsets` marking where each n-gram's postings start. A lookup
+    gathers the postings of the query's n-grams and sums them per question
+    with one `np.bincount`, which is the cosine similarity because all
+    vectors are L2-normalized.
+
+    New questions are kept in a small pending inverted index (n-gram ->
+    rows and weights) scored with the same gather-and-bincount, and folded
+    into the arrays once they grow past `rebuild_ratio` of the index. The
+    rebuild runs in a worker thread (`asyncio.to_thread` when triggered on
+    the event loop, a daemon thread otherwise) on a snapshot of the
+    questions, and the new arrays are swapped in when done; lookups keep
+    using the old arrays meanwhile, and add() never waits for it.
+    Questions other workers persist to the same file are picked up every
+    SYNC_INTERVAL seconds. A match must also be classified in the same
+    language (C or Shell) as the query.
+    """
+
+    def __init__(self, path: Optional[str] = None, rebuild_ratio: float = 0.1, min_pending: int = 256):
+        self.path = path
+        self.rebuild_ratio = rebuild_ratio
+        self.min_pending = min_pending
+        self._lock = threading.Lock()
+        self._rebuild_lock = threading.Lock()
+        self._rebuild_task = None  # asyncio task or thread of a running rebuild
+        self._loaded = path is None
+        self._conn = None
+        self._last_rowid = 0
+        self._synced_at = 0.0
+
+        self.keys: List[str] = []
+        self._known_keys = set()
+        self.questions: List[str] = []
+        self._masks: List[int] = []
+        # "C" or "Shell" per row; the stopwords drop the language words, so this keeps them apart.
+        self._languages: List[str] = []
+        self._indexed = 0  # number of questions folded into the arrays
+
+        self._vocabulary: Dict[str, int] = {}
+        self._idf = np.zeros(0, dtype=np.float32)
+        self._feature_offsets = np.zeros(1, dtype=np.int64)
+        self._postings_rows = np.zeros(0, dtype=np.int32)
+        self._postings_weights = np.zeros(0, dtype=np.float32)
+        self._mask_array = np.zeros(0, dtype=np.uint8)
+        # Rows past `_indexed`: n-gram -> (rows, normalized weights), and their section masks.
+        self._pending: Dict[str, Tuple[array, array]] = {}
+        self._pending_masks = array("B")
+
+        self.stats = {"hits": 0, "misses": 0, "rebuilds": 0}
+
+    def load(self) -> None:
+        """Loads persisted questions (if any) and builds the index."""
+        with self._lock:
+            if self._loaded:
+                return
+            self._conn = connect(self.path)
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS similar_questions ("
+                "key TEXT PRIMARY KEY, question TEXT NOT NULL, sections INTEGER NOT NULL)"
+            )
+            self._conn.commit()
+            self._read_new_rows()
+            self._swap(_build_arrays(self.questions, self._masks))
+            self._loaded = True
+
+    def _read_new_rows(self) -> None:
+        # Caller holds self._lock. New rows stay unindexed until the caller indexes them.
+        rows = self._conn.execute(
+            "SELECT rowid, key, question, sections FROM similar_questions WHERE rowid > ? ORDER BY rowid",
+            (self._last_rowid,),
+        )
+        for rowid, key, question, mask in rows:
+            self._last_rowid = rowid
+            if key in self._known_keys:
+                continue
+            self._known_keys.add(key)
+            self.keys.append(key)
+            self.questions.append(question)
+            self._masks.append(mask)
+            self._languages.append(_language(question))
+        self._synced_at = time.monotonic()
+
+    def _rebuild_due(self) -> bool:
+        # Caller holds self._lock.
+        pending = len(self.keys) - self._indexed
+        return self._rebuild_task is None and pending >= max(self.min_pending, self.rebuild_ratio * self._indexed)
+
+    def _schedule_rebuild(self) -> None:
+        """Starts a rebuild in a worker thread: asyncio.to_thread on the event loop, else a daemon thread."""
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            loop = None
+        with self._lock:
+            if self._rebuild_task is not None:
+                return
+            if loop is not None:
+                self._rebuild_task = loop.create_task(asyncio.to_thread(self.rebuild))
+                self._rebuild_task.add_done_callback(self._rebuild_finished)
+            else:
+                self._rebuild_task = threading.Thread(target=self._rebuild_in_thread, daemon=True)
+                self._rebuild_task.start()
+
+    def _rebuild_finished(self, task: asyncio.Future) -> None:
+        with self._lock:
+            self._rebuild_task = None
+        if not task.cancelled() and task.exception() is not None:
+            print(f"Warning: Similarity index rebuild failed: {task.exception()}")
+
+    def _rebuild_in_thread(self) -> None:
+        try:
+            self.rebuild()
+        except Exception as e:
+            print(f"Warning: Similarity index rebuild failed: {e}")
+        finally:
+            with self._lock:
+                self._rebuild_task = None
+
+    def rebuild(self) -> None:
+        """Folds all pending questions into the arrays. The build itself does not hold the lock."""
+        with self._rebuild_lock:
+            with self._lock:
+                questions, masks = list(self.questions), list(self._masks)
+            arrays = _build_arrays(questions, masks)
+            with self._lock:
+                if arrays["count"] > self._indexed:
+                    self._swap(arrays)
+
+    def _swap(self, arrays: Dict) -> None:
+        # Caller holds self._lock.
+        self._vocabulary = arrays["vocabulary"]
+        self._idf = arrays["idf"]
+        self._feature_offsets = arrays["feature_offsets"]
+        self._postings_rows = arrays["postings_rows"]
+        self._postings_weights = arrays["postings_weights"]
+        self._mask_array = arrays["mask_array"]
+        self._indexed = arrays["count"]
+        # Questions added while the arrays were built stay pending, weighted with the new IDF.
+        self._pending, self._pending_masks = {}, array("B")
+        for row in range(self._indexed, len(self.keys)):
+            self._index_pending(row)
+        self.stats["rebuilds"] += 1
+
+    def _index_pending(self, row: int) -> None:
+        # Caller holds self._lock.
+        for gram, weight in self._vectorize(_ngrams(self.questions[row])).items():
+            rows, weights = self._pending.setdefault(gram, (array("i"), array("f")))
+            rows.append(row)
+            weights.append(weight)
+        self._pending_masks.append(self._masks[row])
+
+    def add(self, question: str, key: str, options: Dict[str, bool]) -> None:
+        """Records that the result stored under `key` answers `question` for the selected sections."""
+        self.load()
+        mask = sections_mask(options)
+        with self._lock:
+            if key in self._known_keys:
+                return
+            self._known_keys.add(key)
+            self.keys.append(key)
+            self.questions.append(question)
+            self._masks.append(mask)
+            self._languages.append(_language(question))
+            self._index_pending(len(self.keys) - 1)
+            if self._conn is not None:
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO similar_questions (key, question, sections) VALUES (?, ?, ?)",
+                    (key, question, mask),
+                )
+                self._conn.commit()
+            rebuild = self._rebuild_due()
+        if rebuild:
+            self._schedule_rebuild()
+
+    def lookup(self, question: str, options: Dict[str, bool],
+               threshold: float = SIMILARITY_THRESHOLD) -> Optional[Tuple[str, float]]:
+        """
+        Returns (key, similarity) of the most similar stored question whose
+        result covers every selected section and is in the same language, if
+        it reaches `threshold`.
+        """
+        self.load()
+        requested = sections_mask(options)
+        language = _language(question)
+        tags = _algorithm_tags(question)
+        words = _content_words(question)
+        with self._lock:
+            if self._conn is not None and time.monotonic() - self._synced_at >= SYNC_INTERVAL:
+                first_new = len(self.keys)
+                self._read_new_rows()
+                for row in range(first_new, len(self.keys)):
+                    self._index_pending(row)
+            rebuild = self._rebuild_due()
+            grams = _ngrams(question)
+            candidates = []
+
+            if self._indexed:
+                scores = self._score_indexed(grams)
+                eligible = (self._mask_array & requested) == requested
+                candidates.extend(_top_candidates(scores, eligible, 0))
+            if len(self.keys) > self._indexed:
+                scores = self._score_pending(self._vectorize(grams))
+                pending_masks = np.array(self._pending_masks, dtype=np.uint8)
+                eligible = (pending_masks & requested) == requested
+                candidates.extend(_top_candidates(scores, eligible, self._indexed))
+
+            match = None
+            for score, row in sorted(candidates, reverse=True):
+                if score < threshold:
+                    break
+                if self._languages[row] != language:
+                    continue
+                stored_tags = _algorithm_tags(self.questions[row])
+                if not (tags == stored_tags or not tags or not stored_tags):
+                    continue
+                if _words_agree(words, _content_words(self.questions[row])):
+                    match = (self.keys[row], score)
+                    break
+
+        if rebuild:
+            self._schedule_rebuild()
+        if match is not None:
+            self.stats["hits"] += 1
+            return match
+        self.stats["misses"] += 1
+        return None
+
+    def memory_bytes(self) -> int:
+        """Approximate memory held by the index arrays and vocabulary."""
+        arrays = (self._idf, self._feature_offsets, self._postings_rows, self._postings_weights, self._mask_array)
+        vocabulary = sum(len(gram) + 80 for gram in self._vocabulary)  # key + dict slot + int, roughly
+        return sum(array.nbytes for array in arrays) + vocabulary
+
+    def _idf_for(self, gram: str) -> float:
+        feature = self._vocabulary.get(gram)
+        if feature is None:
+            # Unseen n-gram: as rare as it gets.
+            return math.log(1 + max(self._indexed, 1)) + 1.0
+        return float(self._idf[feature])
+
+    def _vectorize(self, grams: Dict[str, int]) -> Dict[str, float]:
+        weights = {gram: count * self._idf_for(gram) for gram, count in grams.items()}
+        norm = math.sqrt(sum(weight * weight for weight in weights.values())) or 1.0
+        return {gram: weight / norm for gram, weight in weights.items()}
+
+    def _score_indexed(self, grams: Dict[str, int]) -> np.ndarray:
+        features, feature_weights, norm_squared = [], [], 0.0
+        for gram, count in grams.items():
+            weight = count * self._idf_for(gram)
+            norm_squared += weight * weight
+            feature = self._vocabulary.get(gram)
+            if feature is not None:
+                features.append(feature)
+                feature_weights.append(weight)
+        if not features:
+            return np.zeros(self._indexed, dtype=np.float32)
+
+        features = np.asarray(features, dtype=np.int64)
+        feature_weights = np.asarray(feature_weights, dtype=np.float32) / (math.sqrt(norm_squared) or 1.0)
+        starts = self._feature_offsets[features]
+        lengths = self._feature_offsets[features + 1] - starts
+        # Gather the postings of all query n-grams in one shot: position k of
+        # n-gram i is starts[i] + k.
+        within = np.arange(lengths.sum()) - np.repeat(np.cumsum(lengths) - lengths, lengths)
+        positions = np.repeat(starts, lengths) + within
+        weights = self._postings_weights[positions] * np.repeat(feature_weights, lengths)
+        return np.bincount(self._postings_rows[positions], weights=weights, minlength=self._indexed).astype(np.float32)
+
+    def _score_pending(self, query: Dict[str, float]) -> np.ndarray:
+        # Caller holds self._lock.
+        pending = len(self.keys) - self._indexed
+        rows, weights = [], []
+        for gram, weight in query.items():
+            postings = self._pending.get(gram)
+            if postings is not None:
+                # Copies, so no buffer export outlives the lock (arrays cannot grow while exported).
+                rows.append(np.frombuffer(postings[0], dtype=np.int32).copy())
+                weights.append(np.frombuffer(postings[1], dtype=np.float32) * weight)
+        if not rows:
+            return np.zeros(pending, dtype=np.float32)
+        return np.bincount(np.concatenate(rows) - self._indexed, weights=np.concatenate(weights),
+                           minlength=pending).astype(np.float32)
+
+
+def _top_candidates(scores: np.ndarray, eligible: np.ndarray, offset: int) -> List[Tuple[float, int]]:
+    """The CANDIDATES best (score, row) pairs among eligible rows; `offset` is the row of scores[0]."""
+    scores[~eligible] = 0.0
+    top = min(CANDIDATES, len(scores))
+    rows = np.argpartition(-scores, top - 1)[:top]
+    return [(float(scores[row]), int(row) + offset) for row in rows]
+
+
+def _build_arrays(questions: List[str], masks: List[int]) -> Dict:
+    """Builds the inverted index arrays for `questions`; touches no shared state."""
+    count = len(questions)
+    vocabulary: Dict[str, int] = {}
+    # Typed arrays keep peak memory at a few bytes per posting.
+    doc_rows, doc_features, doc_counts = array("i"), array("q"), array("f")
+    for row, question in enumerate(questions):
+        for gram, gram_count in _ngrams(question).items():
+            feature = vocabulary.setdefault(gram, len(vocabulary))
+            doc_rows.append(row)
+            doc_features.append(feature)
+            doc_counts.append(gram_count)
+
+    rows = np.frombuffer(doc_rows, dtype=np.int32)
+    features = np.frombuffer(doc_features, dtype=np.int64)
+    counts = np.frombuffer(doc_counts, dtype=np.float32)
+
+    document_frequency = np.bincount(features, minlength=len(vocabulary))
+    idf = (np.log((1 + count) / (1 + document_frequency)) + 1.0).astype(np.float32)
+    weights = counts * idf[features]
+    norms = np.sqrt(np.bincount(rows, weights=weights * weights, minlength=count)).astype(np.float32)
+    norms[norms == 0] = 1.0
+    weights /= norms[rows]
+
+    order = np.argsort(features, kind="stable")
+    return {
+        "vocabulary": vocabulary,
+        "idf": idf,
+        "feature_offsets": np.concatenate(([0], np.cumsum(document_frequency))).astype(np.int64),
+        "postings_rows": rows[order],
+        "postings_weights": weights[order].astype(np.float32),
+        "mask_array": np.asarray(masks, dtype=np.uint8),
+        "count": count,
+    }
+
+
+similarity_index = SimilarityIndex(
+    path=os.getenv("DOC_CACHE_PATH", os.path.join(os.path.dirname(os.path.dirname(__file__)), "cache", "documentation.sqlite3")) or None,
+)
@@ -0,0 +1,54 @@
+import asyncio
+from typing import Awaitable, Callable, Dict
+
+
+class _Call:
+    __slots__ = ("task", "waiters")
+
+    def __init__(self, task: asyncio.Future):
+        self.task = task
+        self.waiters = 0
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent calls that share a key into one in-flight task.
+
+    The first caller for a key starts the work; callers arriving while it is
+    still running await the same task and receive the same result (or
+    exception). A caller being cancelled (e.g. its client disconnected) does
+    not cancel the shared task unless it was the last one waiting.
+    """
+
+    def __init__(self):
+        self._calls: Dict[str, _Call] = {}
+        self.stats = {"leaders": 0, "coalesced": 0}
+
+    async def do(self, key: str, coro_factory: Callable[[], Awaitable]):
+        """Runs `coro_factory()` for `key`, or joins the run already in flight."""
+        call = self._calls.get(key)
+        if call is None:
+            call = _Call(asyncio.ensure_future(coro_factory()))
+            self._calls[key] = call
+            call.task.add_done_callback(lambda _: self._forget(key, call))
+            self.stats["leaders"] += 1
+        else:
+            self.stats["coalesced"] += 1
+
+        call.waiters += 1
+        try:
+            return await asyncio.shield(call.task)
+        finally:
+            call.waiters -= 1
+            if call.waiters == 0 and not call.task.done():
+                # Nobody is left to receive the result.
+                self._forget(key, call)
+                call.task.cancel()
+
+    def _forget(self, key: str, call: _Call) -> None:
+        if self._calls.get(key) is call:
+            del self._calls[key]
+
+    def get_stats(self) -> Dict[str, int]:
+        """Returns the leader/coalesced counters and the number of calls in flight."""
+        return dict(self.stats, in_flight=len(self._calls))
@@ -0,0 +1,162 @@
+import os
+import re
+import math
+from typing import Dict, List, Optional, Tuple
+from dotenv import load_dotenv
+
+from services.c_analyzer import CAnalyzer
+
+load_dotenv()
+
+# Gemini averages roughly four characters per token on English and code.
+CHARS_PER_TOKEN = 4
+
+# Total prompt size (instructions + user code) we are willing to send.
+PROMPT_TOKEN_BUDGET = int(os.getenv("PROMPT_TOKEN_BUDGET", "6000"))
+
+# Typical output size of each section; the generated `code` section dominates.
+SECTION_OUTPUT_TOKENS = {
+    "overview": 400,
+    "shortAlgorithm": 300,
+    "detailedAlgorithm": 800,
+    "code": 2500,
+    "requiredModules": 300,
+    "variablesAndConstants": 600,
+    "functions": 700,
+    "explanation": 1200,
+}
+OUTPUT_TOKEN_OVERHEAD = 200  # JSON keys, escaping and the empty unrequested sections
+MIN_OUTPUT_TOKENS = 1024
+MAX_OUTPUT_TOKENS = 8192
+
+# Function bodies shorter than this are never elided.
+MIN_ELIDED_BODY_LINES = 8
+
+
+class PromptTooLarge(ValueError):
+    """The user's code does not fit PROMPT_TOKEN_BUDGET even after compaction."""
+
+
+def estimate_tokens(text: Optional[str]) -> int:
+    """Cheap local estimate of the token count of `text` (no API call)."""
+    if not text:
+        return 0
+    return math.ceil(len(text) / CHARS_PER_TOKEN)
+
+
+def output_token_limit(options: Dict[str, bool], code: Optional[str] = None) -> int:
+    """
+    Sizes `max_output_tokens` to the requested sections.
+
+    When the user supplied code and the `code` section is requested, the
+    model echoes that code back, so its size replaces the generic estimate.
+    """
+    total = OUTPUT_TOKEN_OVERHEAD
+    for section, selected in options.items():
+        if not selected:
+            continue
+        if section == "code" and code:
+            total += estimate_tokens(code) + 200
+        else:
+            total += SECTION_OUTPUT_TOKENS.get(section, 500)
+    return max(MIN_OUTPUT_TOKENS, min(MAX_OUTPUT_TOKENS, total))
+
+
+def _tidy_lines(lines: List[str]) -> str:
+    """Drops blank lines and trailing whitespace, and turns 4-space indents into tabs."""
+    tidy = []
+    for line in lines:
+        line = line.rstrip()
+        if not line:
+            continue
+        stripped = line.lstrip(" ")
+        indent = len(line) - len(stripped)
+        tidy.append("\t" * (indent // 4) + " " * (indent % 4) + stripped)
+    return "\n".join(tidy)
+
+
+def _strip_c_comments(code: str) -> str:
+    """Removes comments; string and char literals are matched too, so `//` inside them survives."""
+    pieces, position = [], 0
+    for match in re.finditer(r'//[^\n]*|/\*[\s\S]*?(?:\*/|\Z)|"(?:[^"\\\n]|\\.)*"?|\'(?:[^\'\\\n]|\\.)*\'?', code):
+        if match.group().startswith("/"):
+            pieces.append(code[position:match.start()])
+            position = match.end()
+    pieces.append(code[position:])
+    return "".join(pieces)
+
+
+def _elide_c_bodies(code: str, target_tokens: int) -> Tuple[str, int]:
+    """
+    Replaces the longest function bodies with a one-line summary until the
+    code fits `target_tokens`. Duplicate definitions (same name and body,
+    e.g. code pasted twice) are always collapsed. Returns (code, elided count).
+    """
+    analysis = CAnalyzer(code).analyze()
+    functions = analysis["functions"]
+    replacements: Dict[int, Tuple[int, str]] = {}  # body start -> (body end, replacement)
+
+    excess = estimate_tokens(code) - target_tokens
+    seen = {}
+    for function in functions:
+        key = (function["name"], function["body"])
+        if key in seen:
+            start = code.find(function["body"], seen[key])
+            if start >= 0:
+                summary = f"/* duplicate of {function['name']}() above */"
+                replacements[start] = (start + len(function["body"]), summary)
+                excess -= estimate_tokens(function["body"]) - estimate_tokens(summary)
+        else:
+            seen[key] = code.find(function["body"]) + 1
+
+    for function in sorted(functions, key=lambda f: len(f["body"]), reverse=True):
+        if excess <= 0:
+            break
+        body = function["body"]
+        lines = body.count("\n")
+        start = code.find(body)
+        if lines < MIN_ELIDED_BODY_LINES or start < 0 or start in replacements:
+            continue
+        calls = sorted({name for name in re.findall(r'\b([A-Za-z_]\w*)\s*\(', body[len(function["signature"]):])
+                        if name not in ("if", "for", "while", "switch", "return", "sizeof")})
+        locals_ = [v["name"] for v in analysis["variables"] if v["scope"] == function["name"]]
+        summary = (f"{function['signature']} {{ /* body elided ({lines} lines); "
+                   f"calls: {', '.join(calls) or 'none'}; locals: {', '.join(dict.fromkeys(locals_)) or 'none'} */ }}")
+        replacements[start] = (start + len(body), summary)
+        excess -= estimate_tokens(body) - estimate_tokens(summary)
+
+    pieces, position = [], 0
+    for start in sorted(replacements):
+        end, replacement = replacements[start]
+        if start < position:
+            continue
+        pieces.append(code[position:start])
+        pieces.append(replacement)
+        position = end
+    pieces.append(code[position:])
+    return "".join(pieces), len(replacements)
+
+
+def compact_code(code: str, language: str, target_tokens: int) -> Tuple[str, List[str]]:
+    """
+    Shrinks user code towards `target_tokens`, cheapest transformation first.
+
+    Returns the compacted code and the list of steps that were applied.
+    """
+    steps = []
+    is_shell = language == "Shell" or code.strip().startswith("#!/")
+    if is_shell:
+        lines = code.splitlines()
+        kept = [line for index, line in enumerate(lines)
+                if not line.strip().startswith("#") or (index == 0 and line.startswith("#!"))]
+        compacted = _tidy_lines(kept)
+        steps.append("strip-comments-whitespace")
+        return compacted, steps
+
+    compacted = _tidy_lines(_strip_c_comments(code).splitlines())
+    steps.append("strip-comments-whitespace")
+    if estimate_tokens(compacted) > target_tokens:
+        compacted, elided = _elide_c_bodies(compacted, target_tokens)
+        if elided:
+            steps.append(f"elide-bodies:{elided}")
+    return compacted, steps
@@ -0,0 +1,384 @@
+import os
+import re
+import json
+import time
+import shlex
+import shutil
+import signal
+import functools
+import asyncio
+import hashlib
+import tempfile
+import subprocess
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Dict, List, Optional, Tuple
+from dotenv import load_dotenv
+
+from services.cache import DocumentationCache
+from services.metrics import Counter
+from services.singleflight import SingleFlight
+
+load_dotenv()
+
+# Verify generated code (requests may opt out with DocumentationRequest.verify=false).
+# Only takes effect with a sandbox configured, see sandbox_problem().
+CODE_VERIFICATION_REQUESTED = os.getenv("CODE_VERIFICATION", "0") == "1"
+VERIFY_WORKERS = int(os.getenv("VERIFY_WORKERS", str(os.cpu_count() or 1)))
+VERIFY_CC = os.getenv("VERIFY_CC", "gcc")
+VERIFY_COMPILE_TIMEOUT = float(os.getenv("VERIFY_COMPILE_TIMEOUT", "20"))
+VERIFY_RUN_TIMEOUT = float(os.getenv("VERIFY_RUN_TIMEOUT", "5"))
+VERIFY_MEMORY_MB = int(os.getenv("VERIFY_MEMORY_MB", "256"))
+# Isolation wrapper put in front of every compiler and program run, e.g.
+# "bwrap --unshare-all --die-with-parent --ro-bind / / --bind /tmp /tmp --dev /dev --proc /proc"
+# or "nsjail --quiet -Mo --chroot / --rw --". It must cut off the network.
+VERIFY_SANDBOX_COMMAND = shlex.split(os.getenv("VERIFY_SANDBOX_COMMAND", ""))
+# Alternatively (or as well), an unprivileged uid[:gid] the server (running as root)
+# switches to before exec, so rlimits like RLIMIT_NPROC actually apply. On its own it
+# is only accepted together with `unshare --net` (util-linux), which takes the
+# program off the network before dropping to that uid.
+VERIFY_UID = os.getenv("VERIFY_UID", "")
+
+_CACHE_ROOT = os.path.join(os.path.dirname(os.path.dirname(__file__)), "cache")
+VERIFY_BINARY_DIR = os.getenv("VERIFY_BINARY_DIR", os.path.join(_CACHE_ROOT, "verify"))
+VERIFY_CACHE_PATH = os.getenv("VERIFY_CACHE_PATH", os.path.join(_CACHE_ROOT, "verification.sqlite3"))
+
+# Output kept in the result, and the most a program may write before it is stopped (SIGXFSZ).
+OUTPUT_LIMIT = 8192
+OUTPUT_FILE_LIMIT = 1024 * 1024
+MAX_PROCESSES = 64
+C_FLAGS = ["-std=gnu11", "-Wall", "-O1"]
+C_LIBS = ["-lm", "-lpthread", "-lrt"]
+
+# Lab programs mostly read a count and then that many small numbers (processes,
+# burst times, resources...): a short count keeps loops short, and a line per
+# value suits both scanf and `read`.
+DEFAULT_SAMPLE_INPUT = "\n".join(["3", "5", "2", "4", "1", "3", "2", "6", "1", "4", "2", "3"] * 4) + "\n"
+
+verifications_total = Counter(
+    "doc_code_verifications_total", "Generated programs verified, by language and outcome.", ["language", "outcome"]
+)
+
+# Wrappers known to isolate a program, with the arguments that cut off its network.
+_SANDBOX_NETWORK_FLAGS = {
+    "bwrap": ("--unshare-net", "--unshare-all"),
+    "firejail": ("--net=none",),
+    "nsjail": None,  # new network namespace unless -N / --disable_clone_newnet
+}
+
+
+def _run_as() -> Optional[Tuple[int, int]]:
+    if not VERIFY_UID:
+        return None
+    uid, _, gid = VERIFY_UID.partition(":")
+    return int(uid), int(gid or uid)
+
+
+def _unshare_command(run_as: Tuple[int, int]) -> List[str]:
+    return ["unshare", "--net", f"--setuid={run_as[0]}", f"--setgid={run_as[1]}"]
+
+
+@functools.lru_cache(maxsize=None)
+def _unshare_problem(run_as: Tuple[int, int]) -> Optional[str]:
+    """Checks once that `unshare --net` can isolate the network and switch to `run_as`."""
+    if shutil.which("unshare") is None:
+        return "VERIFY_UID without VERIFY_SANDBOX_COMMAND needs unshare (util-linux) to cut off the network"
+    try:
+        probe = subprocess.run(_unshare_command(run_as) + ["true"], capture_output=True, timeout=10)
+    except (OSError, subprocess.TimeoutExpired) as e:
+        return f"unshare --net is unavailable: {e}"
+    if probe.returncode != 0:
+        return f"unshare --net is unavailable: {probe.stderr.decode(errors='replace').strip()}"
+    return None
+
+
+def sandbox_prefix() -> List[str]:
+    """The command every compiler and program run is wrapped in."""
+    if VERIFY_SANDBOX_COMMAND:
+        return VERIFY_SANDBOX_COMMAND
+    run_as = _run_as()
+    return _unshare_command(run_as) if run_as is not None else []
+
+
+def sandbox_problem() -> Optional[str]:
+    """Why generated code may not be run here, or None if a real sandbox is configured."""
+    if VERIFY_SANDBOX_COMMAND:
+        tool = os.path.basename(VERIFY_SANDBOX_COMMAND[0])
+        if tool not in _SANDBOX_NETWORK_FLAGS:
+            return f"VERIFY_SANDBOX_COMMAND must start with one of {', '.join(sorted(_SANDBOX_NETWORK_FLAGS))}"
+        flags = _SANDBOX_NETWORK_FLAGS[tool]
+        if flags is not None and not any(flag in VERIFY_SANDBOX_COMMAND for flag in flags):
+            return f"VERIFY_SANDBOX_COMMAND must cut off the network ({' or '.join(flags)})"
+        if tool == "nsjail" and {"-N", "--disable_clone_newnet"} & set(VERIFY_SANDBOX_COMMAND):
+            return "VERIFY_SANDBOX_COMMAND must not share the host network"
+        return None
+    try:
+        run_as = _run_as()
+    except ValueError:
+        return "VERIFY_UID must be a numeric uid[:gid]"
+    if run_as is None:
+        return "no sandbox configured (set VERIFY_SANDBOX_COMMAND or VERIFY_UID)"
+    if run_as[0] == 0 or run_as[1] == 0:
+        return "VERIFY_UID must not be root"
+    if os.geteuid() != 0:
+        return "VERIFY_UID needs the server to run as root to switch users"
+    # A different uid alone neither cuts off the network nor hides world-readable files;
+    # the network at least must go.
+    return _unshare_problem(run_as)
+
+
+CODE_VERIFICATION = CODE_VERIFICATION_REQUESTED and sandbox_problem() is None
+if CODE_VERIFICATION_REQUESTED and not CODE_VERIFICATION:
+    print(f"Warning: CODE_VERIFICATION disabled: {sandbox_problem()}")
+
+_FENCED = re.compile(r'```([\w+-]*)[ \t]*\n(.*?)```', re.DOTALL)
+_SHELL_TAGS = {"bash", "sh", "shell", "zsh"}
+_SHELL_HINT = re.compile(r'^\s*(echo|read|fi|done|esac)\b', re.MULTILINE)
+
+
+def extract_program(code_section: Optional[str]) -> Optional[Tuple[str, str]]:
+    """Returns (language, source) for the program in a code section, or None if there is none."""
+    if not code_section or not code_section.strip():
+        return None
+    fenced = _FENCED.search(code_section)
+    tag = fenced.group(1).lower() if fenced else ""
+    source = fenced.group(2) if fenced else code_section
+    if tag in _SHELL_TAGS or source.lstrip().startswith("#!"):
+        return "Shell", source
+    if tag == "c" or "#include" in source or re.search(r'\bint\s+main\s*\(', source):
+        return "C", source
+    if _SHELL_HINT.search(source):
+        return "Shell", source
+    return None
+
+
+def _limit_resources(cpu_seconds: float, memory_mb: Optional[int]):
+    """
+    Returns a preexec_fn applying rlimits (and VERIFY_UID) in the child before it execs.
+
+    Without VERIFY_SANDBOX_COMMAND the uid switch is left to `unshare`, which
+    needs root to create the network namespace first.
+    """
+    run_as = _run_as() if VERIFY_SANDBOX_COMMAND else None
+
+    def apply():
+        import resource
+        cpu = int(cpu_seconds) + 1
+        resource.setrlimit(resource.RLIMIT_CPU, (cpu, cpu))
+        resource.setrlimit(resource.RLIMIT_FSIZE, (OUTPUT_FILE_LIMIT, OUTPUT_FILE_LIMIT))
+        resource.setrlimit(resource.RLIMIT_CORE, (0, 0))
+        # Not enforced for root, hence VERIFY_UID.
+        resource.setrlimit(resource.RLIMIT_NPROC, (MAX_PROCESSES, MAX_PROCESSES))
+        if memory_mb:
+            limit = memory_mb * 1024 * 1024
+            resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+        if run_as is not None:
+            os.setgroups([])
+            os.setgid(run_as[1])
+            os.setuid(run_as[0])
+    return apply
+
+
+def _read_limited(path: str) -> str:
+    with open(path, "rb") as handle:
+        data = handle.read(OUTPUT_LIMIT + 1)
+    text = data[:OUTPUT_LIMIT].decode("utf-8", errors="replace")
+    return text + "\n[output truncated]" if len(data) > OUTPUT_LIMIT else text
+
+
+def _run_limited(command: List[str], workdir: str, stdin: str, timeout: float,
+                 memory_mb: Optional[int]) -> Dict:
+    """Runs `command` in `workdir` under rlimits; output goes through files so its size is capped."""
+    stdin_path = os.path.join(workdir, ".stdin")
+    stdout_path = os.path.join(workdir, ".stdout")
+    stderr_path = os.path.join(workdir, ".stderr")
+    with open(stdin_path, "w") as handle:
+        handle.write(stdin)
+    start = time.monotonic()
+    with open(stdin_path, "rb") as stdin_file, open(stdout_path, "wb") as stdout_file, \
+            open(stderr_path, "wb") as stderr_file:
+        process = subprocess.Popen(
+            command, cwd=workdir, stdin=stdin_file, stdout=stdout_file, stderr=stderr_file,
+            env={"PATH": "/usr/local/bin:/usr/bin:/bin", "HOME": workdir, "LANG": "C.UTF-8"},
+            preexec_fn=_limit_resources(timeout, memory_mb), start_new_session=True,
+        )
+        timed_out = False
+        try:
+            process.wait(timeout=timeout)
+        except subprocess.TimeoutExpired:
+            timed_out = True
+        finally:
+            # Also reaps anything the program forked.
+            try:
+                os.killpg(process.pid, signal.SIGKILL)
+            except ProcessLookupError:
+                pass
+            process.wait()
+    exit_code = process.returncode
+    return {
+        "exit_code": exit_code,
+        "signal": signal.Signals(-exit_code).name if exit_code < 0 and not timed_out else None,
+        "timed_out": timed_out,
+        "stdout": _read_limited(stdout_path),
+        "stderr": _read_limited(stderr_path),
+        "duration_ms": round((time.monotonic() - start) * 1000, 1),
+    }
+
+
+def _binary_path(source: str) -> str:
+    digest = hashlib.sha256(json.dumps([VERIFY_CC, C_FLAGS, C_LIBS, source]).encode("utf-8")).hexdigest()
+    return os.path.join(VERIFY_BINARY_DIR, digest)
+
+
+def _install_binary(compiled: str, binary: str) -> None:
+    """
+    Moves a freshly compiled program into VERIFY_BINARY_DIR atomically.
+
+    The workdir is usually on /tmp, often a different filesystem, so the
+    file is first moved (copied if need be) to a temporary name beside
+    `binary` and then renamed over it.
+    """
+    staging = f"{binary}.{os.getpid()}.tmp"
+    try:
+        shutil.move(compiled, staging)
+        os.replace(staging, binary)
+    finally:
+        if os.path.exists(staging):
+            os.remove(staging)
+
+
+def verify_program(language: str, source: str, stdin: str) -> Dict:
+    """
+    Compiles (C) and runs `source` with `stdin`; blocking, meant for a pool process.
+
+    Returns a JSON-serializable report with the compiler output and the
+    program's exit status, stdout and stderr. Compiled binaries are kept in
+    VERIFY_BINARY_DIR by source hash, so a program is compiled only once.
+    """
+    report = {"language": language, "stdin": stdin, "compiled": True, "compiler_output": ""}
+    with tempfile.TemporaryDirectory(prefix="verify-") as workdir:
+        if VERIFY_UID:
+            os.chmod(workdir, 0o777)
+        if language == "C":
+            binary = _binary_path(source)
+            if not os.path.exists(binary):
+                os.makedirs(VERIFY_BINARY_DIR, exist_ok=True)
+                with open(os.path.join(workdir, "main.c"), "w") as handle:
+                    handle.write(source)
+                compiled = os.path.join(workdir, "a.out")
+                # Sandboxed too: `#include "/etc/..."` would otherwise leak files through the diagnostics.
+                build = _run_limited(sandbox_prefix() + [VERIFY_CC, *C_FLAGS, "main.c", "-o", compiled, *C_LIBS],
+                                     workdir, "", VERIFY_COMPILE_TIMEOUT, None)
+                report["compiler_output"] = (build["stdout"] + build["stderr"]).strip()
+                if build["exit_code"] != 0 or build["timed_out"]:
+                    report["compiled"] = False
+                    return report
+                _install_binary(compiled, binary)
+            # Run a copy from the workdir: VERIFY_UID may not be able to reach VERIFY_BINARY_DIR.
+            program = os.path.join(workdir, "program")
+            shutil.copy(binary, program)
+            command = [program]
+        else:
+            with open(os.path.join(workdir, "script.sh"), "w") as handle:
+                handle.write(source)
+            command = ["bash", "script.sh"]
+        report.update(_run_limited(sandbox_prefix() + command, workdir, stdin,
+                                   VERIFY_RUN_TIMEOUT, VERIFY_MEMORY_MB))
+    return report
+
+
+def _outcome(report: Dict) -> str:
+    if not report["compiled"]:
+        return "compile_error"
+    if report["timed_out"]:
+        return "timeout"
+    return "ok" if report["exit_code"] == 0 else "runtime_error"
+
+
+class CodeVerifier:
+    """
+    Verifies generated programs on a process pool sized to the available cores.
+
+    Reports are cached by (language, source, stdin), so a repeated question
+    verifies for free; concurrent requests for the same program share one run.
+    The cache is SQLite-backed and is read and written in a worker thread.
+    """
+
+    def __init__(self, workers: int = VERIFY_WORKERS, cache_path: Optional[str] = VERIFY_CACHE_PATH):
+        self.workers = workers
+        self.cache = DocumentationCache(path=cache_path, max_entries=1024, ttl=30 * 24 * 3600)
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._flight = SingleFlight()
+        self.stats = {"runs": 0, "cached": 0, "errors": 0}
+
+    async def verify(self, code_section: Optional[str], stdin: Optional[str] = None) -> Optional[Dict]:
+        """
+        Returns the verification report for a code section, or None if it holds no program.
+
+        Only ever pass code the model generated: submitted code must never be run.
+        """
+        program = extract_program(code_section)
+        if program is None:
+            return None
+        problem = sandbox_problem()
+        if problem is not None:
+            return {"error": f"Code verification is unavailable: {problem}."}
+        language, source = program
+        stdin = DEFAULT_SAMPLE_INPUT if stdin is None else stdin
+        key = "verify:" + hashlib.sha256(json.dumps([language, source, stdin]).encode("utf-8")).hexdigest()
+        cached = await asyncio.to_thread(self.cache.get, key)
+        if cached is not None:
+            self.stats["cached"] += 1
+            verifications_total.inc(language=language, outcome="cached")
+            return dict(cached, cached=True)
+        report = await self._flight.do(key, lambda: self._run(key, language, source, stdin))
+        return dict(report, cached=False)
+
+    async def _run(self, key: str, language: str, source: str, stdin: str) -> Dict:
+        if self._pool is None:
+            # spawn, not fork: the server process runs threads.
+            self._pool = ProcessPoolExecutor(self.workers, mp_context=multiprocessing.get_context("spawn"))
+        try:
+            report = await asyncio.get_running_loop().run_in_executor(
+                self._pool, verify_program, language, source, stdin
+            )
+        except BrokenProcessPool:
+            self.stats["errors"] += 1
+            self.shutdown()
+            raise
+        except Exception:
+            self.stats["errors"] += 1
+            raise
+        self.stats["runs"] += 1
+        verifications_total.inc(language=language, outcome=_outcome(report))
+        await asyncio.to_thread(self.cache.set, key, report)
+        return report
+
+    def shutdown(self) -> None:
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+
+    def get_stats(self) -> Dict[str, int]:
+        return dict(self.stats, in_flight=self._flight.get_stats()["in_flight"])
+
+
+async def attach_verification(result: Dict, stdin: Optional[str] = None) -> Dict:
+    """
+    Returns `result` with a `verification` report for its code section.
+
+    Verification problems never fail the request: they are reported in
+    `verification.error` instead.
+    """
+    try:
+        report = await code_verifier.verify(result.get("code"), stdin)
+    except Exception as e:
+        print(f"Error verifying generated code: {e}")
+        report = {"error": f"Verification failed: {e}"}
+    if report is None:
+        return result
+    return dict(result, verification=report)
+
+
+code_verifier = CodeVerifier()
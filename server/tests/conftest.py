@@ -0,0 +1,24 @@
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+# Add the server directory to Python path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+# Set before any service module is imported: the suite runs offline against the
+# stub backend, with every on-disk store in a throwaway directory.
+_STORAGE = tempfile.mkdtemp(prefix="doc-tests-")
+os.environ.update({
+    "LLM_BACKEND": "stub",
+    "STUB_LATENCY_MS": "10",
+    "STUB_JITTER_MS": "0",
+    "DOC_CACHE_PATH": os.path.join(_STORAGE, "documentation.sqlite3"),
+    "JOBS_PATH": os.path.join(_STORAGE, "jobs.sqlite3"),
+    "VERIFY_CACHE_PATH": "",
+    "VERIFY_BINARY_DIR": os.path.join(_STORAGE, "verify"),
+    "PDF_CACHE_DIR": os.path.join(_STORAGE, "pdf"),
+    "SHARED_STORE_PATH": "",
+    "CODE_VERIFICATION": "0",
+    "JOB_WORKERS": "0",
+})
@@ -0,0 +1,62 @@
+import asyncio
+
+import pytest
+
+from services.admission import PRIORITY_HIGH, PRIORITY_LOW, AdmissionController, AdmissionRejected
+from services.shared_store import SharedTokenBuckets
+
+
+@pytest.fixture(params=["local", "shared"])
+def controller(request, tmp_path):
+    # 600 requests per minute: one more request fits every 0.1 s once the burst is spent.
+    controller = AdmissionController(rpm=600, tpm=10 ** 9, max_queue=2)
+    if request.param == "shared":
+        controller._quota = SharedTokenBuckets(str(tmp_path / "shared.sqlite3"), {"requests": 600, "tokens": 10 ** 9})
+    return controller
+
+
+def _spend_burst(controller):
+    controller._quota.try_take({"requests": 600, "tokens": 0})
+
+
+def test_calls_within_quota_are_admitted_at_once(controller):
+    async def scenario():
+        for _ in range(5):
+            await controller.acquire(100)
+
+    asyncio.run(scenario())
+    assert controller.get_stats()["admitted"] == 5
+    assert controller.get_stats()["queued"] == 0
+
+
+def test_queued_calls_are_admitted_by_priority(controller):
+    order = []
+
+    async def call(name, priority):
+        await controller.acquire(1, priority)
+        order.append(name)
+
+    async def scenario():
+        _spend_burst(controller)
+        low = asyncio.create_task(call("low", PRIORITY_LOW))
+        await asyncio.sleep(0)
+        high = asyncio.create_task(call("high", PRIORITY_HIGH))
+        await asyncio.gather(low, high)
+
+    asyncio.run(scenario())
+    assert order == ["high", "low"]
+
+
+def test_full_queue_rejects(controller):
+    async def scenario():
+        _spend_burst(controller)
+        waiting = [asyncio.create_task(controller.acquire(1)) for _ in range(2)]
+        await asyncio.sleep(0)
+        with pytest.raises(AdmissionRejected):
+            await controller.acquire(1)
+        for task in waiting:
+            task.cancel()
+        await asyncio.gather(*waiting, return_exceptions=True)
+
+    asyncio.run(scenario())
+    assert controller.get_stats()["rejected"] == 1
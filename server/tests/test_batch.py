@@ -0,0 +1,81 @@
+import json
+import asyncio
+
+from fastapi.testclient import TestClient
+
+import main
+from services.batch import run_batch
+
+OPTIONS = {"overview": True, "code": True}
+
+
+def test_items_differing_only_in_settings_are_generated_separately():
+    calls = []
+
+    async def generate(item):
+        calls.append(item)
+        return {"result": {"overview": item["question"]}}
+
+    items = [
+        {"question": "FCFS scheduling", "code": None, "options": OPTIONS, "parallel_sections": False},
+        {"question": "fcfs  scheduling", "code": None, "options": OPTIONS, "parallel_sections": False},
+        {"question": "FCFS scheduling", "code": None, "options": OPTIONS, "parallel_sections": True},
+    ]
+
+    async def collect():
+        return [outcome async for outcome in run_batch(items, generate)]
+
+    outcomes = asyncio.run(collect())
+    assert len(calls) == 2
+    assert sorted(outcome["index"] for outcome in outcomes) == [0, 1, 2]
+    assert all(outcome["status"] == "ok" for outcome in outcomes)
+
+
+def test_batch_items_honour_request_settings_and_carry_document_hashes(monkeypatch):
+    used = []
+
+    async def by_section(question, code, options):
+        used.append("parallel_sections")
+        return {"overview": "by section", "code": "int main() { return 0; }"}
+
+    async def incrementally(question, code, options, previous_document):
+        used.append(previous_document)
+        return {"overview": "incremental", "code": code}
+
+    monkeypatch.setattr(main, "generate_documentation_by_section_async", by_section)
+    monkeypatch.setattr(main, "generate_documentation_incrementally_async", incrementally)
+
+    with TestClient(main.app) as client:
+        response = client.post("/generate-documentation/batch", json={"items": [
+            {"question": "Write a C program for SJF scheduling", "options": OPTIONS, "parallel_sections": True},
+            {"question": "Write a C program for SJF scheduling", "code": "int main() { return 1; }",
+             "options": OPTIONS, "previous_document": "abc123"},
+        ]})
+        outcomes = sorted((json.loads(line) for line in response.text.splitlines()), key=lambda o: o["index"])
+
+        assert [outcome["status"] for outcome in outcomes] == ["ok", "ok"]
+        assert sorted(used, key=str) == ["abc123", "parallel_sections"]
+        assert outcomes[1]["result"]["overview"] == "incremental"
+        for outcome in outcomes:
+            document = client.get(outcome["location"])
+            assert document.status_code == 200
+            assert outcome["location"] == f"/documentation/{outcome['document']}"
+            assert document.json() == outcome["result"]
+
+
+def test_oversized_batch_is_rejected(monkeypatch):
+    calls = []
+
+    async def generate(question, code, options):
+        calls.append(question)
+        return {"overview": question}
+
+    monkeypatch.setattr(main, "generate_documentation_with_ai_async", generate)
+    items = [{"question": f"Write a C program for FCFS case {i}", "options": OPTIONS}
+             for i in range(main.BATCH_MAX_ITEMS + 1)]
+
+    with TestClient(main.app) as client:
+        response = client.post("/generate-documentation/batch", json={"items": items})
+
+    assert response.status_code == 422
+    assert calls == []
@@ -0,0 +1,88 @@
+from services import cache
+from services.cache import DocumentationCache, make_cache_key
+
+
+class Clock:
+    def __init__(self, now=1_000_000.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+def test_memory_entries_expire_after_ttl(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(cache.time, "time", clock)
+    store = DocumentationCache(path=None, ttl=60)
+    store.set("key", {"overview": "x"})
+
+    clock.now += 60
+    assert store.get("key") == {"overview": "x"}
+    clock.now += 1
+    assert store.get("key") is None
+    assert store.get_stats()["expirations"] == 1
+
+
+def test_disk_entries_expire_after_ttl(monkeypatch, tmp_path):
+    clock = Clock()
+    monkeypatch.setattr(cache.time, "time", clock)
+    DocumentationCache(path=str(tmp_path / "cache.sqlite3"), ttl=60).set("key", {"overview": "x"})
+
+    clock.now += 61
+    store = DocumentationCache(path=str(tmp_path / "cache.sqlite3"), ttl=60)
+    assert store.get("key") is None
+    assert store._conn.execute("SELECT COUNT(*) FROM documentation_cache").fetchone()[0] == 0
+
+
+def test_least_recently_used_entry_is_evicted():
+    store = DocumentationCache(path=None, max_entries=2)
+    store.set("a", {"v": 1})
+    store.set("b", {"v": 2})
+    store.get("a")  # "b" is now the least recently used
+    store.set("c", {"v": 3})
+
+    assert store.get("b") is None
+    assert store.get("a") == {"v": 1}
+    assert store.get("c") == {"v": 3}
+    assert store.get_stats()["evictions"] == 1
+
+
+def test_disk_hit_is_promoted_into_memory(tmp_path):
+    path = str(tmp_path / "cache.sqlite3")
+    DocumentationCache(path=path).set("key", {"overview": "x"})
+    store = DocumentationCache(path=path)
+
+    assert store.get("key") == {"overview": "x"}
+    assert store.get("key") == {"overview": "x"}
+    stats = store.get_stats()
+    assert stats["hits"] == 2
+    assert stats["disk_hits"] == 1
+    assert stats["memory_entries"] == 1
+
+
+def test_cached_values_cannot_be_mutated_by_callers():
+    store = DocumentationCache(path=None)
+    store.set("key", {"overview": "x"})
+    store.get("key")["overview"] = "changed"
+
+    assert store.get("key") == {"overview": "x"}
+
+
+def test_cache_key_ignores_formatting_and_unselected_options():
+    assert make_cache_key("Implement FCFS.", "int main() {}  \n", {"overview": True, "code": False}) == \
+        make_cache_key("  implement   fcfs", "int main() {}", {"overview": True})
+
+
+def test_purge_deletes_only_expired_disk_entries(monkeypatch, tmp_path):
+    clock = Clock()
+    monkeypatch.setattr(cache.time, "time", clock)
+    store = DocumentationCache(path=str(tmp_path / "cache.sqlite3"), ttl=60)
+    store.set("old", {"v": 1})
+    clock.now += 30
+    store.set("new", {"v": 2})
+
+    clock.now += 31
+    assert store.purge() == 1
+    assert store.purge() == 0
+    rows = store._conn.execute("SELECT key FROM documentation_cache").fetchall()
+    assert rows == [("new",)]
@@ -0,0 +1,79 @@
+import gzip
+import json
+
+import pytest
+
+import build_corpus
+from services.corpus import PrebuiltCorpus, canonical_question, read_artifact
+from services.gemini_os_doc import EXPECTED_KEYS
+
+
+@pytest.fixture(scope="module")
+def corpus_path(tmp_path_factory):
+    """A real artifact for two catalogue entries, generated by the stub backend."""
+    path = str(tmp_path_factory.mktemp("corpus") / "corpus.json.gz")
+    build_corpus.build(path, only={"fcfs", "list_directory"})
+    return path
+
+
+@pytest.mark.parametrize("question", [
+    "Implement FCFS CPU scheduling algorithm.",
+    "Write a C program to implement FCFS CPU scheduling",
+    "write a program for the fcfs cpu scheduling algorithm in c",
+    "  FCFS   CPU scheduling!  ",
+])
+def test_canonical_question_strips_filler(question):
+    assert canonical_question(question) == "fcfs cpu scheduling"
+
+
+def test_canonical_question_keeps_questions_that_are_only_filler():
+    assert canonical_question("Write a program") == "write a program"
+
+
+def test_lookup_matches_paraphrases_and_returns_every_section(corpus_path):
+    corpus = PrebuiltCorpus(corpus_path)
+    everything = {key: True for key in EXPECTED_KEYS}
+    result = corpus.lookup("Write a C program to implement first come first serve scheduling", None, everything)
+    assert set(result) == set(EXPECTED_KEYS)
+    assert all(result.values())
+    assert corpus.stats == {"hits": 1, "misses": 0}
+
+
+def test_lookup_blanks_unrequested_sections(corpus_path):
+    corpus = PrebuiltCorpus(corpus_path)
+    options = {key: key in ("code", "explanation") for key in EXPECTED_KEYS}
+    result = corpus.lookup("fcfs", None, options)
+    assert set(result) == set(EXPECTED_KEYS)
+    assert result["code"] and result["explanation"]
+    assert all(value == "" for key, value in result.items() if key not in ("code", "explanation"))
+    # Blanking works on a copy; the stored entry keeps every section.
+    assert all(corpus.entries["fcfs"]["result"].values())
+
+
+def test_lookup_skips_user_code_and_unknown_questions(corpus_path):
+    corpus = PrebuiltCorpus(corpus_path)
+    options = {key: True for key in EXPECTED_KEYS}
+    assert corpus.lookup("fcfs", "int main() { return 0; }", options) is None
+    assert corpus.lookup("Implement a page replacement simulator", None, options) is None
+    # Built artifacts only index the entries they contain.
+    assert corpus.lookup("Implement SJF CPU scheduling algorithm.", None, options) is None
+    assert corpus.stats == {"hits": 0, "misses": 2}
+
+
+def test_unchanged_prompts_are_not_regenerated(corpus_path, monkeypatch):
+    def fail(*args, **kwargs):
+        raise AssertionError("entry regenerated")
+
+    monkeypatch.setattr(build_corpus.model, "generate_content", fail)
+    build_corpus.build(corpus_path, only={"fcfs", "list_directory"})
+    assert set(read_artifact(corpus_path)["entries"]) == {"fcfs", "list_directory"}
+
+
+def test_missing_or_outdated_artifact_leaves_the_corpus_empty(tmp_path):
+    path = tmp_path / "old.json.gz"
+    with gzip.open(path, "wt", encoding="utf-8") as f:
+        json.dump({"format_version": 0, "entries": {}, "index": {}}, f)
+    assert read_artifact(str(path)) is None
+    for missing in (str(path), str(tmp_path / "absent.json.gz")):
+        corpus = PrebuiltCorpus(missing)
+        assert corpus.lookup("fcfs", None, {"code": True}) is None
@@ -0,0 +1,122 @@
+import gzip
+
+import pytest
+from fastapi.testclient import TestClient
+
+import main
+from services import documents
+from services.documents import DocumentStore, choose_encoding, etag_matches
+
+RESULT = {"overview": "First come first serve. " * 40, "code": "int main() { return 0; }"}
+
+
+def test_equal_results_share_one_document():
+    store = DocumentStore(path=None)
+    first = store.put(RESULT)
+
+    assert store.put(dict(reversed(list(RESULT.items())))).hash == first.hash
+    assert gzip.decompress(first.encodings["gzip"]) == first.encodings["identity"]
+    assert first.etag("identity") != first.etag("gzip")
+
+
+def test_documents_survive_a_restart(tmp_path):
+    path = str(tmp_path / "documents.sqlite3")
+    digest = DocumentStore(path=path).put(RESULT).hash
+
+    document = DocumentStore(path=path).get(digest)
+    assert document is not None
+    assert document.encodings["identity"] == documents.canonical_json(RESULT)
+
+
+def test_expired_documents_are_not_served(monkeypatch, tmp_path):
+    path = str(tmp_path / "documents.sqlite3")
+    digest = DocumentStore(path=path, ttl=60).put(RESULT).hash
+    now = documents.time.time()
+    monkeypatch.setattr(documents.time, "time", lambda: now + 61)
+
+    assert DocumentStore(path=path, ttl=60).get(digest) is None
+
+
+@pytest.mark.parametrize("header, matches", [
+    (None, False),
+    ('"{hash}"', True),
+    ('"{hash}.gz"', True),
+    ('W/"{hash}.br"', True),
+    ('"other", "{hash}"', True),
+    ("*", True),
+    ('"{hash}0"', False),
+])
+def test_etag_matches_any_representation(header, matches):
+    digest = "a" * 64
+    assert etag_matches(header and header.format(hash=digest), digest) is matches
+
+
+@pytest.mark.parametrize("header, expected", [
+    (None, "identity"),
+    ("gzip, deflate", "gzip"),
+    ("gzip;q=0, identity", "identity"),
+    ("*", "gzip"),
+])
+def test_choose_encoding(header, expected):
+    assert choose_encoding(header, {"identity": b"", "gzip": b""}) == expected
+
+
+def test_get_documentation_answers_304_for_a_matching_etag(monkeypatch):
+    monkeypatch.setattr(main, "document_store", DocumentStore(path=None))
+    document = main.document_store.put(RESULT)
+    client = TestClient(main.app)
+
+    response = client.get(f"/documentation/{document.hash}", headers={"Accept-Encoding": "gzip"})
+    assert response.status_code == 200
+    assert response.headers["Content-Encoding"] == "gzip"
+    assert response.json() == RESULT
+    etag = response.headers["ETag"]
+
+    response = client.get(f"/documentation/{document.hash}",
+                          headers={"Accept-Encoding": "gzip", "If-None-Match": etag})
+    assert response.status_code == 304
+    assert response.content == b""
+    assert response.headers["ETag"] == etag
+    assert main.document_store.get_stats()["not_modified"] == 1
+
+
+def test_get_documentation_unknown_hash_is_404(monkeypatch):
+    monkeypatch.setattr(main, "document_store", DocumentStore(path=None))
+    client = TestClient(main.app)
+
+    assert client.get("/documentation/" + "0" * 64).status_code == 404
+    assert client.get("/documentation/not-a-hash").status_code == 404
+
+
+def test_purge_deletes_expired_documents(monkeypatch, tmp_path):
+    store = DocumentStore(path=str(tmp_path / "documents.sqlite3"), ttl=60)
+    old = store.put(RESULT).hash
+    now = documents.time.time()
+    monkeypatch.setattr(documents.time, "time", lambda: now + 61)
+    new = store.put({"overview": "newer"}).hash
+
+    assert store.purge() == 1
+    hashes = [row[0] for row in store._conn.execute("SELECT hash FROM documents")]
+    assert hashes == [new]
+    assert old not in hashes
+
+
+def test_results_with_failed_sections_are_not_stored(monkeypatch):
+    store = DocumentStore(path=None)
+    monkeypatch.setattr(main, "document_store", store)
+    failed = {"overview": "FCFS runs jobs in arrival order.",
+              "explanation": "Error parsing JSON response. Raw text might contain info. Error: Expecting ','"}
+
+    async def generate(question, code, options):
+        return dict(failed)
+
+    monkeypatch.setattr(main, "generate_documentation_with_ai_async", generate)
+    client = TestClient(main.app)
+    response = client.post("/generate-documentation", json={
+        "question": "Explain FCFS", "options": {"overview": True, "explanation": True}})
+
+    assert response.status_code == 200
+    assert response.json() == failed
+    assert "ETag" not in response.headers and "Content-Location" not in response.headers
+    assert response.headers["Cache-Control"] == "no-store"
+    assert store.stats["stored"] == 0
@@ -0,0 +1,102 @@
+import re
+import json
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+from services import gemini_os_doc, incremental
+from services.documents import DocumentStore
+from services.incremental import remember_submission, stale_sections, structural_changes
+
+QUESTION = "Write a C program to find the sum of an array"
+OLD_CODE = """#include <stdio.h>
+int sum(int *values, int count) {
+    int total = 0;
+    for (int i = 0; i < count; i++) total += values[i];
+    return total;
+}
+int main() {
+    int values[] = {1, 2, 3};
+    printf("%d\\n", sum(values, 3));
+    return 0;
+}
+"""
+PREVIOUS = {
+    "overview": "Sums an array.",
+    "shortAlgorithm": "1. Add every element.",
+    "detailedAlgorithm": "1. Start at zero.\\n2. Add each element.",
+    "code": OLD_CODE,
+    "requiredModules": "stdio.h for printf.",
+    "variablesAndConstants": "total: running sum.",
+    "functions": "sum: adds the values.",
+    "explanation": "Loops once over the array.",
+}
+ALL = {key: True for key in PREVIOUS}
+
+
+class SectionModel:
+    """Answers every generation with a fresh value for each requested section."""
+
+    def __init__(self):
+        self.requested = []
+
+    async def generate_content_async(self, prompt, generation_config=None, stream=False):
+        listed = re.search(r'REQUESTED DOCUMENTATION SECTIONS:\*\*\s*((?:\s*- \w+)*)', prompt).group(1)
+        sections = re.findall(r'- (\w+)', listed)
+        self.requested.append(sections)
+        return SimpleNamespace(text=json.dumps({key: f"fresh {key}" for key in sections}))
+
+
+@pytest.fixture
+def previous_document(monkeypatch):
+    store = DocumentStore(path=None)
+    monkeypatch.setattr(incremental, "document_store", store)
+
+    def submit(result):
+        document = store.put(result)
+        remember_submission(document.hash, QUESTION, OLD_CODE)
+        return document.hash
+    return submit
+
+
+def regenerate(monkeypatch, digest, code):
+    model = SectionModel()
+    monkeypatch.setattr(gemini_os_doc, "model", model)
+    result = asyncio.run(gemini_os_doc.generate_documentation_incrementally_async(QUESTION, code, ALL, digest))
+    return result, model
+
+
+def test_comment_only_edit_reuses_every_section(monkeypatch, previous_document):
+    digest = previous_document(PREVIOUS)
+    code = OLD_CODE.replace("int main() {", "/* entry point */\nint main() {")
+
+    result, model = regenerate(monkeypatch, digest, code)
+
+    assert model.requested == []
+    assert result == dict(PREVIOUS, code=code)
+
+
+def test_changed_body_regenerates_only_stale_sections(monkeypatch, previous_document):
+    digest = previous_document(PREVIOUS)
+    code = OLD_CODE.replace("total += values[i];", "total += 2 * values[i];")
+    stale = stale_sections(structural_changes(OLD_CODE, code))
+
+    result, model = regenerate(monkeypatch, digest, code)
+
+    assert stale == {"functions", "explanation"}
+    assert sorted(model.requested[-1]) == sorted(stale)
+    assert result["functions"] == "fresh functions"
+    assert result["overview"] == PREVIOUS["overview"]
+
+
+def test_failed_previous_sections_are_regenerated(monkeypatch, previous_document):
+    failed = dict(PREVIOUS, overview=gemini_os_doc.SECTION_ERROR_PREFIX + " Error: Expecting ','")
+    digest = previous_document(failed)
+    code = OLD_CODE.replace("int main() {", "/* entry point */\nint main() {")
+
+    result, model = regenerate(monkeypatch, digest, code)
+
+    assert model.requested[-1] == ["overview"]
+    assert result["overview"] == "fresh overview"
+    assert result["functions"] == PREVIOUS["functions"]
@@ -0,0 +1,177 @@
+import asyncio
+
+import pytest
+
+from services import jobs
+from services.jobs import DONE, FAILED, QUEUED, RUNNING, JobQueue, JobQueueFull, JobWorkerPool
+from services.resilience import LLMUnavailableError
+
+
+class Clock:
+    def __init__(self, now=1_000_000.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(jobs.time, "time", clock)
+    return clock
+
+
+@pytest.fixture
+def queue(tmp_path):
+    return JobQueue(str(tmp_path / "jobs.sqlite3"))
+
+
+def test_jobs_are_claimed_in_order_and_once(queue, clock):
+    first = queue.enqueue({"question": "one"})
+    clock.now += 1
+    second = queue.enqueue({"question": "two"})
+
+    assert queue.claim("w1")["id"] == first
+    assert queue.claim("w2")["id"] == second
+    assert queue.claim("w3") is None
+    assert queue.get(first)["status"] == RUNNING
+
+
+def test_expired_lease_hands_the_job_to_another_worker(queue, clock):
+    job_id = queue.enqueue({"question": "one"})
+    assert queue.claim("dead")["attempts"] == 1
+
+    clock.now += jobs.LEASE_SECONDS - 1
+    assert queue.claim("w2") is None
+    clock.now += 2
+    job = queue.claim("w2")
+    assert job == {"id": job_id, "request": {"question": "one"}, "attempts": 2}
+
+    # The worker that lost its lease can no longer renew or finish the job.
+    assert not queue.renew(job_id, "dead")
+    queue.complete(job_id, "dead", {"overview": "stale"})
+    assert queue.get(job_id)["status"] == RUNNING
+
+    queue.complete(job_id, "w2", {"overview": "fresh"})
+    assert queue.get(job_id)["status"] == DONE
+    assert queue.get(job_id)["overview"] == "fresh"
+
+
+def test_renewed_lease_is_not_taken_over(queue, clock):
+    job_id = queue.enqueue({"question": "one"})
+    queue.claim("w1")
+
+    clock.now += jobs.LEASE_SECONDS - 1
+    assert queue.renew(job_id, "w1")
+    clock.now += 2
+    assert queue.claim("w2") is None
+
+
+def test_retried_job_waits_for_its_delay(queue, clock):
+    job_id = queue.enqueue({"question": "one"})
+    queue.claim("w1")
+    queue.retry(job_id, "w1", 10, "model unavailable")
+
+    job = queue.get(job_id)
+    assert job["status"] == QUEUED
+    assert job["error"] == "model unavailable"
+    assert queue.claim("w2") is None
+    clock.now += 10
+    assert queue.claim("w2")["attempts"] == 2
+
+
+def test_queue_limit(queue, monkeypatch):
+    monkeypatch.setattr(jobs, "JOB_QUEUE_LIMIT", 2)
+    queue.enqueue({})
+    queue.enqueue({})
+
+    with pytest.raises(JobQueueFull):
+        queue.enqueue({})
+
+
+def test_purge_keeps_recent_and_unfinished_jobs(queue, clock):
+    old = queue.enqueue({})
+    queue.claim("w1")
+    queue.complete(old, "w1", {})
+    running = queue.enqueue({})
+    queue.claim("w1")
+
+    clock.now += jobs.JOB_RETENTION_SECONDS + 1
+    queue.renew(running, "w1")
+    recent = queue.enqueue({})
+    assert queue.claim("w2")["id"] == recent
+    queue.fail(recent, "w2", "boom")
+
+    assert queue.purge() == 1
+    assert queue.get(old) is None
+    assert queue.get(running) is not None
+    assert queue.get(recent)["status"] == FAILED
+
+
+def _run_pool(queue, handler, job_id, monkeypatch):
+    monkeypatch.setattr(jobs, "backoff_delay", lambda attempt: 0)
+
+    async def scenario():
+        pool = JobWorkerPool(queue, handler, workers=1)
+        pool.start()
+        try:
+            job = await jobs.wait_for_job(queue, job_id, 5)
+        finally:
+            await pool.stop()
+        return job, pool.stats
+
+    return asyncio.run(scenario())
+
+
+def test_pool_retries_transient_failures(queue, monkeypatch):
+    calls = []
+
+    async def handler(request):
+        calls.append(request)
+        if len(calls) < jobs.JOB_MAX_ATTEMPTS:
+            raise LLMUnavailableError("model unavailable", retry_after=0)
+        return {"overview": "done"}
+
+    job, stats = _run_pool(queue, handler, queue.enqueue({"question": "one"}), monkeypatch)
+
+    assert job["status"] == DONE
+    assert job["attempts"] == jobs.JOB_MAX_ATTEMPTS
+    assert stats["retried"] == jobs.JOB_MAX_ATTEMPTS - 1
+
+
+def test_pool_gives_up_after_max_attempts(queue, monkeypatch):
+    async def handler(request):
+        raise LLMUnavailableError("model unavailable", retry_after=0)
+
+    job, stats = _run_pool(queue, handler, queue.enqueue({"question": "one"}), monkeypatch)
+
+    assert job["status"] == FAILED
+    assert job["attempts"] == jobs.JOB_MAX_ATTEMPTS
+    assert stats["failed"] == 1
+
+
+def test_pool_fails_non_transient_errors_at_once(queue, monkeypatch):
+    async def handler(request):
+        raise ValueError("bad request")
+
+    job, _ = _run_pool(queue, handler, queue.enqueue({"question": "one"}), monkeypatch)
+
+    assert job["status"] == FAILED
+    assert job["attempts"] == 1
+    assert job["error"] == "bad request"
+
+
+def test_pool_fails_a_job_that_keeps_killing_workers(queue, clock, monkeypatch):
+    job_id = queue.enqueue({"question": "one"})
+    for attempt in range(jobs.JOB_MAX_ATTEMPTS):
+        queue.claim(f"dead-{attempt}")
+        clock.now += jobs.LEASE_SECONDS + 1
+
+    async def handler(request):
+        raise AssertionError("must not run again")
+
+    job, _ = _run_pool(queue, handler, job_id, monkeypatch)
+
+    assert job["status"] == FAILED
+    assert "interrupted" in job["error"]
@@ -0,0 +1,56 @@
+import pytest
+
+from services.json_salvage import repair_json, salvage_sections
+
+KEYS = ["overview", "code", "explanation"]
+
+
+@pytest.mark.parametrize("text, expected", [
+    ('```json\n{"overview": "FCFS"}\n```', {"overview": "FCFS"}),
+    ('Here is the documentation:\n{"overview": "FCFS"}\nHope this helps!', {"overview": "FCFS"}),
+    ('{"code": "int main() {\n    return 0;\n}"}', {"code": "int main() {\n    return 0;\n}"}),
+    ('{"code": "printf(\\"%d\\\\n\\", x); // 50\\% done"}', {"code": 'printf("%d\\n", x); // 50\\% done'}),
+    ('{"overview": "FCFS", "code": "x",}', {"overview": "FCFS", "code": "x"}),
+])
+def test_repair_json_fixes_common_defects(text, expected):
+    assert repair_json(text) == expected
+
+
+@pytest.mark.parametrize("text", [
+    '{"overview": "FCFS", "code": "int main() {',
+    'I cannot produce documentation for this question.',
+    '["overview", "code"]',
+])
+def test_repair_json_gives_up_on_truncated_or_non_object_input(text):
+    assert repair_json(text) is None
+
+
+def test_salvage_keeps_sections_before_the_cut():
+    truncated = '```json\n{"overview": "Schedules processes.", "code": "#include <stdio.h>\\nint main() {}", "explan'
+
+    assert salvage_sections(truncated, KEYS) == {
+        "overview": "Schedules processes.",
+        "code": "#include <stdio.h>\nint main() {}",
+    }
+
+
+def test_salvage_drops_the_truncated_section():
+    truncated = '{"overview": "Schedules processes.", "code": "int main() { printf(\\"hi'
+
+    assert salvage_sections(truncated, KEYS) == {"overview": "Schedules processes."}
+
+
+def test_salvage_ignores_unrequested_and_non_string_members():
+    text = '{"overview": "FCFS", "extra": "ignored", "code": {"nested": true}, "explanation": "Done."'
+
+    assert salvage_sections(text, KEYS) == {"overview": "FCFS", "explanation": "Done."}
+
+
+def test_salvage_tolerates_invalid_escapes_in_code():
+    text = '{"code": "printf(\\"50\\% done\\");", "explanation": "Prints prog'
+
+    assert salvage_sections(text, KEYS) == {"code": 'printf("50\\% done");'}
+
+
+def test_salvage_of_garbage_is_empty():
+    assert salvage_sections("Sorry, I can't help with that.", KEYS) == {}
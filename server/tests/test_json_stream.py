@@ -0,0 +1,73 @@
+import json
+
+import pytest
+
+from services.json_stream import IncrementalJSONParser
+
+DOCUMENT = {
+    "explanation": "Forks a child.\nUses \"quotes\" and a } brace.",
+    "functions": [{"name": "fork", "args": []}, {"name": "wait", "args": ["status"]}],
+    "complexity": {"time": "O(n)", "notes": "[sic]"},
+    "lines": 42,
+    "ratio": -1.5e3,
+    "verified": True,
+    "extra": None,
+}
+
+
+def feed_in_chunks(text, size):
+    parser = IncrementalJSONParser()
+    completed = []
+    for start in range(0, len(text), size):
+        completed.extend(parser.feed(text[start:start + size]))
+    return parser, completed
+
+
+@pytest.mark.parametrize("size", [1, 2, 7, 64, 10_000])
+def test_any_chunking_yields_every_member_in_order(size):
+    text = "```json\n" + json.dumps(DOCUMENT, indent=2) + "\n```"
+    parser, completed = feed_in_chunks(text, size)
+    assert completed == list(DOCUMENT.items())
+    assert parser.result == DOCUMENT
+    assert parser.finished
+
+
+def test_members_are_emitted_as_soon_as_they_close():
+    parser = IncrementalJSONParser()
+    assert parser.feed('{"code": "int x;", "expla') == [("code", "int x;")]
+    assert parser.feed('nation": "decl') == []
+    assert parser.feed('ares x", "n": 1') == [("explanation", "declares x")]
+    # A scalar only ends at the following comma or closing brace.
+    assert parser.feed("0") == []
+    assert parser.feed("}") == [("n", 10)]
+
+
+def test_raw_control_characters_in_strings_are_tolerated():
+    parser = IncrementalJSONParser()
+    assert parser.feed('{"code": "int main() {\n\treturn 0;\n}"}') == [("code", "int main() {\n\treturn 0;\n}")]
+
+
+def test_escaped_quotes_and_backslashes_do_not_end_a_string():
+    value = 'printf("%s\\\\n", "\\"done\\"");'
+    text = json.dumps({"code": value})
+    assert feed_in_chunks(text, 3)[1] == [("code", value)]
+
+
+def test_undecodable_value_is_skipped_and_parsing_continues():
+    parser = IncrementalJSONParser()
+    completed = parser.feed('{"bad": tru, "good": "yes"}')
+    assert completed == [("good", "yes")]
+    assert parser.result == {"good": "yes"}
+
+
+def test_text_after_the_closing_brace_is_ignored():
+    parser = IncrementalJSONParser()
+    assert parser.feed('{"a": 1} {"b": 2}') == [("a", 1)]
+    assert parser.feed(', "c": 3}') == []
+    assert parser.result == {"a": 1}
+
+
+def test_truncated_output_keeps_only_finished_members():
+    parser, completed = feed_in_chunks('{"a": "done", "b": "half wr', 5)
+    assert completed == [("a", "done")]
+    assert not parser.finished
@@ -0,0 +1,44 @@
+import asyncio
+import warnings
+
+import pytest
+
+with warnings.catch_warnings():
+    warnings.simplefilter("ignore", FutureWarning)
+    import google.generativeai as genai
+
+from services import llm_backend
+from services.llm_backend import GeminiBackend
+
+
+def _key(client):
+    return client._client_options.api_key if hasattr(client, "_client_options") else client._client._client_options.api_key
+
+
+async def _models(*keys):
+    # The async client binds to the running loop, as it does in the server.
+    return [GeminiBackend("gemini-2.0-flash", api_key=key)._get_model() for key in keys]
+
+
+def test_each_backend_gets_clients_for_its_own_key():
+    first, second = asyncio.run(_models("key-one", "key-two"))
+
+    assert _key(first._client) == "key-one"
+    assert _key(second._async_client) == "key-two"
+
+
+def test_sdk_without_model_clients_allows_a_single_key(monkeypatch):
+    class BareModel:
+        def __init__(self, model_name):
+            self.model_name = model_name
+
+    configured = []
+    monkeypatch.setattr(genai, "GenerativeModel", BareModel)
+    monkeypatch.setattr(genai, "configure", lambda api_key: configured.append(api_key))
+    monkeypatch.setattr(llm_backend, "_global_key", None)
+
+    GeminiBackend("gemini-2.0-flash", api_key="key-one")._get_model()
+    GeminiBackend("gemini-2.0-pro", api_key="key-one")._get_model()
+    with pytest.raises(RuntimeError, match="only one"):
+        GeminiBackend("gemini-2.0-flash", api_key="key-two")._get_model()
+    assert configured == ["key-one"]
@@ -0,0 +1,72 @@
+import re
+import asyncio
+
+from fastapi.testclient import TestClient
+
+import main
+from services import metrics
+from services.metrics import Counter, Histogram, render_metrics, span
+
+
+def test_counter_and_histogram_render(monkeypatch):
+    monkeypatch.setattr(metrics, "REGISTRY", [])
+    calls = Counter("test_calls_total", "Calls.", ["kind"])
+    latency = Histogram("test_latency_seconds", "Latency.", buckets=(0.1, 1.0))
+    calls.inc(kind='say "hi"')
+    calls.inc(2, kind='say "hi"')
+    for value in (0.05, 0.5, 5.0):
+        latency.observe(value)
+
+    text = render_metrics({"test_component": {"hits": 3, "nested": {"size": 7}, "name": "skipped"}})
+
+    assert 'test_calls_total{kind="say \\"hi\\""} 3' in text
+    assert 'test_latency_seconds_bucket{le="0.1"} 1' in text
+    assert 'test_latency_seconds_bucket{le="1.0"} 2' in text
+    assert 'test_latency_seconds_bucket{le="+Inf"} 3' in text
+    assert "test_latency_seconds_count 3" in text
+    assert "test_component_hits 3" in text and "test_component_nested_size 7" in text
+    assert "skipped" not in text
+
+
+def test_spans_add_up_per_request_across_threads():
+    timings = {}
+
+    async def request():
+        token = metrics._request_timings.set(timings)
+        try:
+            _timed("cache_lookup")
+            # Worker threads run in a copy of the request's context and add to the same timings.
+            await asyncio.gather(*[asyncio.to_thread(_timed, "prompt_build") for _ in range(3)])
+        finally:
+            metrics._request_timings.reset(token)
+
+    before = _count("prompt_build")
+    asyncio.run(request())
+
+    assert set(timings) == {"cache_lookup", "prompt_build"}
+    assert _count("prompt_build") == before + 3
+
+
+def _timed(stage):
+    with span(stage):
+        pass
+
+
+def _count(stage):
+    match = re.search(rf'doc_stage_duration_seconds_count{{stage="{stage}"}} (\d+)', render_metrics())
+    return int(match.group(1)) if match else 0
+
+
+def test_metrics_endpoint_and_server_timing():
+    client = TestClient(main.app)
+    response = client.post("/generate-documentation", headers={"X-Request-Timing": "1"}, json={
+        "question": "Write a C program for FCFS scheduling (metrics test)", "options": {"overview": True}})
+    assert response.status_code == 200
+    stages = [entry.split(";")[0] for entry in response.headers["Server-Timing"].split(", ")]
+    assert "llm" in stages and stages[-1] == "total"
+
+    text = client.get("/metrics").text
+    assert 'doc_http_requests_total{path="/generate-documentation",status="200"}' in text
+    assert 'doc_llm_calls_total{kind="generate",outcome="ok"}' in text
+    assert "doc_cache_" in text and "doc_jobs_" in text
+    assert "Server-Timing" not in client.get("/").headers
@@ -0,0 +1,99 @@
+import os
+import time
+
+from services.pdf_export import PdfExporter, render_pdf
+
+RESULT = {"overview": "First come first serve.", "code": "int main() {\n    return 0;\n}"}
+
+
+def _write(directory, name, size, age):
+    path = os.path.join(directory, name)
+    with open(path, "wb") as handle:
+        handle.write(b"x" * size)
+    then = time.time() - age
+    os.utime(path, (then, then))
+    return path
+
+
+def test_render_is_deterministic():
+    sections = {"overview": True, "code": True}
+    first = render_pdf("Implement FCFS", RESULT, sections)
+
+    assert first.startswith(b"%PDF-1.4")
+    assert first == render_pdf("Implement FCFS", RESULT, sections)
+
+
+def test_purge_removes_expired_files(tmp_path):
+    exporter = PdfExporter(directory=str(tmp_path), max_age=100)
+    old = _write(tmp_path, "a" * 64 + ".pdf", 10, age=200)
+    fresh = _write(tmp_path, "b" * 64 + ".pdf", 10, age=50)
+    stale_temporary = _write(tmp_path, "c" * 64 + ".pdf.1.tmp", 10, age=7200)
+
+    assert exporter.purge() == 1
+    assert not os.path.exists(old)
+    assert not os.path.exists(stale_temporary)
+    assert os.path.exists(fresh)
+
+
+def test_purge_keeps_recently_used_files_within_the_size_cap(tmp_path):
+    exporter = PdfExporter(directory=str(tmp_path), max_bytes=250)
+    oldest = _write(tmp_path, "a" * 64 + ".pdf", 100, age=30)
+    used = _write(tmp_path, "b" * 64 + ".pdf", 100, age=20)
+    newest = _write(tmp_path, "c" * 64 + ".pdf", 100, age=10)
+
+    # Serving a file counts as a use.
+    assert exporter.path_for("b" * 64) == used
+
+    assert exporter.purge() == 1
+    assert not os.path.exists(oldest)
+    assert os.path.exists(used)
+    assert os.path.exists(newest)
+
+
+def test_path_for_rejects_unknown_and_malformed_ids(tmp_path):
+    exporter = PdfExporter(directory=str(tmp_path))
+
+    assert exporter.path_for("d" * 64) is None
+    assert exporter.path_for("../main") is None
+
+
+def _client(monkeypatch, tmp_path):
+    from fastapi.testclient import TestClient
+
+    import main
+
+    monkeypatch.setattr(main, "pdf_exporter", PdfExporter(directory=str(tmp_path), workers=1))
+    monkeypatch.setattr(main, "PDF_MAX_REQUEST_BYTES", 4096)
+    return TestClient(main.app)
+
+
+def test_export_endpoint_refuses_oversized_bodies(monkeypatch, tmp_path):
+    client = _client(monkeypatch, tmp_path)
+
+    response = client.post("/documentation/pdf", json={"question": "q", "result": {"code": "x" * 5000}})
+
+    assert response.status_code == 413
+    assert os.listdir(tmp_path) == []
+
+
+def test_export_endpoint_validates_the_body(monkeypatch, tmp_path):
+    client = _client(monkeypatch, tmp_path)
+
+    assert client.post("/documentation/pdf", json={"result": RESULT}).status_code == 422
+    assert client.post("/documentation/pdf", content=b"{not json").status_code == 422
+
+
+def test_export_endpoint_renders_and_serves_again(monkeypatch, tmp_path):
+    client = _client(monkeypatch, tmp_path)
+
+    import main
+
+    try:
+        response = client.post("/documentation/pdf", json={"question": "Implement FCFS", "result": RESULT})
+        assert response.status_code == 200
+        assert response.content.startswith(b"%PDF")
+
+        again = client.get(response.headers["Content-Location"])
+        assert again.content == response.content
+    finally:
+        main.pdf_exporter.shutdown()
@@ -0,0 +1,175 @@
+import time
+import asyncio
+import functools
+
+import pytest
+from fastapi.testclient import TestClient
+
+import main
+from services import gemini_os_doc, resilience
+from services.llm_backend import StubBackend
+from services.admission import AdmissionRejected
+from services.resilience import HEDGE_BURST, LLMDeadlineExceeded, LLMUnavailableError, ResilientBackend, request_deadline
+
+
+async def _generate(backend, deadline=30.0):
+    with request_deadline(deadline):
+        return await backend.generate_content_async("Explain FCFS", generation_config={"max_output_tokens": 100})
+
+
+def test_retries_give_up_at_the_deadline(monkeypatch):
+    monkeypatch.setattr(resilience, "LLM_BACKOFF_BASE", 0.05)
+    stub = StubBackend(latency=0, jitter=0, error_rate=1.0)
+    backend = ResilientBackend(stub, max_retries=1000, seed=0)
+
+    start = time.monotonic()
+    with pytest.raises(LLMDeadlineExceeded):
+        asyncio.run(_generate(backend, deadline=0.5))
+
+    assert time.monotonic() - start < 0.6
+    assert 1 < stub.stats["calls"] < 1000
+    assert backend.get_stats()["deadline_exceeded"] == 1
+
+
+def test_slow_call_is_abandoned_at_the_deadline():
+    backend = ResilientBackend(StubBackend(latency=5, jitter=0), max_retries=3, seed=0)
+
+    start = time.monotonic()
+    with pytest.raises(LLMDeadlineExceeded):
+        asyncio.run(_generate(backend, deadline=0.2))
+
+    assert time.monotonic() - start < 0.5
+
+
+def test_exhausted_retries_raise_unavailable(monkeypatch):
+    monkeypatch.setattr(resilience, "LLM_BACKOFF_BASE", 0.001)
+    stub = StubBackend(latency=0, jitter=0, error_rate=1.0)
+    backend = ResilientBackend(stub, max_retries=2, seed=0)
+
+    with pytest.raises(LLMUnavailableError) as raised:
+        asyncio.run(_generate(backend))
+
+    assert not isinstance(raised.value, LLMDeadlineExceeded)
+    assert stub.stats["calls"] == 3
+    assert backend.get_stats()["retries"] == 2
+
+
+def test_hedges_are_capped_by_the_ratio():
+    stub = StubBackend(latency=0.001, jitter=0)
+    backend = ResilientBackend(stub, hedging=True, hedge_max_ratio=0.1, seed=0)
+
+    async def scenario():
+        for _ in range(30):  # learn the p95 latency
+            await _generate(backend)
+        stub.latency = 0.02  # from now on every call outlives it
+        for _ in range(60):
+            await _generate(backend)
+
+    asyncio.run(scenario())
+
+    stats = backend.get_stats()
+    assert stats["calls"] == 90
+    assert 1 <= stats["hedges"] <= min(HEDGE_BURST, 30 * 0.1) + 60 * 0.1
+
+
+class StallingStream:
+    """Streams one chunk, then stalls."""
+
+    def __init__(self):
+        self.closed = False
+
+    async def __aiter__(self):
+        try:
+            yield "first"
+            await asyncio.sleep(5)
+            yield "never"
+        finally:
+            self.closed = True
+
+
+class StallingBackend(StubBackend):
+    def __init__(self):
+        super().__init__(latency=0, jitter=0)
+        self.stream = StallingStream()
+
+    async def generate_content_async(self, prompt, generation_config=None, stream=False):
+        return self.stream
+
+
+def test_stalled_stream_ends_at_the_deadline():
+    stub = StallingBackend()
+    backend = ResilientBackend(stub, seed=0)
+    chunks = []
+
+    async def consume():
+        with request_deadline(0.2):
+            response = await backend.generate_content_async("Explain FCFS", stream=True)
+            async for chunk in response:
+                chunks.append(chunk)
+
+    start = time.monotonic()
+    with pytest.raises(LLMDeadlineExceeded):
+        asyncio.run(consume())
+
+    assert time.monotonic() - start < 0.5
+    assert chunks == ["first"]
+    assert stub.stream.closed
+
+
+def _post_documentation(monkeypatch, backend, question):
+    monkeypatch.setattr(gemini_os_doc, "model", backend)
+    client = TestClient(main.app)
+    return client.post("/generate-documentation", json={"question": question, "options": {"overview": True}})
+
+
+def test_unavailable_model_maps_to_503(monkeypatch):
+    monkeypatch.setattr(resilience, "LLM_BACKOFF_BASE", 0.001)
+    backend = ResilientBackend(StubBackend(latency=0, jitter=0, error_rate=1.0), max_retries=1, seed=0)
+
+    response = _post_documentation(monkeypatch, backend, "Write a C program to simulate FCFS (503 test)")
+
+    assert response.status_code == 503
+    assert "Retry-After" in response.headers
+
+
+def test_deadline_maps_to_504(monkeypatch):
+    monkeypatch.setattr(main, "request_deadline", functools.partial(request_deadline, 0.1))
+    backend = ResilientBackend(StubBackend(latency=5, jitter=0), seed=0)
+
+    response = _post_documentation(monkeypatch, backend, "Write a C program to simulate FCFS (504 test)")
+
+    assert response.status_code == 504
+    assert "Retry-After" in response.headers
+
+
+class RejectingModel:
+    """Fails every call with `error` and counts the calls."""
+
+    def __init__(self, error):
+        self.error = error
+        self.calls = 0
+
+    def generate_content(self, prompt, generation_config=None):
+        self.calls += 1
+        raise self.error
+
+    async def generate_content_async(self, prompt, generation_config=None):
+        self.calls += 1
+        raise self.error
+
+
+@pytest.mark.parametrize("error", [LLMUnavailableError("model down"), AdmissionRejected("queue full", 2.0)])
+def test_language_detection_does_not_swallow_unavailability(error):
+    question = f"Demonstrate this lab exercise ({type(error).__name__})"
+    fake = RejectingModel(error)
+
+    with pytest.raises(type(error)):
+        asyncio.run(gemini_os_doc.detect_language_async(question, fake))
+    with pytest.raises(type(error)):
+        gemini_os_doc.detect_language(question, fake)
+    assert fake.calls == 2
+
+
+def test_language_detection_falls_back_to_c_on_other_errors():
+    fake = RejectingModel(ValueError("unexpected answer"))
+    assert asyncio.run(gemini_os_doc.detect_language_async("Demonstrate this lab exercise", fake)) == "C"
@@ -0,0 +1,139 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+from services import routing
+from services.llm_backend import LLMBackend
+from services.routing import ROUTE_CLASSIFY, ROUTE_GENERATE, RoutedBackend
+
+ROUTES = {ROUTE_CLASSIFY: ["flash-lite", "flash"], ROUTE_GENERATE: ["flash", "fallback"]}
+GENERATE = {"max_output_tokens": 2048}
+CLASSIFY = {"max_output_tokens": 5}
+
+
+class FlakyError(Exception):
+    transient = True
+
+    def __init__(self, throttled=False):
+        super().__init__("quota exceeded" if throttled else "backend error")
+        self.throttled = throttled
+
+
+class FakeEndpoint(LLMBackend):
+    """Records calls; raises `error` while it is set."""
+
+    def __init__(self, key_index, model_name, log):
+        self.name = (f"key{key_index}", model_name)
+        self.error = None
+        self.log = log
+
+    async def generate_content_async(self, prompt, generation_config=None, stream=False):
+        self.log.append(self.name)
+        if self.error is not None:
+            raise self.error
+        return SimpleNamespace(text="ok")
+
+
+def make_router(keys=2, strategy="least_loaded"):
+    log, backends = [], {}
+
+    def factory(index, model_name):
+        backends[(f"key{index}", model_name)] = FakeEndpoint(index, model_name, log)
+        return backends[(f"key{index}", model_name)]
+
+    return RoutedBackend(keys, ROUTES, factory, strategy=strategy), backends, log
+
+
+def call(router, config=GENERATE):
+    return asyncio.run(router.generate_content_async("prompt", generation_config=config))
+
+
+def test_calls_take_turns_between_keys():
+    router, _, log = make_router(strategy="round_robin")
+    for _ in range(4):
+        call(router)
+    assert [key for key, _ in log] == ["key0", "key1", "key0", "key1"]
+
+
+def test_classification_calls_use_their_own_model():
+    router, _, log = make_router()
+    call(router, CLASSIFY)
+    call(router, GENERATE)
+    assert [model for _, model in log] == ["flash-lite", "flash"]
+
+
+def test_throttled_key_cools_down_and_calls_rotate_to_the_other():
+    router, backends, log = make_router()
+    backends[("key0", "flash")].error = FlakyError(throttled=True)
+    with pytest.raises(FlakyError):
+        call(router)
+    assert log == [("key0", "flash")]
+
+    log.clear()
+    for _ in range(3):
+        call(router)
+    assert log == [("key1", "flash")] * 3
+    assert router.get_stats()["cooling_down"] == 1
+
+
+def test_cooldowns_double_with_consecutive_failures(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(routing.time, "monotonic", lambda: now[0])
+    router, backends, _ = make_router(keys=1)
+    backends[("key0", "flash")].error = FlakyError()
+    endpoint = router._endpoints["flash"][0]
+
+    cooldowns = []
+    for _ in range(3):
+        endpoint.cooldown_until = 0.0
+        with pytest.raises(FlakyError):
+            call(router)
+        cooldowns.append(endpoint.cooldown_until - now[0])
+    assert cooldowns == [routing.KEY_ERROR_COOLDOWN_SECONDS * factor for factor in (1, 2, 4)]
+
+    backends[("key0", "flash")].error = None
+    endpoint.cooldown_until = 0.0
+    call(router)
+    assert endpoint.consecutive_failures == 0
+
+
+def test_fallback_model_once_every_key_cools_down():
+    router, backends, log = make_router()
+    for key in ("key0", "key1"):
+        backends[(key, "flash")].error = FlakyError(throttled=True)
+    for _ in range(2):
+        with pytest.raises(FlakyError):
+            call(router)
+
+    log.clear()
+    call(router)
+    assert log == [(log[0][0], "fallback")]
+    assert router.get_stats()["fallbacks"] == 1
+
+
+def test_whole_chain_cooling_down_uses_the_first_to_recover():
+    router, backends, log = make_router(keys=1)
+    backends[("key0", "flash")].error = FlakyError(throttled=True)
+    backends[("key0", "fallback")].error = FlakyError()
+    for _ in range(2):
+        with pytest.raises(FlakyError):
+            call(router)
+
+    log.clear()
+    with pytest.raises(FlakyError):
+        call(router)
+    # The plain error cools down for 5s, the throttle for 30s.
+    assert log == [("key0", "fallback")]
+    assert router.get_stats()["all_cooling_down"] == 1
+
+
+def test_cancellations_and_permanent_errors_do_not_cool_down():
+    router, backends, _ = make_router(keys=1)
+    backends[("key0", "flash")].error = ValueError("bad request")
+    with pytest.raises(ValueError):
+        call(router)
+    backends[("key0", "flash")].error = asyncio.CancelledError()
+    with pytest.raises(asyncio.CancelledError):
+        call(router)
+    assert router.get_stats()["cooldowns"] == 0
@@ -0,0 +1,32 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+from services import gemini_os_doc
+
+
+class FakeModel:
+    """Answers every generation call with `text` and records the prompts."""
+
+    def __init__(self, text):
+        self.text = text
+        self.prompts = []
+
+    async def generate_content_async(self, prompt, generation_config=None):
+        self.prompts.append(prompt)
+        return SimpleNamespace(text=self.text)
+
+
+@pytest.mark.parametrize("text", ['{"code": "#include <stdio.h>\\nint main(', "I cannot help with that.", '{"code": ""}'])
+def test_undecodable_code_section_aborts(monkeypatch, text):
+    fake = FakeModel(text)
+    monkeypatch.setattr(gemini_os_doc, "model", fake)
+    question = f"Write a C program to simulate FCFS CPU scheduling ({text!r})"
+
+    with pytest.raises(Exception, match="Error generating documentation"):
+        asyncio.run(gemini_os_doc.generate_documentation_by_section_async(
+            question, None, {"code": True, "overview": True, "explanation": True}))
+
+    # Only the code section was requested; nothing was generated about an error message.
+    assert len(fake.prompts) == 1
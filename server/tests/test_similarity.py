@@ -0,0 +1,70 @@
+import json
+from pathlib import Path
+
+import pytest
+
+from services.similarity import SimilarityIndex
+
+OPTIONS = {"overview": True}
+PAIRS = json.loads((Path(__file__).parent / "fixtures" / "question_pairs.json").read_text())
+
+
+def make_index(*questions):
+    index = SimilarityIndex(path=None)
+    for key, question in enumerate(questions):
+        index.add(question, str(key), OPTIONS)
+    return index
+
+
+def test_even_does_not_match_prime():
+    index = make_index("Write a shell script to check whether a number is prime.")
+
+    assert index.lookup("check whether a number is even", OPTIONS) is None
+
+
+def test_paraphrase_matches():
+    index = make_index("Write a shell script to check whether a number is prime.")
+
+    assert index.lookup("Shell script to check if a number is prime or not", OPTIONS)[0] == "0"
+
+
+def test_conversion_direction_matters():
+    index = make_index("Write a C program to convert decimal to binary.")
+
+    assert index.lookup("Write a C program to convert binary to decimal", OPTIONS) is None
+
+
+def test_c_question_is_not_served_a_shell_answer():
+    index = make_index("Write a shell script to check whether a file exists in a directory")
+
+    assert index.lookup("Write a C program to check whether a file exists in a directory", OPTIONS) is None
+
+
+def test_shell_question_is_not_served_a_c_answer():
+    index = make_index("Write a C program to implement FCFS scheduling")
+
+    assert index.lookup("Write a shell script to implement FCFS scheduling", OPTIONS) is None
+    assert index.lookup("Implement first come first serve scheduling in C", OPTIONS)[0] == "0"
+
+
+def test_c_scan_is_not_a_language():
+    index = make_index("Implement C-SCAN disk scheduling")
+
+    assert index.lookup("Implement the C-SCAN disk scheduling algorithm", OPTIONS)[0] == "0"
+
+
+@pytest.mark.parametrize("pair", [pair for pair in PAIRS if not pair["same"]], ids=lambda pair: pair["query"])
+def test_different_tasks_are_never_served(pair):
+    index = make_index(*sorted({pair["stored"] for pair in PAIRS}))
+
+    match = index.lookup(pair["query"], OPTIONS)
+
+    assert match is None or index.questions[int(match[0])] != pair["stored"]
+
+
+def test_pending_rows_are_scored_like_indexed_rows():
+    index = make_index("Implement FCFS scheduling", "Implement LRU page replacement")
+    pending = index.lookup("least recently used page replacement", OPTIONS)
+    index.rebuild()
+
+    assert index.lookup("least recently used page replacement", OPTIONS) == pytest.approx(pending)
@@ -0,0 +1,100 @@
+import asyncio
+
+import pytest
+
+from services.singleflight import SingleFlight
+
+
+def test_concurrent_calls_share_one_run():
+    flight = SingleFlight()
+    runs = []
+
+    async def work():
+        runs.append(1)
+        await asyncio.sleep(0.01)
+        return "result"
+
+    async def scenario():
+        return await asyncio.gather(*[flight.do("key", work) for _ in range(5)])
+
+    assert asyncio.run(scenario()) == ["result"] * 5
+    assert len(runs) == 1
+    assert flight.get_stats() == {"leaders": 1, "coalesced": 4, "in_flight": 0}
+
+
+def test_errors_reach_every_waiter():
+    flight = SingleFlight()
+
+    async def work():
+        await asyncio.sleep(0.01)
+        raise ValueError("boom")
+
+    async def scenario():
+        return await asyncio.gather(*[flight.do("key", work) for _ in range(3)], return_exceptions=True)
+
+    results = asyncio.run(scenario())
+    assert all(isinstance(result, ValueError) for result in results)
+
+
+def test_cancelling_one_waiter_keeps_the_shared_run():
+    flight = SingleFlight()
+
+    async def scenario():
+        work = asyncio.Event()
+
+        async def slow():
+            await work.wait()
+            return "result"
+
+        first = asyncio.create_task(flight.do("key", slow))
+        second = asyncio.create_task(flight.do("key", slow))
+        await asyncio.sleep(0)
+        first.cancel()
+        await asyncio.sleep(0)
+        work.set()
+        return await second, first.cancelled()
+
+    assert asyncio.run(scenario()) == ("result", True)
+
+
+def test_last_waiter_leaving_cancels_the_run():
+    flight = SingleFlight()
+    cancelled = []
+
+    async def scenario():
+        async def slow():
+            try:
+                await asyncio.sleep(10)
+            except asyncio.CancelledError:
+                cancelled.append(True)
+                raise
+
+        waiters = [asyncio.create_task(flight.do("key", slow)) for _ in range(2)]
+        await asyncio.sleep(0)
+        for waiter in waiters:
+            waiter.cancel()
+        await asyncio.gather(*waiters, return_exceptions=True)
+        await asyncio.sleep(0)
+        return flight.get_stats()["in_flight"]
+
+    assert asyncio.run(scenario()) == 0
+    assert cancelled == [True]
+
+
+def test_a_new_call_after_cancellation_starts_fresh():
+    flight = SingleFlight()
+
+    async def scenario():
+        waiter = asyncio.create_task(flight.do("key", lambda: asyncio.sleep(10)))
+        await asyncio.sleep(0)
+        waiter.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await waiter
+
+        async def quick():
+            return "fresh"
+
+        return await flight.do("key", quick)
+
+    assert asyncio.run(scenario()) == "fresh"
+    assert flight.get_stats()["leaders"] == 2
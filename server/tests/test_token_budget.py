@@ -0,0 +1,74 @@
+import json
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+from services import gemini_os_doc
+from services.token_budget import PromptTooLarge, estimate_tokens
+
+OPTIONS = {"overview": True, "code": True}
+QUESTION = "Write a C program that adds numbers read from the user"
+
+
+class EchoModel:
+    """Answers with a JSON result whose `code` section echoes the code found in the prompt."""
+
+    def __init__(self):
+        self.prompts = []
+
+    async def generate_content_async(self, prompt, generation_config=None):
+        self.prompts.append(prompt)
+        sent = prompt.split("```c\n", 1)[1].split("```", 1)[0].strip()
+        return SimpleNamespace(text=json.dumps({"overview": "Adds numbers.", "code": sent}))
+
+
+def commented_program(functions: int) -> str:
+    parts = ["#include <stdio.h>"]
+    for i in range(functions):
+        parts.append(f"/* Adds {i} to its argument; kept short so it is never elided. "
+                     f"{'This comment only pads the submission. ' * 4}*/\n"
+                     f"int add_{i}(int x) {{\n    return x + {i};\n}}")
+    parts.append("int main() {\n    int x;\n    scanf(\"%d\", &x);\n    printf(\"%d\\n\", add_0(x));\n    return 0;\n}")
+    return "\n".join(parts)
+
+
+def instruction_tokens() -> int:
+    return estimate_tokens(gemini_os_doc.build_generation_prompt(QUESTION, "", OPTIONS, "C"))
+
+
+def test_compacted_prompt_is_sent_but_the_submitted_code_is_returned(monkeypatch):
+    code = commented_program(20)
+    monkeypatch.setattr(gemini_os_doc, "PROMPT_TOKEN_BUDGET", instruction_tokens() + estimate_tokens(code) // 2)
+    fake = EchoModel()
+    monkeypatch.setattr(gemini_os_doc, "model", fake)
+
+    result = asyncio.run(gemini_os_doc.generate_documentation_with_ai_async(QUESTION, code, OPTIONS))
+
+    assert estimate_tokens(fake.prompts[-1]) <= gemini_os_doc.PROMPT_TOKEN_BUDGET
+    assert "This comment only pads" not in fake.prompts[-1]
+    assert result["code"] == code
+
+
+def test_code_still_over_budget_is_rejected(monkeypatch):
+    code = commented_program(200)
+    monkeypatch.setattr(gemini_os_doc, "PROMPT_TOKEN_BUDGET", instruction_tokens() + 100)
+    fake = EchoModel()
+    monkeypatch.setattr(gemini_os_doc, "model", fake)
+
+    with pytest.raises(PromptTooLarge, match="too long"):
+        asyncio.run(gemini_os_doc.generate_documentation_with_ai_async(QUESTION + " again", code, OPTIONS))
+    assert not any("add_199" in prompt for prompt in fake.prompts)
+
+
+def test_prompt_too_large_maps_to_413(monkeypatch):
+    from fastapi.testclient import TestClient
+    import main
+
+    monkeypatch.setattr(gemini_os_doc, "PROMPT_TOKEN_BUDGET", instruction_tokens() + 100)
+    monkeypatch.setattr(gemini_os_doc, "model", EchoModel())
+    with TestClient(main.app) as client:
+        response = client.post("/generate-documentation", json={
+            "question": QUESTION + " over the api", "code": commented_program(200), "options": OPTIONS})
+    assert response.status_code == 413
+    assert "too long" in response.json()["detail"]
@@ -0,0 +1,117 @@
+import os
+import errno
+import asyncio
+
+import pytest
+
+import main
+from main import DocumentationRequest
+from services import verification
+
+
+def make_request(**fields):
+    return DocumentationRequest(question="Write a C program for FCFS scheduling", options={"code": True}, **fields)
+
+
+@pytest.fixture
+def verification_enabled(monkeypatch):
+    monkeypatch.setattr(main, "CODE_VERIFICATION", True)
+
+
+def test_request_flag_cannot_enable_verification(monkeypatch):
+    monkeypatch.setattr(main, "CODE_VERIFICATION", False)
+    assert not make_request(verify=True).wants_verification()
+
+
+def test_request_flag_can_opt_out(verification_enabled):
+    assert make_request().wants_verification()
+    assert not make_request(verify=False).wants_verification()
+
+
+@pytest.mark.parametrize("fields", [
+    {"code": "int main() { return 0; }"},
+    {"code": "int main() { return 0; }", "parallel_sections": True},
+    {"code": "int main() { return 0; }", "previous_document": "0" * 64},
+])
+def test_submitted_code_is_never_verified(verification_enabled, fields):
+    assert not make_request(verify=True, **fields).wants_verification()
+
+
+def test_no_sandbox_means_no_verification(monkeypatch):
+    monkeypatch.setattr(verification, "VERIFY_SANDBOX_COMMAND", [])
+    monkeypatch.setattr(verification, "VERIFY_UID", "")
+    assert verification.sandbox_problem() is not None
+
+
+@pytest.mark.parametrize("command, ok", [
+    (["bwrap", "--ro-bind", "/", "/"], False),
+    (["bwrap", "--unshare-all", "--ro-bind", "/", "/"], True),
+    (["firejail", "--quiet"], False),
+    (["firejail", "--quiet", "--net=none"], True),
+    (["nsjail", "-Mo", "--"], True),
+    (["nsjail", "-Mo", "-N", "--"], False),
+    (["sh", "-c"], False),
+])
+def test_sandbox_command_must_isolate_the_network(monkeypatch, command, ok):
+    monkeypatch.setattr(verification, "VERIFY_SANDBOX_COMMAND", command)
+    assert (verification.sandbox_problem() is None) == ok
+
+
+def test_verifier_refuses_to_run_without_sandbox(monkeypatch):
+    monkeypatch.setattr(verification, "VERIFY_SANDBOX_COMMAND", [])
+    monkeypatch.setattr(verification, "VERIFY_UID", "")
+    verifier = verification.CodeVerifier(workers=1, cache_path=None)
+    report = asyncio.run(verifier.verify("```c\nint main() { return 0; }\n```"))
+    assert "unavailable" in report["error"]
+    assert verifier.stats["runs"] == 0
+
+
+def test_binary_dir_on_another_filesystem(monkeypatch, tmp_path):
+    # Renaming out of the /tmp workdir fails with EXDEV when the binary directory is elsewhere.
+    real_replace = os.replace
+
+    def replace(source, target):
+        if os.path.dirname(source) != os.path.dirname(target):
+            raise OSError(errno.EXDEV, "Invalid cross-device link")
+        return real_replace(source, target)
+
+    monkeypatch.setattr(verification, "VERIFY_BINARY_DIR", str(tmp_path / "verify"))
+    monkeypatch.setattr(verification, "VERIFY_SANDBOX_COMMAND", [])
+    monkeypatch.setattr(verification, "VERIFY_UID", "")
+    monkeypatch.setattr(verification.os, "replace", replace)
+    source = '#include <stdio.h>\nint main() { int n; scanf("%d", &n); printf("%d\\n", n * 2); return 0; }\n'
+
+    report = verification.verify_program("C", source, "21\n")
+
+    assert report["compiled"], report["compiler_output"]
+    assert report["stdout"] == "42\n"
+    assert os.listdir(tmp_path / "verify") == [os.path.basename(verification._binary_path(source))]
+
+
+def test_uid_alone_requires_unshare(monkeypatch):
+    monkeypatch.setattr(verification, "VERIFY_SANDBOX_COMMAND", [])
+    monkeypatch.setattr(verification, "VERIFY_UID", "65534")
+    monkeypatch.setattr(verification.os, "geteuid", lambda: 0)
+    monkeypatch.setattr(verification.shutil, "which", lambda name: None)
+    verification._unshare_problem.cache_clear()
+    try:
+        assert "unshare" in verification.sandbox_problem()
+    finally:
+        verification._unshare_problem.cache_clear()
+
+
+@pytest.mark.skipif(os.geteuid() != 0 or verification._unshare_problem((65534, 65534)) is not None,
+                    reason="needs root and unshare --net")
+def test_uid_mode_runs_without_network(monkeypatch, tmp_path):
+    monkeypatch.setattr(verification, "VERIFY_BINARY_DIR", str(tmp_path / "verify"))
+    monkeypatch.setattr(verification, "VERIFY_SANDBOX_COMMAND", [])
+    monkeypatch.setattr(verification, "VERIFY_UID", "65534")
+    assert verification.sandbox_problem() is None
+
+    report = verification.verify_program("Shell", "id -u\ngrep -c ':' /proc/net/dev\n", "")
+    assert report["stdout"].split() == ["65534", "1"]  # only the loopback interface
+
+    report = verification.verify_program("C", '#include <stdio.h>\n#include <unistd.h>\n'
+                                         'int main() { printf("%d\\n", (int) getuid()); return 0; }\n', "")
+    assert report["compiled"], report["compiler_output"]
+    assert report["stdout"] == "65534\n"